@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import CONFIG, load_config, validate_config
+from logger import log_email_sent, setup_logger
+from scraper import get_notion_content
+from pipeline import STATUS_SKIPPED, ReportPipeline
+from batch_runner import SENDER_CONFIGS, load_roster, summarize, log_summary
+
+
+class AsyncReportPipeline:
+    """基于asyncio的日报流水线
+
+    抓取、AI处理和发送三个网络阶段各自使用独立的并发上限，
+    多个用户的日报在不同阶段之间交错执行，而不是逐个等待。
+    每个用户的各阶段由ReportPipeline完成，阻塞的阶段在专用线程池中执行。
+    """
+
+    def __init__(
+        self, fetch_limit: int = None, llm_limit: int = None, send_limit: int = None
+    ):
+        """初始化AsyncReportPipeline
+
+        Args:
+            fetch_limit: 抓取阶段并发上限，为None时使用CONFIG中的ASYNC_FETCH_CONCURRENCY
+            llm_limit: AI处理阶段并发上限，为None时使用CONFIG中的ASYNC_LLM_CONCURRENCY
+            send_limit: 发送阶段并发上限，为None时使用CONFIG中的ASYNC_SEND_CONCURRENCY
+        """
+        self.fetch_limit = fetch_limit or CONFIG["ASYNC_FETCH_CONCURRENCY"]
+        self.llm_limit = llm_limit or CONFIG["ASYNC_LLM_CONCURRENCY"]
+        self.send_limit = send_limit or CONFIG["ASYNC_SEND_CONCURRENCY"]
+        self._executor = None
+        self._fetch_tasks = {}
+
+    async def _run_blocking(self, semaphore, func, *args):
+        """在信号量限制下于线程池中执行阻塞调用"""
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def fetch(self, url: str, report_date: str = None) -> str:
+        """异步获取学习内容，同一来源同一日期只获取一次
+
+        Args:
+            url: 学习计划文件地址
+            report_date: 日报日期，为None时使用当前北京时间的日期
+
+        Returns:
+            str: 用正文标签包装的当天学习内容
+        """
+        key = (url, report_date)
+        task = self._fetch_tasks.get(key)
+        if task is None:
+            task = self._fetch_tasks[key] = asyncio.ensure_future(
+                self._run_blocking(self._fetch_semaphore, get_notion_content, url, report_date)
+            )
+        return await task
+
+    async def summarize(self, pipeline: ReportPipeline):
+        """异步生成学习总结，优先使用预生成的结果"""
+        return await self._run_blocking(self._llm_semaphore, pipeline.summarize)
+
+    async def send(self, pipeline: ReportPipeline):
+        """异步通过发件箱发送日报邮件"""
+        return await self._run_blocking(self._send_semaphore, pipeline.deliver)
+
+    async def run_user(self, profile: dict) -> dict:
+        """为单个用户执行完整流水线
+
+        Args:
+            profile: 用户配置
+
+        Returns:
+            dict: 与batch_runner.run_user相同格式的结果
+        """
+        result = {
+            "user": profile["USER_NAME"],
+            "ok": False,
+            "status": None,
+            "error": None,
+            "stages": {},
+        }
+        stage = None
+
+        async def timed(name, coro):
+            nonlocal stage
+            stage = name
+            start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                result["stages"][name] = time.perf_counter() - start
+
+        try:
+            pipeline = ReportPipeline(profile, drain_all=False)
+            # 已在发件箱中的日报只需发送或跳过，不再获取和生成
+            if not pipeline.queued():
+                content = await timed(
+                    "scrape", self.fetch(pipeline.source, pipeline.report_date)
+                )
+                pipeline.fetch(content)
+                await timed("gemini", self.summarize(pipeline))
+                start = time.perf_counter()
+                pipeline.render()
+                result["stages"]["generate"] = time.perf_counter() - start
+            delivery = await timed("send", self.send(pipeline))
+            result["status"] = delivery.status
+            if not (delivery.ok or delivery.in_progress):
+                raise Exception(f"{delivery.error}，邮件已保存在发件箱中等待重试")
+            result["ok"] = True
+            if delivery.status == STATUS_SKIPPED:
+                logging.info(f"[{result['user']}] 今日日报已发送，跳过")
+                log_email_sent("今日日报已发送，跳过", user=result["user"])
+            elif delivery.in_progress:
+                logging.info(f"[{result['user']}] 今日日报正由其他进程发送，跳过")
+                log_email_sent("今日日报正由其他进程发送，跳过", user=result["user"])
+            else:
+                logging.info(f"[{result['user']}] 日报发送成功")
+                log_email_sent("邮件发送成功", user=result["user"])
+        except Exception as e:
+            result["error"] = f"{stage}: {str(e)}"
+            logging.error(f"[{result['user']}] 日报生成失败({stage}): {str(e)}")
+            log_email_sent(f"发送失败: {result['error']}", user=result["user"])
+
+        return result
+
+    async def run(self, profiles: list[dict]) -> dict:
+        """为所有用户并发执行流水线
+
+        Args:
+            profiles: 用户配置列表
+
+        Returns:
+            dict: 与batch_runner.run_batch相同格式的汇总
+        """
+        # 信号量需要在事件循环内创建
+        self._fetch_semaphore = asyncio.Semaphore(self.fetch_limit)
+        self._llm_semaphore = asyncio.Semaphore(self.llm_limit)
+        self._send_semaphore = asyncio.Semaphore(self.send_limit)
+        self._fetch_tasks = {}
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.fetch_limit + self.llm_limit + self.send_limit
+        )
+
+        start = time.perf_counter()
+        try:
+            results = await asyncio.gather(
+                *(self.run_user(profile) for profile in profiles)
+            )
+        finally:
+            self._executor.shutdown(wait=False)
+        elapsed = time.perf_counter() - start
+
+        return summarize(list(results), elapsed)
+
+
+def run_async_batch(profiles: list[dict], **limits) -> dict:
+    """使用异步流水线为所有用户生成并发送日报
+
+    Args:
+        profiles: 用户配置列表
+        **limits: 传递给AsyncReportPipeline的各阶段并发上限
+
+    Returns:
+        dict: 批量运行汇总
+    """
+    return asyncio.run(AsyncReportPipeline(**limits).run(profiles))
+
+
+def main():
+    """异步批量运行入口"""
+    # 加载配置，命令行参数的默认值来自配置
+    load_config()
+
+    parser = argparse.ArgumentParser(description="使用异步流水线批量生成并发送日报")
+    parser.add_argument("--roster", default=CONFIG["ROSTER_FILE"], help="用户名单JSON文件")
+    parser.add_argument("--fetch-limit", type=int, default=None, help="抓取阶段并发上限")
+    parser.add_argument("--llm-limit", type=int, default=None, help="AI处理阶段并发上限")
+    parser.add_argument("--send-limit", type=int, default=None, help="发送阶段并发上限")
+    args = parser.parse_args()
+
+    # 解析参数后再检查，--help不需要发件配置；发件账号由所有用户共用，个人信息在用户名单中配置
+    validate_config(SENDER_CONFIGS)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    setup_logger(os.path.join(script_dir, "batch_runner.log"), console_level=logging.INFO)
+
+    profiles = load_roster(args.roster)
+    logging.info(f"已加载{len(profiles)}个用户")
+
+    summary = run_async_batch(
+        profiles,
+        fetch_limit=args.fetch_limit,
+        llm_limit=args.llm_limit,
+        send_limit=args.send_limit,
+    )
+    log_summary(summary)
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
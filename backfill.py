@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+from config import CONFIG, load_config, validate_config
+from logger import setup_logger
+from scraper import load_plan_index
+from gemini_processor import get_gemini_client, process_with_gemini
+from email_generator import render_email
+from email_templates import get_renderer
+from email_sender import build_email
+from outbox import STATUS_SENT, get_outbox
+from metrics import record_run
+
+# 补发邮件时需要的配置项
+SEND_CONFIGS = [
+    "EMAIL_FROM",
+    "EMAIL_PASSWORD",
+    "EMAIL_TO",
+    "SMTP_SERVER",
+    "SMTP_PORT",
+    "USER_NAME",
+    "EMAIL_SIGNATURE_NAME",
+    "EMAIL_SIGNATURE_PHONE",
+]
+
+
+def backfill_day(
+    report_date: str, content: str, out_dir: str = None, profile: dict = None
+) -> dict:
+    """生成单日的日报
+
+    Args:
+        report_date: 日报日期，格式为YYYY-MM-DD
+        content: 当天的学习内容
+        out_dir: 输出目录，为None时不写文件，而是加入发件箱
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        dict: 包含日期、是否成功、状态、错误信息和耗时(秒)的结果
+    """
+    result = {"date": report_date, "ok": False, "status": None, "error": None, "elapsed": 0.0}
+    start = time.perf_counter()
+    try:
+        # 与每日运行使用相同的输入格式，可以复用Gemini总结缓存
+        # 生成参数、模型链和缓存键按用户配置
+        processed_content = process_with_gemini(
+            f"<正文>\n{content}\n</正文>", profile=profile
+        )
+        email_content = render_email(processed_content, profile)
+
+        if out_dir is not None:
+            html, text = get_renderer(profile).render(email_content)
+            for extension, body in (("html", html), ("txt", text)):
+                path = os.path.join(out_dir, f"{report_date}.{extension}")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(body)
+            result["status"] = "written"
+        else:
+            config = {**CONFIG, **(profile or {})}
+            msg = build_email(email_content, profile, report_date=report_date)
+            get_outbox().enqueue(config["USER_NAME"], report_date, msg)
+            result["status"] = "queued"
+        result["ok"] = True
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        logging.error(f"[{report_date}] 日报生成失败: {str(e)}")
+    finally:
+        result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def _skipped(report_date: str, status: str) -> dict:
+    """未生成的日期的结果"""
+    return {"date": report_date, "ok": True, "status": status, "error": None, "elapsed": 0.0}
+
+
+def run_backfill(
+    start_date: str,
+    end_date: str,
+    send: bool = False,
+    out_dir: str = "backfill",
+    workers: int = None,
+    profile: dict = None,
+) -> dict:
+    """为日期区间内计划表中的每一天生成日报
+
+    计划表只获取和解析一次，各天的总结通过有界线程池并发生成，
+    Gemini请求速率由共享客户端统一限制。
+
+    Args:
+        start_date: 起始日期，格式为YYYY-MM-DD
+        end_date: 结束日期(包含)，格式为YYYY-MM-DD
+        send: 是否发送邮件，为False时只写入out_dir
+        out_dir: 输出目录
+        workers: 最大并发数，为None时使用CONFIG中的BATCH_WORKERS
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        dict: 汇总信息，包含每天的结果和吞吐量
+    """
+    config = {**CONFIG, **(profile or {})}
+    workers = workers or CONFIG["BATCH_WORKERS"]
+    start = time.perf_counter()
+
+    days = load_plan_index(config["PLAN_URL"]).range(start_date, end_date)
+    logging.info(f"计划表中{start_date}至{end_date}共有{len(days)}天的内容")
+
+    # 计划表中没有内容的日期只记录，不生成
+    results = []
+    present = {report_date for report_date, _ in days}
+    first, last = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    for ordinal in range(first.toordinal(), last.toordinal() + 1):
+        report_date = date.fromordinal(ordinal).isoformat()
+        if report_date not in present:
+            results.append(_skipped(report_date, "missing"))
+
+    if send:
+        # 已经在发件箱中的日期不再重新生成，尚未发送成功的立即重试
+        outbox = get_outbox()
+        pending_days = []
+        for report_date, content in days:
+            entry = outbox.get(config["USER_NAME"], report_date)
+            if entry is None:
+                pending_days.append((report_date, content))
+            elif entry["status"] == STATUS_SENT:
+                results.append(_skipped(report_date, "skipped"))
+            else:
+                outbox.retry(config["USER_NAME"], report_date)
+                results.append(_skipped(report_date, "queued"))
+        days = pending_days
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                backfill_day, report_date, content, None if send else out_dir, profile
+            )
+            for report_date, content in days
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    if send:
+        # 邮件通过连接池依次发送，失败的邮件留在发件箱中等待重试
+        delivered = {
+            item["report_date"]: item
+            for item in get_outbox().drain(config)
+            if item["user"] == config["USER_NAME"]
+        }
+        for result in results:
+            item = delivered.get(result["date"])
+            if item is None:
+                continue
+            result["status"] = item["status"]
+            result["ok"] = item["status"] == STATUS_SENT
+            result["error"] = item["error"]
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["date"])
+    generated = sum(1 for r in results if r["status"] not in ("skipped", "missing"))
+    return {
+        "total": len(results),
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "elapsed": elapsed,
+        "throughput": generated / elapsed if elapsed > 0 else 0.0,
+        "results": results,
+    }
+
+
+def log_summary(summary: dict):
+    """将补发结果输出到日志"""
+    for result in summary["results"]:
+        error = f" {result['error']}" if result["error"] else ""
+        logging.info(f"{result['date']} [{result['status']}] {result['elapsed']:.2f}s{error}")
+    logging.info(
+        f"补发完成: 共{summary['total']}天，成功{summary['succeeded']}天，"
+        f"失败{summary['failed']}天，耗时{summary['elapsed']:.2f}秒，"
+        f"吞吐量{summary['throughput']:.2f}份/秒"
+    )
+
+
+def _parse_date(value: str) -> str:
+    """校验日期参数"""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为YYYY-MM-DD: {value}")
+
+
+def main():
+    """补发入口"""
+    parser = argparse.ArgumentParser(description="为日期区间内的每一天生成日报")
+    parser.add_argument(
+        "--start", type=_parse_date, required=True, help="起始日期(YYYY-MM-DD)"
+    )
+    parser.add_argument(
+        "--end", type=_parse_date, help="结束日期(YYYY-MM-DD，包含)，默认与起始日期相同"
+    )
+    parser.add_argument("--send", action="store_true", help="发送邮件，默认只写入输出目录")
+    parser.add_argument("--out-dir", default="backfill", help="输出目录")
+    parser.add_argument("--workers", type=int, default=None, help="最大并发数")
+    args = parser.parse_args()
+
+    end_date = args.end or args.start
+    if end_date < args.start:
+        parser.error("结束日期不能早于起始日期")
+
+    load_config()
+    if args.send:
+        validate_config(SEND_CONFIGS)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    setup_logger(os.path.join(script_dir, "backfill.log"), console_level=logging.INFO)
+
+    with record_run("backfill", start=args.start, end=end_date) as run:
+        summary = run_backfill(args.start, end_date, args.send, args.out_dir, args.workers)
+        log_summary(summary)
+        logging.info(f"Gemini请求统计: {get_gemini_client().metrics()}")
+        if summary["failed"]:
+            run.mark_failed(f"{summary['failed']}天失败")
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import CONFIG, load_config, validate_config
+from logger import log_email_sent, setup_logger
+from scraper import get_notion_content
+from gemini_processor import get_gemini_client
+from pipeline import STATUS_SKIPPED, ReportPipeline
+
+# 每个用户必须提供的配置项
+REQUIRED_PROFILE_KEYS = [
+    "USER_NAME",
+    "EMAIL_SIGNATURE_NAME",
+    "EMAIL_SIGNATURE_PHONE",
+    "EMAIL_TO",
+]
+
+# 所有用户共用的发件配置项
+SENDER_CONFIGS = ["EMAIL_FROM", "EMAIL_PASSWORD", "SMTP_SERVER", "SMTP_PORT"]
+
+# 流水线各阶段名称，按执行顺序排列
+STAGES = ["scrape", "gemini", "generate", "send"]
+
+
+def load_roster(path: str) -> list[dict]:
+    """加载用户名单
+
+    名单文件为JSON数组，每个元素是一个用户配置，键名与CONFIG一致，
+    例如USER_NAME、EMAIL_SIGNATURE_NAME、EMAIL_SIGNATURE_PHONE、EMAIL_TO、PLAN_URL，
+    未提供的配置项沿用CONFIG中的值。
+
+    Args:
+        path: 名单文件路径
+
+    Returns:
+        list: 合并了全局配置的用户配置列表
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    if not isinstance(entries, list):
+        raise ValueError(f"用户名单格式错误，应为JSON数组: {path}")
+
+    profiles = []
+    for index, entry in enumerate(entries):
+        for key in REQUIRED_PROFILE_KEYS:
+            if not entry.get(key):
+                raise ValueError(f"用户名单第{index + 1}项缺少必要的配置项: {key}")
+        profiles.append({**CONFIG, **entry})
+
+    return profiles
+
+
+class PlanContentCache:
+    """批量运行期间的学习内容缓存，同一计划来源只获取一次"""
+
+    def __init__(self):
+        """初始化PlanContentCache"""
+        self._lock = threading.Lock()
+        self._events = {}
+        self._results = {}
+
+    def get(self, url: str, report_date: str = None) -> str:
+        """获取计划来源对应的当天内容
+
+        Args:
+            url: 学习计划文件地址
+            report_date: 日报日期，为None时使用当前北京时间的日期
+
+        Returns:
+            str: 用正文标签包装的当天学习内容
+        """
+        key = (url, report_date)
+        with self._lock:
+            event = self._events.get(key)
+            owner = event is None
+            if owner:
+                event = self._events[key] = threading.Event()
+
+        if owner:
+            try:
+                self._results[key] = (get_notion_content(url, report_date), None)
+            except Exception as e:
+                self._results[key] = (None, e)
+            finally:
+                event.set()
+        else:
+            event.wait()
+
+        content, error = self._results[key]
+        if error is not None:
+            raise error
+        return content
+
+
+def run_user(profile: dict, plan_cache: PlanContentCache) -> dict:
+    """为单个用户执行完整的日报流水线
+
+    各阶段由ReportPipeline完成：优先使用预生成的总结，邮件经发件箱发送，
+    当天已发送的用户直接跳过，重新运行不会重复发送。
+    任何阶段出错都只影响当前用户，错误信息记录在返回结果中。
+
+    Args:
+        profile: 用户配置
+        plan_cache: 学习内容缓存
+
+    Returns:
+        dict: 包含用户名、是否成功、发送状态、错误信息和各阶段耗时(秒)的结果
+    """
+    result = {
+        "user": profile["USER_NAME"],
+        "ok": False,
+        "status": None,
+        "error": None,
+        "stages": {},
+    }
+    stage = None
+
+    def timed(name, func, *args, **kwargs):
+        nonlocal stage
+        stage = name
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            result["stages"][name] = time.perf_counter() - start
+
+    try:
+        pipeline = ReportPipeline(profile, drain_all=False)
+        # 已在发件箱中的日报只需发送或跳过，不再获取和生成
+        if not pipeline.queued():
+            content = timed("scrape", plan_cache.get, pipeline.source, pipeline.report_date)
+            pipeline.fetch(content)
+            timed("gemini", pipeline.summarize)
+            timed("generate", pipeline.render)
+        delivery = timed("send", pipeline.deliver)
+        result["status"] = delivery.status
+        if not (delivery.ok or delivery.in_progress):
+            raise Exception(f"{delivery.error}，邮件已保存在发件箱中等待重试")
+        result["ok"] = True
+        if delivery.status == STATUS_SKIPPED:
+            logging.info(f"[{result['user']}] 今日日报已发送，跳过")
+            log_email_sent("今日日报已发送，跳过", user=result["user"])
+        elif delivery.in_progress:
+            logging.info(f"[{result['user']}] 今日日报正由其他进程发送，跳过")
+            log_email_sent("今日日报正由其他进程发送，跳过", user=result["user"])
+        else:
+            logging.info(f"[{result['user']}] 日报发送成功")
+            log_email_sent("邮件发送成功", user=result["user"])
+    except Exception as e:
+        result["error"] = f"{stage}: {str(e)}"
+        logging.error(f"[{result['user']}] 日报生成失败({stage}): {str(e)}")
+        log_email_sent(f"发送失败: {result['error']}", user=result["user"])
+
+    return result
+
+
+def run_batch(profiles: list[dict], workers: int = None) -> dict:
+    """使用有界线程池为所有用户生成并发送日报
+
+    Args:
+        profiles: 用户配置列表
+        workers: 最大并发数，为None时使用CONFIG中的BATCH_WORKERS
+
+    Returns:
+        dict: 批量运行汇总，包含每个用户的结果、吞吐量和各阶段耗时统计
+    """
+    workers = workers or CONFIG["BATCH_WORKERS"]
+    plan_cache = PlanContentCache()
+    results = []
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_user, profile, plan_cache) for profile in profiles
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    elapsed = time.perf_counter() - start
+
+    return summarize(results, elapsed)
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """计算已排序数据的百分位数(最近秩法)"""
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(results: list[dict], elapsed: float) -> dict:
+    """汇总批量运行结果
+
+    Args:
+        results: run_user返回的结果列表
+        elapsed: 总耗时(秒)
+
+    Returns:
+        dict: 汇总信息
+    """
+    succeeded = sum(1 for r in results if r["ok"])
+    stages = {}
+    for name in STAGES:
+        durations = sorted(r["stages"][name] for r in results if name in r["stages"])
+        if not durations:
+            continue
+        stages[name] = {
+            "count": len(durations),
+            "avg": sum(durations) / len(durations),
+            "p50": _percentile(durations, 50),
+            "p95": _percentile(durations, 95),
+            "max": durations[-1],
+        }
+
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+        "stages": stages,
+        "results": results,
+    }
+
+
+def log_summary(summary: dict):
+    """将批量运行汇总输出到日志"""
+    logging.info(
+        f"批量运行完成: 共{summary['total']}人，成功{summary['succeeded']}人，"
+        f"失败{summary['failed']}人，耗时{summary['elapsed']:.2f}秒，"
+        f"吞吐量{summary['throughput']:.2f}份/秒"
+    )
+    for name, stats in summary["stages"].items():
+        logging.info(
+            f"阶段 {name}: 平均{stats['avg']:.3f}s p50 {stats['p50']:.3f}s "
+            f"p95 {stats['p95']:.3f}s 最大{stats['max']:.3f}s"
+        )
+    for result in summary["results"]:
+        if not result["ok"]:
+            logging.warning(f"失败用户 {result['user']}: {result['error']}")
+
+
+def main():
+    """批量运行入口"""
+    # 加载配置，命令行参数的默认值来自配置
+    load_config()
+
+    parser = argparse.ArgumentParser(description="为名单中的所有用户批量生成并发送日报")
+    parser.add_argument("--roster", default=CONFIG["ROSTER_FILE"], help="用户名单JSON文件")
+    parser.add_argument("--workers", type=int, default=None, help="最大并发数")
+    args = parser.parse_args()
+
+    # 解析参数后再检查，--help不需要发件配置；发件账号由所有用户共用，个人信息在用户名单中配置
+    validate_config(SENDER_CONFIGS)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    setup_logger(os.path.join(script_dir, "batch_runner.log"), console_level=logging.INFO)
+
+    profiles = load_roster(args.roster)
+    logging.info(f"已加载{len(profiles)}个用户")
+
+    summary = run_batch(profiles, args.workers)
+    log_summary(summary)
+    logging.info(f"Gemini请求统计: {get_gemini_client().metrics()}")
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 入口程序启动时不应导入的重量级依赖
+LAZY_MODULES = ["google.generativeai", "requests", "dotenv"]
+
+
+def _import_time_us(module: str) -> int:
+    """在新的解释器中导入模块，返回-X importtime报告的累计导入耗时(微秒)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 顶层导入的模块名前没有缩进
+        if name.rstrip() == f" {module}":
+            return int(cumulative)
+    raise RuntimeError(f"未能在importtime输出中找到模块 {module}")
+
+
+def _eagerly_imported(module: str) -> list[str]:
+    """返回导入入口模块后已被加载的重量级依赖"""
+    code = (
+        "import sys\n"
+        f"import {module}\n"
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def bench_startup(args) -> bool:
+    """测量入口程序的导入耗时，并检查是否超出预算"""
+    ok = True
+    for module in args.modules:
+        samples = [_import_time_us(module) / 1000 for _ in range(args.repeat)]
+        median = statistics.median(samples)
+        eager = _eagerly_imported(module)
+
+        status = "OK" if median <= args.budget_ms and not eager else "FAIL"
+        print(
+            f"[{status}] import {module}: 中位数 {median:.1f}ms "
+            f"(最小 {min(samples):.1f}ms, 最大 {max(samples):.1f}ms, 预算 {args.budget_ms}ms)"
+        )
+        if eager:
+            print(f"       启动时不应导入: {', '.join(eager)}")
+        ok = ok and status == "OK"
+    return ok
+
+
+def _naive_render(content: str, name: str, phone: str) -> tuple[str, str]:
+    """逐封拼接完整模板的渲染方式，作为对照"""
+    from email_templates import HTML_LAYOUT, HTML_SIGNATURE, TEXT_LAYOUT, TEXT_SIGNATURE
+
+    body = content.split("<正文>")[1].split("</正文>")[0]
+    html = HTML_LAYOUT.format(
+        content=body, signature=HTML_SIGNATURE.format(name=name, phone=phone)
+    )
+    text = TEXT_LAYOUT.format(
+        content=body.replace("<br>", "\n").strip(),
+        signature=TEXT_SIGNATURE.format(name=name, phone=phone),
+    )
+    return html, text
+
+
+def bench_render(args) -> bool:
+    """比较逐封格式化模板与预编译模板渲染大量邮件的耗时"""
+    sys.path.insert(0, PROJECT_DIR)
+    from email_templates import EmailRenderer, get_renderer
+
+    users = [(f"User{i}", f"1380000{i:04d}") for i in range(args.users)]
+    body = "<br>".join(f"{i}. 学习内容第{i}项" for i in range(1, 21))
+    draft = EmailRenderer("", "").render_draft(body)
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        _naive_render(draft, *users[i % args.users])
+    naive = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        name, phone = users[i % args.users]
+        get_renderer(
+            {"EMAIL_SIGNATURE_NAME": name, "EMAIL_SIGNATURE_PHONE": phone}
+        ).render(draft)
+    compiled = time.perf_counter() - start
+
+    for label, elapsed in (("逐封格式化", naive), ("预编译模板", compiled)):
+        print(
+            f"{label}: {args.count}封 {elapsed * 1000:.1f}ms "
+            f"({elapsed / args.count * 1e6:.1f}us/封)"
+        )
+    print(f"加速比: {naive / compiled:.2f}x")
+    return True
+
+
+def _legacy_format_summary(text: str) -> str:
+    """原先逐个编号替换再循环合并<br>的整理方式，作为对照"""
+    formatted_text = text.strip()
+    for i in range(1, 10):
+        formatted_text = formatted_text.replace(f"{i}. ", f"{i}. <br><br>")
+        formatted_text = formatted_text.replace(f"{i}.", f"{i}. <br><br>")
+    while "<br><br><br>" in formatted_text:
+        formatted_text = formatted_text.replace("<br><br><br>", "<br><br>")
+    return formatted_text
+
+
+def bench_format(args) -> bool:
+    """比较原先的多次替换与单遍扫描整理大段模型输出的耗时"""
+    sys.path.insert(0, PROJECT_DIR)
+    from summary_formatter import format_summary
+
+    text = "".join(
+        f"{i}. 学习了第{i}个知识点，使用Python 3.12完成练习<br><br><br><br>\n"
+        for i in range(1, args.items + 1)
+    )
+    print(f"输入: {args.items}个要点, {len(text)}个字符, 重复{args.repeat}次")
+
+    # 编号后紧跟双换行且与要点内容对应，视为编号格式正确
+    well_formed = re.compile(r"(\d+)\. <br><br>学习了第\1个")
+
+    results = {}
+    for label, func in (("多次替换", _legacy_format_summary), ("单遍扫描", format_summary)):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = func(text)
+            samples.append(time.perf_counter() - start)
+        results[label] = statistics.median(samples)
+        correct = len(well_formed.findall(output))
+        print(
+            f"{label}: 中位数 {results[label] * 1000:.2f}ms, "
+            f"编号格式正确 {correct}/{args.items}"
+        )
+    print(f"加速比: {results['多次替换'] / results['单遍扫描']:.2f}x")
+    return correct == args.items
+
+
+def _e2e_plan(report_date: str, index: int, lines: int) -> str:
+    """生成第index份计划文件，每份内容不同，避免请求被合并或命中缓存"""
+    body = "\n".join(f"第{index}号计划的第{i}个知识点" for i in range(1, lines + 1))
+    return f"<{report_date}>\n{body}\n</{report_date}>\n"
+
+
+def bench_e2e(args) -> bool:
+    """使用本地替身后端测量完整流水线(获取、总结、渲染、发送)的端到端和各阶段吞吐量"""
+    import logging
+    import tempfile
+
+    sys.path.insert(0, PROJECT_DIR)
+    from config import CONFIG
+    from scraper import get_beijing_date
+    from plan_fetcher import set_plan_fetcher
+    from mock_backends import PlanFileServer, SMTPSink, install
+    from batch_runner import run_batch
+
+    # 逐用户的INFO日志会掩盖测量结果
+    logging.getLogger().setLevel(logging.WARNING)
+    workers = args.workers or CONFIG["BATCH_WORKERS"]
+    report_date = get_beijing_date()
+    ok = True
+
+    with tempfile.TemporaryDirectory() as workdir, PlanFileServer() as plans, SMTPSink() as sink:
+        # 缓存、镜像和日志都写入临时目录，不影响正式运行的数据
+        CONFIG.update(
+            {
+                "PLAN_MIRROR_DIR": os.path.join(workdir, "plans"),
+                "GEMINI_CACHE_FILE": os.path.join(workdir, "summaries.sqlite3"),
+                "GEMINI_CACHE_BYPASS": not args.cache,
+                "RUN_LOG_FILE": os.path.join(workdir, "run_log.jsonl"),
+                "LOG_FILE": os.path.join(workdir, "email_logs.txt"),
+                "OUTBOX_FILE": os.path.join(workdir, "outbox.sqlite3"),
+                "PREGEN_FILE": os.path.join(workdir, "pregenerated.sqlite3"),
+                "EMAIL_FROM": "bench@localhost",
+                "EMAIL_PASSWORD": "bench",
+                "SMTP_SERVER": sink.host,
+                "SMTP_PORT": sink.port,
+            }
+        )
+        print(
+            f"模型延迟 {args.latency * 1000:.0f}ms(+{args.jitter * 1000:.0f}ms抖动), "
+            f"并发 {workers}, 总结缓存 {'开启' if args.cache else '关闭'}"
+        )
+
+        for count in args.reports:
+            plan_count = min(count, args.plans) if args.plans else count
+            urls = [
+                plans.add(f"plan-{count}-{i}.txt", _e2e_plan(report_date, i, args.lines))
+                for i in range(plan_count)
+            ]
+            profiles = [
+                {
+                    **CONFIG,
+                    # 发件箱按(用户, 日期)去重，每轮使用不同的用户名
+                    "USER_NAME": f"user{count}-{i}",
+                    "EMAIL_SIGNATURE_NAME": f"用户{i}",
+                    "EMAIL_SIGNATURE_PHONE": f"1380000{i % 10000:04d}",
+                    "EMAIL_TO": f"user{i}@localhost",
+                    "PLAN_URL": urls[i % plan_count],
+                }
+                for i in range(count)
+            ]
+
+            # 每轮使用新的客户端和连接池，统计互不干扰
+            set_plan_fetcher(None)
+            model = install(args.latency, args.jitter)
+            received = sink.count
+
+            summary = run_batch(profiles, workers)
+            delivered = sink.count - received
+            print(
+                f"[{count}份] 成功 {summary['succeeded']}/{count}, "
+                f"耗时 {summary['elapsed']:.2f}s, 吞吐量 {summary['throughput']:.1f}份/秒, "
+                f"计划请求 {plan_count}份, 模型调用 {model.calls}次, SMTP收到 {delivered}封"
+            )
+            for name, stats in summary["stages"].items():
+                # 单个阶段在当前并发数下能支撑的吞吐量
+                capacity = workers / stats["avg"] if stats["avg"] > 0 else float("inf")
+                print(
+                    f"    {name:<8} 平均 {stats['avg'] * 1000:8.2f}ms  "
+                    f"p95 {stats['p95'] * 1000:8.2f}ms  阶段上限 {capacity:10.1f}份/秒"
+                )
+            for result in summary["results"]:
+                if not result["ok"]:
+                    print(f"    失败: {result['user']} {result['error']}")
+                    break
+            ok = ok and summary["failed"] == 0 and delivered == count
+
+        set_plan_fetcher(None)
+    return ok
+
+
+def bench_stream(args) -> bool:
+    """比较一次性请求与流式请求的首个片段延迟和总结就绪时间，并验证截止时间打断后保留的部分结果"""
+    import logging
+
+    sys.path.insert(0, PROJECT_DIR)
+    from config import CONFIG
+    from mock_backends import install
+    from gemini_processor import PartialSummary, get_gemini_client, process_with_gemini
+    from summary_formatter import StreamingFormatter, format_summary
+
+    logging.getLogger().setLevel(logging.ERROR)
+    content = "<正文>\n" + "\n".join(f"第{i}个知识点" for i in range(1, args.lines + 1)) + "\n</正文>"
+    CONFIG.update({"GEMINI_CACHE_BYPASS": True, "GEMINI_STREAM_DEADLINE": 0})
+    print(f"模型延迟 {args.latency * 1000:.0f}ms, 每份 {args.lines} 个知识点, 重复{args.repeat}次")
+
+    outputs = {}
+    for label, streaming in (("一次性", False), ("流式", True)):
+        CONFIG["GEMINI_STREAM"] = streaming
+        install(args.latency)
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            outputs[label] = process_with_gemini(content)
+            samples.append(time.perf_counter() - start)
+        stats = get_gemini_client().metrics()
+        first = f"{stats['avg_first_token_latency'] * 1000:.1f}ms" if streaming else "-"
+        print(
+            f"{label}: 就绪时间中位数 {statistics.median(samples) * 1000:.1f}ms, "
+            f"平均首个片段延迟 {first}"
+        )
+    same = outputs["一次性"] == outputs["流式"]
+    print(f"整理结果一致: {'是' if same else '否'}")
+
+    # 逐字符输入包含空要点、连续空行和需要转义内容的输出，整理结果应与整段整理相同
+    samples = [
+        "1.\n\n2. foo",
+        "1. a\n\n\n\n2.\n\n3. b\n",
+        "  \r\n1、学习了<div>标签 & Python<br/><br><BR>2) 12.5%\r\n\r\n3．<b>重点</b>",
+        "总结：\n1.\n2.\n\n\n10. &amp; &#12\n",
+    ]
+    mismatched = 0
+    for text in samples:
+        formatter = StreamingFormatter()
+        streamed = "".join(formatter.feed(char) for char in text) + formatter.close()
+        mismatched += streamed != format_summary(text)
+    print(f"逐字符整理与整段整理一致: {len(samples) - mismatched}/{len(samples)}")
+    same = same and mismatched == 0
+
+    # 截止时间设在输出中途，只保留已完整的要点
+    CONFIG["GEMINI_STREAM_DEADLINE"] = args.latency * 0.75
+    install(args.latency)
+    start = time.perf_counter()
+    partial = process_with_gemini(content)
+    elapsed = time.perf_counter() - start
+    items = partial.count("<br><br>") // 2
+    salvaged = isinstance(partial, PartialSummary) and 0 < items < args.lines
+    print(
+        f"截止时间 {args.latency * 750:.0f}ms: 耗时 {elapsed * 1000:.1f}ms, "
+        f"保留 {items}/{args.lines} 个完整要点, "
+        f"{'部分结果' if isinstance(partial, PartialSummary) else '完整结果'}"
+    )
+    CONFIG["GEMINI_STREAM"] = False
+    return same and salvaged and outputs["流式"].startswith(partial)
+
+
+def bench_route(args) -> bool:
+    """使用延迟不同的假模型测量对冲请求对长尾延迟的改善，并验证首选模型不可用时的回退和路由切换"""
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+
+    sys.path.insert(0, PROJECT_DIR)
+    from config import CONFIG
+    from mock_backends import FakeModel, install
+    from gemini_processor import get_gemini_client
+
+    logging.getLogger().setLevel(logging.ERROR)
+    CONFIG.update(
+        {
+            "GEMINI_MODELS": "primary,backup",
+            "GEMINI_BACKOFF_BASE": 0.001,
+            "GEMINI_ROUTE_MIN_SAMPLES": 5,
+        }
+    )
+    latency = args.latency
+    print(
+        f"首选模型 {latency * 1000:.0f}ms, {args.slow_rate:.0%}请求额外慢 {latency * args.slow_factor * 1000:.0f}ms; "
+        f"备用模型 {latency * 1.5 * 1000:.0f}ms; 请求 {args.requests}次, 并发 {args.workers}"
+    )
+
+    def run(label: str, models: dict) -> dict:
+        install(models=models)
+        client = get_gemini_client()
+        # 为首选模型积累延迟样本后再开始测量
+        for i in range(CONFIG["GEMINI_ROUTE_MIN_SAMPLES"]):
+            client.generate(f"warm-up {label} {i}")
+
+        def timed_call(i):
+            start = time.perf_counter()
+            try:
+                client.generate(f"request {label} {i}")
+                return time.perf_counter() - start, True
+            except Exception:
+                return time.perf_counter() - start, False
+
+        with ThreadPoolExecutor(args.workers) as pool:
+            results = list(pool.map(timed_call, range(args.requests)))
+        samples = sorted(elapsed for elapsed, _ in results)
+        stats = client.metrics()
+        route = client.model_stats()["route"]
+        succeeded = sum(ok for _, ok in results)
+        print(
+            f"{label}: 成功 {succeeded}/{args.requests}, "
+            f"p50 {statistics.median(samples) * 1000:.1f}ms, "
+            f"p95 {samples[int(len(samples) * 0.95) - 1] * 1000:.1f}ms, "
+            f"最大 {samples[-1] * 1000:.1f}ms, 对冲 {stats['hedged']}次(胜出{stats['hedge_wins']}), "
+            f"回退 {stats['fallbacks']}次, 默认路由 {route}"
+        )
+        return {"ok": succeeded == args.requests, "p95": samples[int(len(samples) * 0.95) - 1], "route": route}
+
+    def tail_models(error_rate: float = 0.0) -> dict:
+        return {
+            "primary": FakeModel(
+                latency,
+                error_rate=error_rate,
+                slow_rate=args.slow_rate,
+                slow_latency=latency * args.slow_factor,
+            ),
+            "backup": FakeModel(latency * 1.5),
+        }
+
+    CONFIG["GEMINI_HEDGE_PERCENTILE"] = 0
+    baseline = run("不对冲", tail_models())
+    CONFIG["GEMINI_HEDGE_PERCENTILE"] = args.percentile
+    hedged = run(f"p{args.percentile:.0f}对冲", tail_models())
+    outage = run("首选模型不可用", tail_models(error_rate=1.0))
+    print(f"p95改善: {baseline['p95'] / hedged['p95']:.2f}x")
+    return (
+        baseline["ok"]
+        and hedged["ok"]
+        and hedged["p95"] < baseline["p95"]
+        and outage["ok"]
+        and outage["route"] == "backup"
+    )
+
+
+def main():
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description="自动日报生成器基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="测量入口程序的启动导入耗时")
+    startup.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_BUDGET_MS", "100")),
+        help="导入耗时预算(毫秒)，超出时返回非零退出码",
+    )
+    startup.add_argument("--repeat", type=int, default=5, help="重复测量次数")
+    startup.add_argument(
+        "--modules",
+        nargs="+",
+        default=["main", "github_action_runner"],
+        help="需要测量的入口模块",
+    )
+    startup.set_defaults(func=bench_startup)
+
+    render = subparsers.add_parser("render", help="测量批量渲染邮件模板的耗时")
+    render.add_argument("--count", type=int, default=5000, help="渲染的邮件数量")
+    render.add_argument("--users", type=int, default=50, help="不同签名的用户数量")
+    render.set_defaults(func=bench_render)
+
+    fmt = subparsers.add_parser("format", help="测量整理模型输出的耗时")
+    fmt.add_argument("--items", type=int, default=20000, help="模型输出中的要点数量")
+    fmt.add_argument("--repeat", type=int, default=5, help="重复测量次数")
+    fmt.set_defaults(func=bench_format)
+
+    e2e = subparsers.add_parser("e2e", help="使用本地替身后端测量完整流水线的吞吐量")
+    e2e.add_argument(
+        "--reports", type=int, nargs="+", default=[1, 100, 10000], help="每轮生成的日报数量"
+    )
+    e2e.add_argument("--workers", type=int, default=None, help="并发数，默认使用BATCH_WORKERS")
+    e2e.add_argument("--latency", type=float, default=0.02, help="假模型每次请求的延迟(秒)")
+    e2e.add_argument("--jitter", type=float, default=0.0, help="假模型的随机延迟上限(秒)")
+    e2e.add_argument(
+        "--plans", type=int, default=None, help="不同计划文件的数量，默认每份日报各不相同"
+    )
+    e2e.add_argument("--lines", type=int, default=8, help="每份计划当天的知识点数量")
+    e2e.add_argument("--cache", action="store_true", help="开启Gemini总结缓存")
+    e2e.set_defaults(func=bench_e2e)
+
+    stream = subparsers.add_parser("stream", help="比较流式与一次性请求的首个片段延迟和截止时间处理")
+    stream.add_argument("--latency", type=float, default=0.5, help="假模型每次请求的延迟(秒)")
+    stream.add_argument("--lines", type=int, default=20, help="学习内容的知识点数量")
+    stream.add_argument("--repeat", type=int, default=3, help="重复测量次数")
+    stream.set_defaults(func=bench_stream)
+
+    route = subparsers.add_parser("route", help="测量对冲请求、模型回退和延迟路由")
+    route.add_argument("--latency", type=float, default=0.02, help="首选假模型的延迟(秒)")
+    route.add_argument("--slow-rate", type=float, default=0.1, help="首选模型出现长尾延迟的概率")
+    route.add_argument("--slow-factor", type=float, default=10, help="长尾请求额外延迟相对基础延迟的倍数")
+    route.add_argument("--percentile", type=float, default=90, help="发出对冲请求的延迟分位")
+    route.add_argument("--requests", type=int, default=400, help="每轮请求次数")
+    route.add_argument("--workers", type=int, default=8, help="并发数")
+    route.set_defaults(func=bench_route)
+
+    args = parser.parse_args()
+    if not args.func(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,175 @@
-import os
-from dotenv import load_dotenv
-
-# 加载环境变量
-load_dotenv()
-
-# 配置字典
-CONFIG = {
-    # Gemini API配置
-    "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
-    # Telegram配置
-    "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN"),
-    "TELEGRAM_CHAT_ID": os.getenv("TELEGRAM_CHAT_ID"),
-    # 个人信息配置
-    "USER_NAME": os.getenv("USER_NAME"),
-    "EMAIL_SIGNATURE_NAME": os.getenv("EMAIL_SIGNATURE_NAME"),
-    "EMAIL_SIGNATURE_PHONE": os.getenv("EMAIL_SIGNATURE_PHONE"),
-    # 邮件配置
-    "EMAIL_FROM": os.getenv("EMAIL_FROM"),
-    "EMAIL_PASSWORD": os.getenv("EMAIL_PASSWORD"),
-    "EMAIL_TO": os.getenv("EMAIL_TO"),
-    # SMTP配置
-    "SMTP_SERVER": os.getenv("SMTP_SERVER"),
-    "SMTP_PORT": int(os.getenv("SMTP_PORT", "465")),  # 转换为整数
-    # 日志配置
-    "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),  # 保留默认值
-    "LOG_FILE": os.getenv("LOG_FILE", "alice studio_email_logs.txt"),  # 保留默认值
-}
-
-# 验证必要的配置
-required_configs = [
-    "EMAIL_FROM",
-    "EMAIL_PASSWORD",
-    "EMAIL_TO",
-    "SMTP_SERVER",
-    "SMTP_PORT",
-    "USER_NAME",
-    "EMAIL_SIGNATURE_NAME",
-    "EMAIL_SIGNATURE_PHONE",
-]
-
-for config_name in required_configs:
-    if not CONFIG.get(config_name):
-        raise ValueError(f"缺少必要的配置项: {config_name}")
-
-
-# 添加Config类
-class Config:
-    """配置类，用于提供配置访问接口"""
-
-    def __init__(self):
-        """初始化配置"""
-        self.config = CONFIG
-
-    def get(self, key, default=None):
-        """获取配置值"""
-        return self.config.get(key, default)
-
-    def __getattr__(self, name):
-        """通过属性方式访问配置"""
-        return self.config.get(name)
+import os
+
+
+def _read_config() -> dict:
+    """从环境变量读取配置"""
+    return {
+        # Gemini API配置
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY"),
+        # Gemini请求限流与重试配置
+        "GEMINI_RPM": float(os.getenv("GEMINI_RPM", "10")),  # 每分钟请求数上限
+        "GEMINI_BURST": int(os.getenv("GEMINI_BURST", "2")),  # 允许的突发请求数
+        "GEMINI_TIMEOUT": float(os.getenv("GEMINI_TIMEOUT", "120")),  # 单次请求超时(秒)
+        "GEMINI_MAX_RETRIES": int(os.getenv("GEMINI_MAX_RETRIES", "4")),  # 最大重试次数
+        "GEMINI_BACKOFF_BASE": float(os.getenv("GEMINI_BACKOFF_BASE", "2")),  # 退避基数(秒)
+        "GEMINI_BACKOFF_MAX": float(os.getenv("GEMINI_BACKOFF_MAX", "60")),  # 最长退避时间(秒)
+        # Gemini模型链：按优先级排列，"名称:超时秒数"可单独指定超时，未指定时使用GEMINI_TIMEOUT
+        "GEMINI_MODELS": os.getenv(
+            "GEMINI_MODELS", "gemini-2.0-flash-thinking-exp-01-21,gemini-2.0-flash:60"
+        ),
+        "GEMINI_HEDGE_PERCENTILE": float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),  # 对冲请求的延迟分位，0表示关闭
+        "GEMINI_LATENCY_WINDOW": int(os.getenv("GEMINI_LATENCY_WINDOW", "50")),  # 每个模型保留的延迟样本数
+        "GEMINI_ROUTE_MIN_SAMPLES": int(os.getenv("GEMINI_ROUTE_MIN_SAMPLES", "5")),  # 参与路由判断的最少样本数
+        "GEMINI_ROUTE_P95_TARGET": float(os.getenv("GEMINI_ROUTE_P95_TARGET", "0")),  # 默认路由的p95上限(秒)，0表示使用模型超时
+        # Gemini总结缓存配置
+        "GEMINI_CACHE_FILE": os.getenv("GEMINI_CACHE_FILE", ".cache/gemini_summaries.sqlite3"),
+        "GEMINI_CACHE_TTL": float(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600))),  # 有效期(秒)
+        "GEMINI_CACHE_MAX_ENTRIES": int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "1000")),
+        "GEMINI_CACHE_BYPASS": os.getenv("GEMINI_CACHE_BYPASS", "false").lower() == "true",
+        # 多天合并总结时每次请求的输入token上限
+        "GEMINI_BATCH_TOKEN_BUDGET": int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", "8000")),
+        # 提示词与生成参数，可在用户名单中按用户覆盖
+        "GEMINI_INPUT_TOKEN_BUDGET": int(os.getenv("GEMINI_INPUT_TOKEN_BUDGET", "4000")),  # 单天学习内容的token上限
+        "GEMINI_MAX_OUTPUT_TOKENS": int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "2048")),  # 单天总结的输出token上限
+        "GEMINI_TEMPERATURE": float(os.getenv("GEMINI_TEMPERATURE", "0.7")),
+        # 流式输出配置
+        "GEMINI_STREAM": os.getenv("GEMINI_STREAM", "false").lower() == "true",
+        "GEMINI_STREAM_DEADLINE": float(os.getenv("GEMINI_STREAM_DEADLINE", "90")),  # 截止时间(秒)，0表示不限制
+        # Telegram配置
+        "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN"),
+        "TELEGRAM_CHAT_ID": os.getenv("TELEGRAM_CHAT_ID"),
+        # 个人信息配置
+        "USER_NAME": os.getenv("USER_NAME"),
+        "EMAIL_SIGNATURE_NAME": os.getenv("EMAIL_SIGNATURE_NAME"),
+        "EMAIL_SIGNATURE_PHONE": os.getenv("EMAIL_SIGNATURE_PHONE"),
+        # 邮件配置
+        "EMAIL_FROM": os.getenv("EMAIL_FROM"),
+        "EMAIL_PASSWORD": os.getenv("EMAIL_PASSWORD"),
+        "EMAIL_TO": os.getenv("EMAIL_TO"),
+        # SMTP配置
+        "SMTP_SERVER": os.getenv("SMTP_SERVER"),
+        "SMTP_PORT": int(os.getenv("SMTP_PORT", "465")),  # 转换为整数
+        "SMTP_TIMEOUT": float(os.getenv("SMTP_TIMEOUT", "30")),  # 连接超时(秒)
+        "SMTP_DEBUG": int(os.getenv("SMTP_DEBUG", "0")),  # smtplib调试级别，1为输出协议交互
+        "SMTP_POOL_SIZE": int(os.getenv("SMTP_POOL_SIZE", "4")),  # 每个账号保留的空闲连接数
+        "SMTP_IDLE_TIMEOUT": float(os.getenv("SMTP_IDLE_TIMEOUT", "60")),  # 空闲连接复用前检查的阈值(秒)
+        "SMTP_MAX_RETRIES": int(os.getenv("SMTP_MAX_RETRIES", "2")),  # 连接断开后的重试次数
+        # 发件箱配置
+        "OUTBOX_FILE": os.getenv("OUTBOX_FILE", ".cache/outbox.sqlite3"),
+        "OUTBOX_MAX_ATTEMPTS": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),  # 最大发送尝试次数
+        "OUTBOX_BACKOFF_BASE": float(os.getenv("OUTBOX_BACKOFF_BASE", "60")),  # 重试退避基数(秒)
+        "OUTBOX_BACKOFF_MAX": float(os.getenv("OUTBOX_BACKOFF_MAX", "3600")),  # 最长退避时间(秒)
+        "OUTBOX_LEASE": float(os.getenv("OUTBOX_LEASE", "300")),  # 发送中断后可重新领取的时间(秒)
+        # 预生成配置
+        "PREGEN_FILE": os.getenv("PREGEN_FILE", ".cache/pregenerated.sqlite3"),
+        "PREGEN_DAYS": int(os.getenv("PREGEN_DAYS", "2")),  # 从当天开始预生成的天数
+        # 日志配置
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),  # 保留默认值
+        "LOG_FILE": os.getenv("LOG_FILE", "alice studio_email_logs.txt"),  # 保留默认值，邮件发送记录仍按原格式写入此文件
+        # 结构化运行日志配置
+        "RUN_LOG_FILE": os.getenv("RUN_LOG_FILE", "run_log.jsonl"),  # 邮件发送等事件的JSON Lines日志
+        "RUN_LOG_MAX_BYTES": int(os.getenv("RUN_LOG_MAX_BYTES", str(5 * 1024 * 1024))),  # 按大小轮转的阈值
+        "RUN_LOG_BACKUP_COUNT": int(os.getenv("RUN_LOG_BACKUP_COUNT", "5")),  # 保留的历史文件数
+        "RUN_LOG_ROTATE_WHEN": os.getenv("RUN_LOG_ROTATE_WHEN", ""),  # 按时间轮转的周期，例如midnight
+        # 运行指标配置
+        "METRICS_FILE": os.getenv("METRICS_FILE", "run_metrics.jsonl"),  # 每次运行的指标记录
+        "METRICS_PROM_FILE": os.getenv("METRICS_PROM_FILE"),  # Prometheus文本格式导出路径，可选
+        # 学习计划来源配置
+        "PLAN_URL": os.getenv(
+            "PLAN_URL",
+            "https://raw.githubusercontent.com/zhaojinyang117/auto_daily_report/refs/heads/main/study_today.txt",
+        ),
+        "PLAN_MIRROR_DIR": os.getenv("PLAN_MIRROR_DIR", ".cache/plans"),  # 计划文件本地镜像目录
+        "PLAN_CONNECT_TIMEOUT": float(os.getenv("PLAN_CONNECT_TIMEOUT", "5")),  # 连接超时(秒)
+        "PLAN_READ_TIMEOUT": float(os.getenv("PLAN_READ_TIMEOUT", "15")),  # 读取超时(秒)
+        "PLAN_FETCH_RETRIES": int(os.getenv("PLAN_FETCH_RETRIES", "3")),  # 失败重试次数
+        "PLAN_FETCH_BACKOFF": float(os.getenv("PLAN_FETCH_BACKOFF", "0.5")),  # 重试退避系数(秒)
+        "PLAN_FETCH_WORKERS": int(os.getenv("PLAN_FETCH_WORKERS", "8")),  # 多来源并发获取的线程数
+        "PLAN_SOURCE_DEADLINE": float(os.getenv("PLAN_SOURCE_DEADLINE", "0")),  # 多来源时单个来源的截止时间(秒)，0表示按超时和重试次数计算
+        # 批量运行配置
+        "ROSTER_FILE": os.getenv("ROSTER_FILE", "users.json"),
+        "BATCH_WORKERS": int(os.getenv("BATCH_WORKERS", "8")),
+        # 常驻调度配置
+        "SEND_TIME": os.getenv("SEND_TIME", "20:00"),  # 每天的发送时间(HH:MM)
+        "SEND_TIMEZONE": os.getenv("SEND_TIMEZONE", "Asia/Shanghai"),  # 发送时间所在时区
+        "SEND_DAYS": os.getenv("SEND_DAYS", "mon,tue,wed,thu,fri"),  # 发送的星期，逗号分隔
+        "SEND_JITTER": float(os.getenv("SEND_JITTER", "300")),  # 到点后随机延迟的上限(秒)
+        # 异步流水线各阶段并发上限
+        "ASYNC_FETCH_CONCURRENCY": int(os.getenv("ASYNC_FETCH_CONCURRENCY", "8")),
+        "ASYNC_LLM_CONCURRENCY": int(os.getenv("ASYNC_LLM_CONCURRENCY", "4")),
+        "ASYNC_SEND_CONCURRENCY": int(os.getenv("ASYNC_SEND_CONCURRENCY", "4")),
+    }
+
+
+# 配置字典，导入时只读取环境变量，调用load_config后才会加载.env文件
+CONFIG = _read_config()
+
+# 必要的配置项
+REQUIRED_CONFIGS = [
+    "EMAIL_FROM",
+    "EMAIL_PASSWORD",
+    "EMAIL_TO",
+    "SMTP_SERVER",
+    "SMTP_PORT",
+    "USER_NAME",
+    "EMAIL_SIGNATURE_NAME",
+    "EMAIL_SIGNATURE_PHONE",
+]
+
+_loaded = False
+
+
+def load_config(reload: bool = False) -> dict:
+    """加载.env文件并刷新CONFIG
+
+    导入本模块时不加载.env，也不做验证，由入口程序显式调用，
+    以免每次启动都在导入阶段付出这些开销。
+
+    Args:
+        reload: 是否重新加载，为True时.env中的值会覆盖已有的环境变量
+
+    Returns:
+        dict: 刷新后的CONFIG
+    """
+    global _loaded
+    if _loaded and not reload:
+        return CONFIG
+
+    from dotenv import load_dotenv
+
+    # 加载环境变量
+    load_dotenv(override=reload)
+    CONFIG.update(_read_config())
+    _loaded = True
+    return CONFIG
+
+
+def validate_config(required: list[str] = None):
+    """验证必要的配置
+
+    Args:
+        required: 需要验证的配置项，为None时使用REQUIRED_CONFIGS
+
+    Raises:
+        ValueError: 缺少必要的配置项
+    """
+    for config_name in required or REQUIRED_CONFIGS:
+        if not CONFIG.get(config_name):
+            raise ValueError(f"缺少必要的配置项: {config_name}")
+
+
+# 添加Config类
+class Config:
+    """配置类，用于提供配置访问接口"""
+
+    def __init__(self):
+        """初始化配置"""
+        self.config = load_config()
+
+    def get(self, key, default=None):
+        """获取配置值"""
+        return self.config.get(key, default)
+
+    def __getattr__(self, name):
+        """通过属性方式访问配置"""
+        return self.config.get(name)
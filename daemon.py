@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import random
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import schedule
+
+from config import CONFIG, load_config, validate_config
+from logger import log_email_sent, setup_logger
+from scraper import load_plan_index
+from plan_index import get_plan_index
+from gemini_processor import get_gemini_client
+from email_sender import get_smtp_pool
+from outbox import get_outbox
+from batch_runner import SENDER_CONFIGS, load_roster
+from main import run_report
+from metrics import record_run
+
+# 星期缩写到schedule方法名的映射
+WEEKDAYS = {
+    "mon": "monday",
+    "tue": "tuesday",
+    "wed": "wednesday",
+    "thu": "thursday",
+    "fri": "friday",
+    "sat": "saturday",
+    "sun": "sunday",
+}
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 常驻进程运行期间变化后需要重新加载的文件，与load_dotenv查找的.env一致，按模块目录解析而不是工作目录
+WATCHED_FILES = [os.path.join(PROJECT_DIR, ".env")]
+
+
+class ReportDaemon:
+    """常驻的日报调度进程
+
+    进程启动后保持计划文件的HTTP会话、Gemini客户端、计划表索引和SMTP连接池常驻，
+    每个用户按各自配置的时区和时间触发任务，并加入随机延迟以错开请求。
+    收到SIGHUP或配置文件、名单文件变化时重新加载，无需重启进程。
+    """
+
+    def __init__(self, roster_path: str = None, workers: int = None):
+        """初始化ReportDaemon
+
+        Args:
+            roster_path: 用户名单文件，为None时使用CONFIG中的ROSTER_FILE，文件不存在时只为.env中的用户发送
+            workers: 同时运行的任务数上限，为None时使用CONFIG中的BATCH_WORKERS
+        """
+        self.roster_path = roster_path
+        self.scheduler = schedule.Scheduler()
+        self.executor = ThreadPoolExecutor(max_workers=workers or CONFIG["BATCH_WORKERS"])
+        self.profiles = []
+        self._reload_requested = threading.Event()
+        self._stop_requested = threading.Event()
+        self._running = set()  # 正在运行的用户，避免同一用户的任务重叠
+        self._running_lock = threading.Lock()
+        self._mtimes = {}
+
+    def _roster_file(self) -> str:
+        """当前使用的名单文件路径"""
+        return self.roster_path or CONFIG["ROSTER_FILE"]
+
+    def load_profiles(self) -> list[dict]:
+        """加载用户配置，没有名单文件时使用.env中的单个用户"""
+        roster = self._roster_file()
+        if os.path.exists(roster):
+            return load_roster(roster)
+        validate_config()
+        return [dict(CONFIG)]
+
+    def warm_up(self):
+        """预先建立各个常驻对象，之后的任务不再付出初始化开销"""
+        for url in {profile["PLAN_URL"] for profile in self.profiles}:
+            try:
+                index = load_plan_index(url)
+                logging.info(f"已加载计划表索引: {url} ({len(index)}天)")
+            except Exception as e:
+                logging.warning(f"预加载计划表失败({url}): {str(e)}")
+        try:
+            get_gemini_client().warm_up(reconfigure=True)
+        except Exception as e:
+            logging.warning(f"预加载Gemini客户端失败: {str(e)}")
+        get_smtp_pool()
+        get_outbox()
+
+    def schedule_jobs(self):
+        """按每个用户的发送时间重新安排任务"""
+        self.scheduler.clear("report")
+        for profile in self.profiles:
+            days = [day.strip().lower()[:3] for day in profile["SEND_DAYS"].split(",")]
+            for day in days:
+                if day not in WEEKDAYS:
+                    raise ValueError(f"{profile['USER_NAME']}的SEND_DAYS格式错误: {day}")
+                job = getattr(self.scheduler.every(), WEEKDAYS[day])
+                job.at(profile["SEND_TIME"], profile["SEND_TIMEZONE"]).do(
+                    self.dispatch, profile
+                ).tag("report", profile["USER_NAME"])
+            logging.info(
+                f"已安排 {profile['USER_NAME']}: {','.join(days)} {profile['SEND_TIME']} "
+                f"({profile['SEND_TIMEZONE']})"
+            )
+
+    def dispatch(self, profile: dict):
+        """到达发送时间后，随机延迟一段时间再提交任务，避免所有用户同时请求"""
+        delay = random.uniform(0, float(profile["SEND_JITTER"]))
+        logging.info(f"[{profile['USER_NAME']}] 将在{delay:.0f}秒后生成日报")
+        self.scheduler.every(max(1, round(delay))).seconds.do(self._submit_once, profile)
+
+    def _submit_once(self, profile: dict):
+        """提交一次任务，返回CancelJob使延迟任务只执行一次"""
+        self.executor.submit(self.run_profile, profile)
+        return schedule.CancelJob
+
+    def run_profile(self, profile: dict):
+        """为单个用户生成并发送日报，同一用户的任务不会同时运行"""
+        user = profile["USER_NAME"]
+        with self._running_lock:
+            if user in self._running:
+                logging.warning(f"[{user}] 上一次任务尚未结束，跳过本次")
+                return
+            self._running.add(user)
+
+        try:
+            with record_run("daemon", user=user) as run:
+                try:
+                    run_report(profile)
+                except Exception as e:
+                    error_message = f"发送失败: {str(e)}"
+                    run.mark_failed(error_message)
+                    log_email_sent(error_message, user=user)
+                    logging.error(f"[{user}] {error_message}")
+        finally:
+            with self._running_lock:
+                self._running.discard(user)
+
+    def run_all_now(self):
+        """立即为所有用户提交任务"""
+        for profile in self.profiles:
+            self.executor.submit(self.run_profile, profile)
+
+    def _watched_mtimes(self) -> dict:
+        """配置文件和名单文件的修改时间"""
+        mtimes = {}
+        for path in WATCHED_FILES + [self._roster_file()]:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def reload(self):
+        """重新加载配置、用户名单和计划表，并重新安排任务
+
+        加载失败时保留原有的配置和任务继续运行。
+        """
+        logging.info("正在重新加载配置...")
+        try:
+            load_config(reload=True)
+            profiles = self.load_profiles()
+        except Exception as e:
+            logging.error(f"重新加载配置失败，继续使用原有配置: {str(e)}")
+            return
+
+        # 计划表索引按内容缓存，清空后重新获取时会建立新索引
+        get_plan_index.cache_clear()
+        self.profiles = profiles
+        self.warm_up()
+        self.schedule_jobs()
+        self._mtimes = self._watched_mtimes()
+        logging.info(f"重新加载完成，共{len(self.profiles)}个用户")
+
+    def request_reload(self, *args):
+        """请求重新加载，可作为信号处理函数"""
+        self._reload_requested.set()
+
+    def request_stop(self, *args):
+        """请求停止，可作为信号处理函数"""
+        self._stop_requested.set()
+
+    def run_forever(self, poll_interval: float = 1.0, run_now: bool = False):
+        """运行调度循环，直到收到停止请求
+
+        Args:
+            poll_interval: 检查到期任务的间隔(秒)
+            run_now: 预热完成后立即为所有用户运行一次
+        """
+        self.profiles = self.load_profiles()
+        self.warm_up()
+        self.schedule_jobs()
+        self._mtimes = self._watched_mtimes()
+        logging.info(f"调度进程已启动，共{len(self.profiles)}个用户")
+        if run_now:
+            self.run_all_now()
+
+        while not self._stop_requested.is_set():
+            if self._reload_requested.is_set() or self._watched_mtimes() != self._mtimes:
+                self._reload_requested.clear()
+                self.reload()
+            self.scheduler.run_pending()
+            self._stop_requested.wait(poll_interval)
+
+        logging.info("正在停止调度进程，等待运行中的任务结束...")
+        self.scheduler.clear()
+        self.executor.shutdown(wait=True)
+        get_smtp_pool().close_all()
+        logging.info("调度进程已停止")
+
+
+def main():
+    """常驻调度进程入口"""
+    parser = argparse.ArgumentParser(description="常驻进程，按每个用户的发送时间自动生成并发送日报")
+    parser.add_argument("--roster", default=None, help="用户名单JSON文件，不存在时只为.env中的用户发送")
+    parser.add_argument("--workers", type=int, default=None, help="同时运行的任务数上限")
+    parser.add_argument("--run-now", action="store_true", help="启动后立即为所有用户运行一次")
+    args = parser.parse_args()
+
+    load_config()
+    validate_config(SENDER_CONFIGS)
+
+    setup_logger(os.path.join(PROJECT_DIR, "daemon.log"), console_level=logging.INFO)
+
+    daemon = ReportDaemon(args.roster, args.workers)
+    signal.signal(signal.SIGINT, daemon.request_stop)
+    signal.signal(signal.SIGTERM, daemon.request_stop)
+    # Windows没有SIGHUP，可以通过修改.env或名单文件触发重新加载
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, daemon.request_reload)
+
+    # --run-now的任务在预热之后提交，第一次运行不再付出冷启动开销
+    daemon.run_forever(run_now=args.run_now)
+
+
+if __name__ == "__main__":
+    main()
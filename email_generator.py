@@ -1,62 +1,65 @@
-import os
-from datetime import datetime
-from gemini_processor import process_with_gemini
-from config import Config
-
-
-def generate_email(content: str) -> str:
-    # 使用Gemini处理内容
-    processed_content = process_with_gemini(content)
-
-    # 从配置获取名字和电话
-    config = Config()
-    name = config.get("EMAIL_SIGNATURE_NAME")
-    phone = config.get("EMAIL_SIGNATURE_PHONE")
-
-    # 邮件模板
-    email_template = """Hi teacher,
-<正文>
-{content}
-</正文>
---
-Best Regards,
-
-
-{name} / Intern
- 
-Medalsoft International，Tianjin
-T: 400 856 0080  |  M: {phone}
-www.medalsoft.com  Check out our product Here 
- Digital Transformation & AIGC (Generative AI) Solutions  
-"""
-
-    return email_template.format(content=processed_content, name=name, phone=phone)
-
-
-# 添加EmailGenerator类
-class EmailGenerator:
-    """邮件生成器类，用于生成邮件内容"""
-
-    def __init__(self):
-        """初始化EmailGenerator"""
-        self.config = Config()
-
-    def generate(self, content: str) -> tuple[str, str]:
-        """生成邮件内容和主题
-
-        Args:
-            content: 处理后的内容
-
-        Returns:
-            tuple: (邮件主题, 邮件HTML内容)
-        """
-        # 生成邮件主题（标题）
-        today = datetime.now().strftime("%Y-%m-%d")
-        # 使用CONFIG中的USER_NAME作为名字
-        name = self.config.get("USER_NAME")
-        subject = f"{name} {today} 日报"
-
-        # 生成邮件内容
-        html_content = generate_email(content)
-
-        return subject, html_content
+import os
+from datetime import datetime
+from gemini_processor import process_with_gemini
+from config import Config
+from email_templates import get_renderer
+from metrics import timed
+
+
+def generate_email(content: str, profile: dict = None) -> str:
+    """处理学习内容并生成邮件文本
+
+    Args:
+        content: 原始学习内容
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        str: 邮件文本
+    """
+    # 使用Gemini处理内容
+    processed_content = process_with_gemini(content, profile=profile)
+
+    return render_email(processed_content, profile)
+
+
+@timed("render")
+def render_email(processed_content: str, profile: dict = None) -> str:
+    """将处理后的内容填入邮件模板
+
+    Args:
+        processed_content: Gemini处理后的学习总结
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        str: 邮件文本
+    """
+    return get_renderer(profile).render_draft(processed_content)
+
+
+# 添加EmailGenerator类
+class EmailGenerator:
+    """邮件生成器类，用于生成邮件内容"""
+
+    def __init__(self):
+        """初始化EmailGenerator"""
+        self.config = Config()
+
+    def generate(self, content: str) -> tuple[str, str]:
+        """生成邮件内容和主题
+
+        Args:
+            content: 处理后的内容
+
+        Returns:
+            tuple: (邮件主题, 邮件HTML内容)
+        """
+        # 生成邮件主题（标题）
+        today = datetime.now().strftime("%Y-%m-%d")
+        # 使用CONFIG中的USER_NAME作为名字
+        name = self.config.get("USER_NAME")
+        subject = f"{name} {today} 日报"
+
+        # 传入的内容已经过Gemini处理，只需填入模板
+        html_content = render_email(content)
+
+        return subject, html_content
@@ -1,176 +1,390 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from config import CONFIG
-import ssl
-import logging
-from datetime import datetime
-
-# 配置日志
-logging.basicConfig(level=logging.INFO)
-
-
-def send_email(content):
-    # 生成邮件标题
-    today = datetime.now().strftime("%Y-%m-%d")
-    subject = f"{CONFIG['USER_NAME']} {today} 日报"
-
-    # 处理多个收件人
-    recipients = [email.strip() for email in CONFIG["EMAIL_TO"].split(",")]
-
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"] = CONFIG["EMAIL_FROM"]
-    msg["To"] = ", ".join(recipients)  # 用逗号和空格连接多个收件人
-
-    # 创建HTML版本的邮件内容
-    html = f"""
-    <div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
-        Hi teacher,<br>
-        <div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
-        {content.split("<正文>")[1].split("</正文>")[0]}
-        </div>
-        --<br>
-        Best Regards,<br><br>
-    </div>
-    <div style="font-family: 'Segoe UI';">
-        <span style="color: black; font-weight: bold; font-size: 13pt;">{CONFIG["EMAIL_SIGNATURE_NAME"]}</span>
-        <span style="color: blue; font-weight: bold; font-size: 11pt;"> / Intern</span><br>
-        <span style="color: black; font-size: 10pt;">Medalsoft International，</span>
-        <span style="color: blue; font-weight: bold; font-size: 10pt;">Tianjin</span><br>
-        <span style="color: black; font-size: 10pt;">T: 400 856 0080  |  M: {CONFIG["EMAIL_SIGNATURE_PHONE"]}</span><br>
-        <span style="color: black; text-decoration: underline; font-size: 10pt;">www.medalsoft.com</span>
-        <span style="color: black; font-style: italic; font-size: 10pt;"> Check out our product </span>
-        <span style="color: black; font-weight: bold; font-style: italic; text-decoration: underline; font-size: 10pt;">Here</span><br>
-        <span style="color: black; font-weight: bold; font-size: 11pt; background-color: lightblue;"> Digital Transformation & AIGC (Generative AI) Solutions</span>
-    </div>
-    """
-
-    msg.attach(MIMEText(html, "html"))
-
-    try:
-        # 创建SSL上下文
-        context = ssl.create_default_context()
-
-        logging.info(
-            f"正在连接SMTP服务器 {CONFIG['SMTP_SERVER']}:{CONFIG['SMTP_PORT']}..."
-        )
-        # 使用SSL连接发送邮件
-        with smtplib.SMTP_SSL(
-            CONFIG["SMTP_SERVER"], CONFIG["SMTP_PORT"], context=context
-        ) as server:
-            server.set_debuglevel(1)  # 启用调试模式
-            logging.info(f"正在尝试登录账号 {CONFIG['EMAIL_FROM']}...")
-            server.login(CONFIG["EMAIL_FROM"], CONFIG["EMAIL_PASSWORD"])
-            logging.info("登录成功，正在发送邮件...")
-            # 发送给所有收件人
-            server.send_message(msg)
-            logging.info(f"邮件发送成功！收件人: {', '.join(recipients)}")
-
-    except smtplib.SMTPAuthenticationError as e:
-        raise Exception(f"认证失败: {str(e)}\n请检查邮箱地址和授权码是否正确")
-    except smtplib.SMTPConnectError as e:
-        raise Exception(f"连接服务器失败: {str(e)}\n请检查服务器地址和端口是否正确")
-    except Exception as e:
-        raise Exception(f"发送邮件失败: {str(e)}")
-
-
-# 添加EmailSender类
-class EmailSender:
-    """邮件发送器类，用于发送邮件"""
-
-    def __init__(self):
-        """初始化EmailSender"""
-        # 验证必要的配置
-        required_configs = [
-            "EMAIL_FROM",
-            "EMAIL_PASSWORD",
-            "EMAIL_TO",
-            "SMTP_SERVER",
-            "SMTP_PORT",
-            "EMAIL_SIGNATURE_NAME",
-            "EMAIL_SIGNATURE_PHONE",
-        ]
-        for config_name in required_configs:
-            if not CONFIG.get(config_name):
-                raise ValueError(f"缺少必要的邮件配置项: {config_name}")
-
-    def send_email(self, subject, html_content):
-        """发送邮件
-
-        Args:
-            subject: 邮件主题
-            html_content: 邮件HTML内容
-
-        Returns:
-            bool: 发送是否成功
-        """
-        try:
-            # 处理多个收件人
-            recipients = [email.strip() for email in CONFIG["EMAIL_TO"].split(",")]
-
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = CONFIG["EMAIL_FROM"]
-            msg["To"] = ", ".join(recipients)  # 用逗号和空格连接多个收件人
-
-            # 提取正文部分
-            if "<正文>" in html_content and "</正文>" in html_content:
-                content = html_content.split("<正文>")[1].split("</正文>")[0]
-            else:
-                content = html_content
-
-            # 创建HTML版本的邮件内容
-            html = f"""
-            <div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
-                Hi teacher,<br>
-                <div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
-                {content}
-                </div>
-                --<br>
-                Best Regards,<br><br>
-            </div>
-            <div style="font-family: 'Segoe UI';">
-                <span style="color: black; font-weight: bold; font-size: 13pt;">{CONFIG["EMAIL_SIGNATURE_NAME"]}</span>
-                <span style="color: blue; font-weight: bold; font-size: 11pt;"> / Intern</span><br>
-                <span style="color: black; font-size: 10pt;">Medalsoft International，</span>
-                <span style="color: blue; font-weight: bold; font-size: 10pt;">Tianjin</span><br>
-                <span style="color: black; font-size: 10pt;">T: 400 856 0080  |  M: {CONFIG["EMAIL_SIGNATURE_PHONE"]}</span><br>
-                <span style="color: black; text-decoration: underline; font-size: 10pt;">www.medalsoft.com</span>
-                <span style="color: black; font-style: italic; font-size: 10pt;"> Check out our product </span>
-                <span style="color: black; font-weight: bold; font-style: italic; text-decoration: underline; font-size: 10pt;">Here</span><br>
-                <span style="color: black; font-weight: bold; font-size: 11pt; background-color: lightblue;"> Digital Transformation & AIGC (Generative AI) Solutions</span>
-            </div>
-            """
-
-            msg.attach(MIMEText(html, "html"))
-
-            # 创建SSL上下文
-            context = ssl.create_default_context()
-
-            logging.info(
-                f"正在连接SMTP服务器 {CONFIG['SMTP_SERVER']}:{CONFIG['SMTP_PORT']}..."
-            )
-            # 使用SSL连接发送邮件
-            with smtplib.SMTP_SSL(
-                CONFIG["SMTP_SERVER"], CONFIG["SMTP_PORT"], context=context
-            ) as server:
-                server.set_debuglevel(1)  # 启用调试模式
-                logging.info(f"正在尝试登录账号 {CONFIG['EMAIL_FROM']}...")
-                server.login(CONFIG["EMAIL_FROM"], CONFIG["EMAIL_PASSWORD"])
-                logging.info("登录成功，正在发送邮件...")
-                # 发送给所有收件人
-                server.send_message(msg)
-                logging.info(f"邮件发送成功！收件人: {', '.join(recipients)}")
-
-            return True
-
-        except smtplib.SMTPAuthenticationError as e:
-            logging.error(f"认证失败: {str(e)}\n请检查邮箱地址和授权码是否正确")
-            return False
-        except smtplib.SMTPConnectError as e:
-            logging.error(f"连接服务器失败: {str(e)}\n请检查服务器地址和端口是否正确")
-            return False
-        except Exception as e:
-            logging.error(f"发送邮件失败: {str(e)}")
-            return False
+import smtplib
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from config import CONFIG
+from email_templates import get_renderer
+from metrics import incr, stage
+import ssl
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    """是否为连接层面的错误(断开、网络或SSL错误)，发生后连接不能再复用
+
+    拒收收件人、拒收内容等单封邮件的错误不影响连接，smtplib已经发送RSET复位会话。
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # SMTPException本身也是OSError的子类
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def _smtp_ssl_transport(host: str, port: int, context: ssl.SSLContext, timeout: float):
+    """通过SMTP_SSL建立连接"""
+    return smtplib.SMTP_SSL(host, port, context=context, timeout=timeout)
+
+
+class SMTPConnectionPool:
+    """线程安全的SMTP连接池
+
+    按(服务器, 端口, 账号)缓存已登录的SMTP_SSL连接，多封邮件复用同一连接，
+    避免每封邮件都重新进行TLS握手和登录。连接在发送时被服务器断开会自动重连。
+    """
+
+    def __init__(self, max_idle: int = None, idle_timeout: float = None, transport=None):
+        """初始化SMTPConnectionPool
+
+        Args:
+            max_idle: 每个账号最多保留的空闲连接数，为None时使用CONFIG中的SMTP_POOL_SIZE
+            idle_timeout: 空闲连接超过该秒数后复用前先用NOOP检查，
+                为None时使用CONFIG中的SMTP_IDLE_TIMEOUT
+            transport: 建立连接的函数，参数为(服务器, 端口, SSL上下文, 超时)，
+                返回与smtplib.SMTP接口相同的对象，为None时使用smtplib.SMTP_SSL
+        """
+        self.max_idle = max_idle or CONFIG["SMTP_POOL_SIZE"]
+        self.idle_timeout = (
+            idle_timeout if idle_timeout is not None else CONFIG["SMTP_IDLE_TIMEOUT"]
+        )
+        self._lock = threading.Lock()
+        self._idle = {}  # key -> [(server, 最后使用时间), ...]
+        self._context = ssl.create_default_context()
+        self._transport = transport or _smtp_ssl_transport
+
+    @staticmethod
+    def _key(config: dict) -> tuple:
+        """连接池的键"""
+        return (config["SMTP_SERVER"], int(config["SMTP_PORT"]), config["EMAIL_FROM"])
+
+    def _connect(self, config: dict) -> smtplib.SMTP:
+        """建立新连接并登录"""
+        logging.info(
+            f"正在连接SMTP服务器 {config['SMTP_SERVER']}:{config['SMTP_PORT']}..."
+        )
+        server = self._transport(
+            config["SMTP_SERVER"],
+            int(config["SMTP_PORT"]),
+            self._context,
+            CONFIG["SMTP_TIMEOUT"],
+        )
+        try:
+            server.set_debuglevel(CONFIG["SMTP_DEBUG"])
+            logging.info(f"正在尝试登录账号 {config['EMAIL_FROM']}...")
+            server.login(config["EMAIL_FROM"], config["EMAIL_PASSWORD"])
+            logging.info("登录成功")
+        except BaseException:
+            self._discard(server)
+            raise
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        """关闭连接，忽略关闭过程中的错误"""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self, config: dict) -> smtplib.SMTP:
+        """取出一个可用的空闲连接，没有则新建"""
+        key = self._key(config)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                server, last_used = idle.pop()
+
+            if time.monotonic() - last_used < self.idle_timeout:
+                return server
+            # 空闲较久的连接可能已被服务器关闭，复用前先检查
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._discard(server)
+
+        return self._connect(config)
+
+    def _release(self, config: dict, server: smtplib.SMTP):
+        """归还连接，超过空闲上限时直接关闭"""
+        key = self._key(config)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((server, time.monotonic()))
+                return
+        self._discard(server)
+
+    @contextmanager
+    def connection(self, config: dict = None):
+        """借出一个已登录的连接，用完后自动归还
+
+        单封邮件的错误不影响连接，连接照常归还；只有连接层面的错误或被中断时才关闭连接。
+
+        Args:
+            config: 发件配置，为None时使用CONFIG
+        """
+        config = config or CONFIG
+        server = self._acquire(config)
+        reusable = False
+        try:
+            yield server
+            reusable = True
+        except Exception as e:
+            reusable = not _is_connection_error(e)
+            raise
+        finally:
+            if reusable:
+                self._release(config, server)
+            else:
+                self._discard(server)
+
+    def send(self, msg, config: dict = None, retries: int = None):
+        """发送单封邮件，连接被服务器断开时自动重连重试
+
+        Args:
+            msg: 邮件对象
+            config: 发件配置，为None时使用CONFIG
+            retries: 断线重试次数，为None时使用CONFIG中的SMTP_MAX_RETRIES
+        """
+        retries = CONFIG["SMTP_MAX_RETRIES"] if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                with self.connection(config) as server:
+                    server.send_message(msg)
+                return
+            except smtplib.SMTPServerDisconnected as e:
+                if attempt >= retries:
+                    raise
+                logging.warning(f"SMTP连接已断开({str(e)})，正在重新连接...")
+                incr("smtp_retries")
+
+    def send_many(self, messages: list, config: dict = None) -> list[dict]:
+        """在同一连接上批量发送多封邮件
+
+        Args:
+            messages: 邮件对象列表
+            config: 发件配置，为None时使用CONFIG
+
+        Returns:
+            list: 与messages一一对应的结果，每项包含收件人、是否成功和错误信息
+        """
+        results = []
+        for msg in messages:
+            result = {"to": msg["To"], "ok": False, "error": None}
+            try:
+                self.send(msg, config)
+                result["ok"] = True
+            except Exception as e:
+                result["error"] = str(e)
+                logging.error(f"发送邮件失败({msg['To']}): {str(e)}")
+            results.append(result)
+        return results
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for server, _ in connections:
+                self._discard(server)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """获取进程内共享的SMTP连接池，首次调用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool()
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+def set_smtp_pool(pool: SMTPConnectionPool) -> None:
+    """替换进程内共享的SMTP连接池，原连接池的空闲连接会被关闭
+
+    Args:
+        pool: 新的连接池，为None时下次使用时按CONFIG重新创建
+    """
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+        if pool is not None:
+            atexit.register(pool.close_all)
+    if previous is not None:
+        previous.close_all()
+
+
+def send_many(messages: list, profile: dict = None) -> list[dict]:
+    """使用默认连接池批量发送邮件
+
+    Args:
+        messages: 邮件对象列表
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        list: 每封邮件的发送结果
+    """
+    return get_smtp_pool().send_many(messages, {**CONFIG, **(profile or {})})
+
+
+def build_email(content, profile: dict = None, report_date: str = None) -> MIMEMultipart:
+    """构建日报邮件
+
+    Args:
+        content: 带正文标签的邮件文本
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+        report_date: 日报日期(YYYY-MM-DD)，为None时使用今天
+
+    Returns:
+        MIMEMultipart: 邮件对象
+    """
+    config = {**CONFIG, **(profile or {})}
+
+    # 生成邮件标题
+    report_date = report_date or datetime.now().strftime("%Y-%m-%d")
+    subject = f"{config['USER_NAME']} {report_date} 日报"
+
+    # 处理多个收件人
+    recipients = [email.strip() for email in config["EMAIL_TO"].split(",")]
+
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = config["EMAIL_FROM"]
+    msg["To"] = ", ".join(recipients)  # 用逗号和空格连接多个收件人
+
+    # 同时生成纯文本和HTML版本，纯文本在前，邮件客户端优先显示HTML
+    html, text = get_renderer(config).render(content)
+    msg.attach(MIMEText(text, "plain"))
+    msg.attach(MIMEText(html, "html"))
+    return msg
+
+
+def send_email(content, profile: dict = None):
+    """发送日报邮件
+
+    Args:
+        content: 带正文标签的邮件文本
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+    """
+    config = {**CONFIG, **(profile or {})}
+    msg = build_email(content, profile)
+    recipients = [email.strip() for email in config["EMAIL_TO"].split(",")]
+
+    try:
+        # 通过连接池发送给所有收件人
+        with stage("smtp"):
+            get_smtp_pool().send(msg, config)
+        logging.info(f"邮件发送成功！收件人: {', '.join(recipients)}")
+
+    except smtplib.SMTPAuthenticationError as e:
+        raise Exception(f"认证失败: {str(e)}\n请检查邮箱地址和授权码是否正确")
+    except smtplib.SMTPConnectError as e:
+        raise Exception(f"连接服务器失败: {str(e)}\n请检查服务器地址和端口是否正确")
+    except Exception as e:
+        raise Exception(f"发送邮件失败: {str(e)}")
+
+
+# 添加EmailSender类
+class EmailSender:
+    """邮件发送器类，用于发送邮件"""
+
+    def __init__(self):
+        """初始化EmailSender"""
+        # 验证必要的配置
+        required_configs = [
+            "EMAIL_FROM",
+            "EMAIL_PASSWORD",
+            "EMAIL_TO",
+            "SMTP_SERVER",
+            "SMTP_PORT",
+            "EMAIL_SIGNATURE_NAME",
+            "EMAIL_SIGNATURE_PHONE",
+        ]
+        for config_name in required_configs:
+            if not CONFIG.get(config_name):
+                raise ValueError(f"缺少必要的邮件配置项: {config_name}")
+
+    def build_message(self, subject, html_content):
+        """构建邮件对象
+
+        Args:
+            subject: 邮件主题
+            html_content: 邮件HTML内容
+
+        Returns:
+            MIMEMultipart: 邮件对象
+        """
+        # 处理多个收件人
+        recipients = [email.strip() for email in CONFIG["EMAIL_TO"].split(",")]
+
+        msg = MIMEMultipart("alternative")
+        msg["Subject"] = subject
+        msg["From"] = CONFIG["EMAIL_FROM"]
+        msg["To"] = ", ".join(recipients)  # 用逗号和空格连接多个收件人
+
+        # 同时生成纯文本和HTML版本，签名部分每个用户只渲染一次
+        html, text = get_renderer().render(html_content)
+        msg.attach(MIMEText(text, "plain"))
+        msg.attach(MIMEText(html, "html"))
+        return msg
+
+    def send_email(self, subject, html_content):
+        """发送邮件
+
+        Args:
+            subject: 邮件主题
+            html_content: 邮件HTML内容
+
+        Returns:
+            bool: 发送是否成功
+        """
+        try:
+            msg = self.build_message(subject, html_content)
+
+            # 通过连接池发送给所有收件人
+            with stage("smtp"):
+                get_smtp_pool().send(msg)
+            logging.info(f"邮件发送成功！收件人: {msg['To']}")
+
+            return True
+
+        except smtplib.SMTPAuthenticationError as e:
+            logging.error(f"认证失败: {str(e)}\n请检查邮箱地址和授权码是否正确")
+            return False
+        except smtplib.SMTPConnectError as e:
+            logging.error(f"连接服务器失败: {str(e)}\n请检查服务器地址和端口是否正确")
+            return False
+        except Exception as e:
+            logging.error(f"发送邮件失败: {str(e)}")
+            return False
+
+    def send_many(self, emails):
+        """复用SMTP连接批量发送邮件
+
+        Args:
+            emails: (邮件主题, 邮件HTML内容)列表
+
+        Returns:
+            list: 每封邮件的发送结果，每项包含收件人、是否成功和错误信息
+        """
+        messages = [
+            self.build_message(subject, html_content) for subject, html_content in emails
+        ]
+        return get_smtp_pool().send_many(messages)
@@ -0,0 +1,237 @@
+import html
+import re
+import string
+from functools import lru_cache
+from config import CONFIG
+
+# 正文标签
+BODY_OPEN_TAG = "<正文>"
+BODY_CLOSE_TAG = "</正文>"
+
+# HTML邮件布局
+HTML_LAYOUT = """
+<div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
+    Hi teacher,<br>
+    <div style="font-family: '微软雅黑'; color: black; font-size: 14pt;">
+    {content}
+    </div>
+    --<br>
+    Best Regards,<br><br>
+</div>
+{signature}
+"""
+
+# HTML签名
+HTML_SIGNATURE = """<div style="font-family: 'Segoe UI';">
+    <span style="color: black; font-weight: bold; font-size: 13pt;">{name}</span>
+    <span style="color: blue; font-weight: bold; font-size: 11pt;"> / Intern</span><br>
+    <span style="color: black; font-size: 10pt;">Medalsoft International，</span>
+    <span style="color: blue; font-weight: bold; font-size: 10pt;">Tianjin</span><br>
+    <span style="color: black; font-size: 10pt;">T: 400 856 0080  |  M: {phone}</span><br>
+    <span style="color: black; text-decoration: underline; font-size: 10pt;">www.medalsoft.com</span>
+    <span style="color: black; font-style: italic; font-size: 10pt;"> Check out our product </span>
+    <span style="color: black; font-weight: bold; font-style: italic; text-decoration: underline; font-size: 10pt;">Here</span><br>
+    <span style="color: black; font-weight: bold; font-size: 11pt; background-color: lightblue;"> Digital Transformation & AIGC (Generative AI) Solutions</span>
+</div>"""
+
+# 纯文本邮件布局
+TEXT_LAYOUT = """Hi teacher,
+{content}
+--
+Best Regards,
+
+
+{signature}"""
+
+# 纯文本签名，保留原模板中的行尾空格
+TEXT_SIGNATURE = (
+    "{name} / Intern\n"
+    " \n"
+    "Medalsoft International，Tianjin\n"
+    "T: 400 856 0080  |  M: {phone}\n"
+    "www.medalsoft.com  Check out our product Here \n"
+    " Digital Transformation & AIGC (Generative AI) Solutions  \n"
+)
+
+
+class CompiledTemplate:
+    """预编译的模板
+
+    模板在创建时拆分为静态文本和占位符，渲染时只需拼接；
+    可以用bind预先填入不变的占位符，得到静态部分更多的新模板。
+    """
+
+    def __init__(self, parts: list[tuple[str, str]]):
+        """初始化CompiledTemplate
+
+        Args:
+            parts: (静态文本, 占位符名称)列表，占位符名称为None表示没有占位符
+        """
+        self._parts = parts
+        self.fields = tuple(field for _, field in parts if field is not None)
+
+    @classmethod
+    def compile(cls, template: str) -> "CompiledTemplate":
+        """编译str.format风格的模板，只支持{name}形式的占位符
+
+        Args:
+            template: 模板文本
+
+        Returns:
+            CompiledTemplate: 编译后的模板
+        """
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"模板占位符不支持格式说明: {field}")
+            parts.append((literal, field))
+        return cls(parts)
+
+    def bind(self, **values) -> "CompiledTemplate":
+        """填入部分占位符，返回新的模板
+
+        Args:
+            **values: 占位符名称到取值的映射
+
+        Returns:
+            CompiledTemplate: 填入后的模板，相邻的静态文本会合并
+        """
+        parts = []
+        pending = ""
+        for literal, field in self._parts:
+            pending += literal
+            if field is None:
+                continue
+            if field in values:
+                pending += str(values[field])
+            else:
+                parts.append((pending, field))
+                pending = ""
+        parts.append((pending, None))
+        return CompiledTemplate(parts)
+
+    def render(self, **values) -> str:
+        """渲染模板
+
+        Args:
+            **values: 占位符名称到取值的映射
+
+        Returns:
+            str: 渲染结果
+        """
+        chunks = []
+        for literal, field in self._parts:
+            chunks.append(literal)
+            if field is not None:
+                chunks.append(values[field])
+        return "".join(chunks)
+
+
+# 模板只在导入时编译一次
+HTML_LAYOUT_TEMPLATE = CompiledTemplate.compile(HTML_LAYOUT)
+HTML_SIGNATURE_TEMPLATE = CompiledTemplate.compile(HTML_SIGNATURE)
+TEXT_LAYOUT_TEMPLATE = CompiledTemplate.compile(TEXT_LAYOUT)
+TEXT_SIGNATURE_TEMPLATE = CompiledTemplate.compile(TEXT_SIGNATURE)
+
+
+def extract_body(content: str) -> str:
+    """提取<正文>标签中的内容，没有标签时返回原文
+
+    Args:
+        content: 带正文标签的邮件文本
+
+    Returns:
+        str: 正文内容
+    """
+    start = content.find(BODY_OPEN_TAG)
+    if start == -1:
+        return content
+    start += len(BODY_OPEN_TAG)
+    end = content.find(BODY_CLOSE_TAG, start)
+    return content[start:] if end == -1 else content[start:end]
+
+
+# HTML正文中的换行标签和其他标签
+_BR_PATTERN = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_TAG_PATTERN = re.compile(r"<[^<>]+>")
+
+
+def html_to_text(body: str) -> str:
+    """将HTML正文转换为纯文本
+
+    <br>转换为换行，去掉其他标签后再还原转义的字符。
+
+    Args:
+        body: HTML正文
+
+    Returns:
+        str: 纯文本正文
+    """
+    text = _TAG_PATTERN.sub("", _BR_PATTERN.sub("\n", body))
+    return html.unescape(text).strip()
+
+
+class EmailRenderer:
+    """单个用户的邮件渲染器
+
+    签名只在创建时渲染一次并固定到布局中，每封邮件只需填入正文，
+    一次调用同时生成HTML和纯文本两个版本。
+    """
+
+    def __init__(self, name: str, phone: str):
+        """初始化EmailRenderer
+
+        Args:
+            name: 签名中的英文名
+            phone: 签名中的电话
+        """
+        html_signature = HTML_SIGNATURE_TEMPLATE.render(
+            name=html.escape(name or ""), phone=html.escape(phone or "")
+        )
+        text_signature = TEXT_SIGNATURE_TEMPLATE.render(name=name or "", phone=phone or "")
+        self._html = HTML_LAYOUT_TEMPLATE.bind(signature=html_signature)
+        self._text = TEXT_LAYOUT_TEMPLATE.bind(signature=text_signature)
+
+    def render_draft(self, content: str) -> str:
+        """生成带<正文>标签的邮件文本
+
+        Args:
+            content: 学习总结
+
+        Returns:
+            str: 邮件文本，正文部分用<正文>标签包裹
+        """
+        return self._text.render(
+            content=f"{BODY_OPEN_TAG}\n{content}\n{BODY_CLOSE_TAG}"
+        )
+
+    def render(self, content: str) -> tuple[str, str]:
+        """渲染邮件的HTML和纯文本版本
+
+        Args:
+            content: 正文内容，带<正文>标签时只使用标签内的部分
+
+        Returns:
+            tuple: (HTML内容, 纯文本内容)
+        """
+        body = extract_body(content)
+        return self._html.render(content=body), self._text.render(content=html_to_text(body))
+
+
+@lru_cache(maxsize=1024)
+def _get_renderer(name: str, phone: str) -> EmailRenderer:
+    """按签名缓存渲染器"""
+    return EmailRenderer(name, phone)
+
+
+def get_renderer(profile: dict = None) -> EmailRenderer:
+    """获取用户的邮件渲染器，同一签名只创建一次
+
+    Args:
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        EmailRenderer: 邮件渲染器
+    """
+    config = {**CONFIG, **(profile or {})}
+    return _get_renderer(config.get("EMAIL_SIGNATURE_NAME"), config.get("EMAIL_SIGNATURE_PHONE"))
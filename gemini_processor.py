@@ -1,67 +1,970 @@
-import google.generativeai as genai
-from config import CONFIG
-
-
-def process_with_gemini(content: str) -> str:
-    """处理内容并生成格式化的学习总结
-
-    Args:
-        content: 原始学习内容文本
-
-    Returns:
-        格式化的学习总结文本
-    """
-    genai.configure(api_key=CONFIG["GEMINI_API_KEY"])
-    model = genai.GenerativeModel("gemini-2.0-flash-thinking-exp-01-21")
-
-    prompt = f"""
-    请根据以下内容，总结今天的学习要点，要求：
-    1. 内容要详细具体,对各个要点的可能内容进行猜测
-    2. 用1、2、3...的形式列出
-    3. 每个要点后面加上<br><br>标签换行
-    4. 每个点的要简洁一些,以正式邮件的格式列出
-    5. 不要出现"待补充"、"后续内容"等不确定的表述
-    6. 绝对不要出现诸如"好的，根据您提供的内容，今天的学习要点总结如下"这样的表述
-    7. 不要出现"可能"、"推测"之类的词语
-    
-    原始内容：
-    {content}
-    """
-
-    response = model.generate_content(prompt)
-
-    # 处理文本格式
-    formatted_text = response.text.strip()
-
-    # 确保每个数字编号后面有双换行
-    for i in range(1, 10):
-        formatted_text = formatted_text.replace(f"{i}. ", f"{i}. <br><br>")
-        formatted_text = formatted_text.replace(f"{i}.", f"{i}. <br><br>")
-
-    # 移除多余的换行（三个或更多的<br>）
-    while "<br><br><br>" in formatted_text:
-        formatted_text = formatted_text.replace("<br><br><br>", "<br><br>")
-
-    return formatted_text
-
-
-# 添加GeminiProcessor类
-class GeminiProcessor:
-    """Gemini处理器类，用于调用Gemini API处理内容"""
-
-    def __init__(self):
-        """初始化GeminiProcessor"""
-        # 检查API密钥
-        if not CONFIG["GEMINI_API_KEY"]:
-            raise ValueError("未配置Gemini API密钥")
-
-    def process(self, content: str) -> str:
-        """处理内容并生成格式化的学习总结
-
-        Args:
-            content: 原始学习内容文本
-
-        Returns:
-            str: 格式化的学习总结文本
-        """
-        return process_with_gemini(content)
+import contextvars
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+from config import CONFIG
+from metrics import incr, record_stage, stage
+from summary_cache import SummaryCache, get_summary_cache
+from summary_formatter import StreamingFormatter, format_summary
+from model_router import ModelBackend, ModelRouter, parse_models
+from prompt_builder import (
+    BATCH_PROMPT_TEMPLATE,
+    PROMPT_TEMPLATE,
+    BuiltPrompt,
+    PromptBuilder,
+    estimate_tokens,
+)
+
+# 匹配多天合并请求输出中的每日总结
+BATCH_OUTPUT_PATTERN = re.compile(
+    r"<<<DAY (\d{4}-\d{2}-\d{2})>>>(.*?)<<<END \1>>>", re.DOTALL
+)
+
+
+def process_with_gemini(content: str, use_cache: bool = None, profile: dict = None) -> str:
+    """处理内容并生成格式化的学习总结
+
+    相同的提示词模板、模型链、生成参数和输入内容会直接返回缓存中的结果，不再调用API。
+
+    Args:
+        content: 原始学习内容文本
+        use_cache: 是否使用缓存，为None时根据CONFIG中的GEMINI_CACHE_BYPASS决定
+        profile: 用户配置，其中的输入token上限、输出token上限和temperature覆盖CONFIG
+
+    Returns:
+        格式化的学习总结文本
+    """
+    if use_cache is None:
+        use_cache = not CONFIG["GEMINI_CACHE_BYPASS"]
+    builder = PromptBuilder(profile)
+
+    if use_cache:
+        cache = get_summary_cache()
+        cache_key = SummaryCache.make_key(
+            PROMPT_TEMPLATE, model_chain_key(profile), content, builder.settings.key()
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"命中Gemini总结缓存: {cache.stats()}")
+            incr("llm_cache_hits")
+            return cached
+
+    with stage("llm"):
+        formatted_text = _generate_summary(builder.build(content), _profile_models(profile))
+
+    # 被截止时间打断的部分结果只用于本次发送
+    if use_cache and not isinstance(formatted_text, PartialSummary):
+        cache.set(cache_key, formatted_text)
+
+    return formatted_text
+
+
+# 可重试的HTTP状态码：限流、服务端错误和超时
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 保留最近多少次调用的token用量和耗时
+CALL_LOG_SIZE = 1000
+
+
+class PartialSummary(str):
+    """流式输出被截止时间打断时保留下来的完整要点，不写入缓存和预生成结果"""
+
+
+class StreamResult(NamedTuple):
+    """一次流式生成的结果"""
+
+    text: str  # 收到的原始文本
+    complete: bool  # 是否完整接收，为False时是被截止时间或错误打断的部分输出
+    first_token_latency: float  # 从发出请求到收到首个片段的时间(秒)，没有收到时为None
+
+
+class _CallCancelled(Exception):
+    """对冲请求中落败的一方已不再需要，停止重试"""
+
+
+class _StreamInterrupted(Exception):
+    """流式输出在收到部分内容后被打断"""
+
+    def __init__(self, texts: list, first_token_latency: float, reason: str):
+        super().__init__(reason)
+        self.texts = texts
+        self.first_token_latency = first_token_latency
+
+
+def _is_retryable(error: Exception) -> bool:
+    """判断Gemini调用错误是否可以重试"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # google.api_core的异常通过code属性携带HTTP状态码
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """令牌桶限流器，按配额平滑请求速率"""
+
+    def __init__(self, rate: float, capacity: int):
+        """初始化TokenBucket
+
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """获取一个令牌，令牌不足时等待
+
+        Returns:
+            float: 等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # 预先扣除令牌，令牌数可以为负，保证等待的请求按到达顺序放行
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class GeminiClient:
+    """进程内共享的Gemini客户端
+
+    只配置一次API密钥并复用模型对象，请求前经过令牌桶限流，
+    限流(429)和临时错误按指数退避加随机抖动重试，
+    同时进行的相同请求只调用一次API，并统计排队等待、模型耗时和每次调用的token用量。
+
+    未指定模型时按模型链调用：默认路由由ModelRouter根据各模型的滚动延迟选择，
+    请求超过该模型最近耗时的GEMINI_HEDGE_PERCENTILE分位数仍未返回时，
+    向其余模型中最快的一个发出对冲请求，先成功的结果生效；模型失败时按顺序回退。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = None,
+        burst: int = None,
+        max_retries: int = None,
+        timeout: float = None,
+        model_factory=None,
+        router: ModelRouter = None,
+    ):
+        """初始化GeminiClient
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，为None时使用CONFIG中的GEMINI_RPM
+            burst: 允许的突发请求数，为None时使用CONFIG中的GEMINI_BURST
+            max_retries: 最大重试次数，为None时使用CONFIG中的GEMINI_MAX_RETRIES
+            timeout: 单次请求超时(秒)，为None时使用模型链中各模型的超时
+            model_factory: 根据模型名称创建模型对象的函数，模型对象需提供
+                generate_content(prompt, request_options)方法并返回带text属性的结果，
+                为None时使用Gemini SDK
+            router: 模型链路由，为None时按CONFIG中的GEMINI_MODELS创建
+        """
+        requests_per_minute = requests_per_minute or CONFIG["GEMINI_RPM"]
+        self.limiter = TokenBucket(
+            requests_per_minute / 60, burst or CONFIG["GEMINI_BURST"]
+        )
+        self.max_retries = (
+            CONFIG["GEMINI_MAX_RETRIES"] if max_retries is None else max_retries
+        )
+        self.timeout = timeout
+        self.router = router or ModelRouter()
+        self._model_factory = model_factory or self._create_genai_model
+        self._models = {}
+        self._configured = False
+        self._lock = threading.Lock()
+        self._inflight = {}  # 请求键 -> (完成事件, 结果容器)
+        self._calls = deque(maxlen=CALL_LOG_SIZE)  # 最近成功调用的用量记录
+        self._stats = {
+            "requests": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "errors": 0,
+            "queue_wait": 0.0,
+            "model_latency": 0.0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "streams": 0,
+            "first_token_latency": 0.0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "fallbacks": 0,
+        }
+
+    def _create_genai_model(self, model_name: str):
+        """通过Gemini SDK创建模型对象，首次使用时配置API密钥"""
+        # Gemini SDK会引入gRPC和protobuf，只在真正需要调用模型时导入
+        import google.generativeai as genai
+
+        if not self._configured:
+            genai.configure(api_key=CONFIG["GEMINI_API_KEY"])
+            self._configured = True
+        return genai.GenerativeModel(model_name)
+
+    def _get_model(self, model_name: str):
+        """获取模型对象，同一模型只创建一次"""
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self._model_factory(model_name)
+            return model
+
+    def warm_up(self, model_name: str = None, reconfigure: bool = False):
+        """预先导入SDK并创建模型对象，常驻进程启动或重新加载配置时调用
+
+        Args:
+            model_name: 模型名称，为None时创建模型链中的所有模型
+            reconfigure: 是否按CONFIG中的GEMINI_API_KEY和GEMINI_MODELS重新配置
+        """
+        if reconfigure:
+            with self._lock:
+                self._configured = False
+                self._models.clear()
+            self.router.configure(parse_models(CONFIG["GEMINI_MODELS"]))
+        names = [model_name] if model_name else [backend.name for backend in self.router.models]
+        for name in names:
+            self._get_model(name)
+
+    def _record(self, **values):
+        """累加统计数据"""
+        with self._lock:
+            for key, value in values.items():
+                self._stats[key] += value
+
+    def _record_call(
+        self,
+        model_name: str,
+        response,
+        latency: float,
+        generation_config: dict,
+        first_token_latency: float = None,
+    ):
+        """记录一次成功调用的token用量和耗时，输出达到上限时提示可能被截断"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = (usage.prompt_token_count or 0) if usage is not None else 0
+        output_tokens = (usage.candidates_token_count or 0) if usage is not None else 0
+        max_output_tokens = (generation_config or {}).get("max_output_tokens")
+        self._record(
+            model_latency=latency, prompt_tokens=prompt_tokens, output_tokens=output_tokens
+        )
+        with self._lock:
+            self._calls.append(
+                {
+                    "model": model_name,
+                    "prompt_tokens": prompt_tokens,
+                    "output_tokens": output_tokens,
+                    "latency": latency,
+                    "max_output_tokens": max_output_tokens,
+                    "temperature": (generation_config or {}).get("temperature"),
+                    "first_token_latency": first_token_latency,
+                }
+            )
+        incr("prompt_tokens", prompt_tokens)
+        incr("output_tokens", output_tokens)
+        logging.info(
+            f"Gemini调用完成: 输入{prompt_tokens} tokens，输出{output_tokens} tokens，"
+            f"耗时{latency:.2f}秒"
+        )
+        if max_output_tokens and output_tokens >= max_output_tokens:
+            logging.warning(f"Gemini输出达到上限{max_output_tokens} tokens，内容可能被截断")
+            incr("llm_output_truncated")
+
+    def _call_with_retry(
+        self,
+        prompt: str,
+        model_name: str,
+        generation_config: dict = None,
+        timeout: float = None,
+        cancel: threading.Event = None,
+    ) -> str:
+        """限流并调用模型，可重试的错误按指数退避重试
+
+        cancel被设置后不再发起新的尝试，也不再占用限流令牌，抛出_CallCancelled；
+        已经发出的请求无法中止，其结果照常记录后丢弃。
+        """
+        model = self._get_model(model_name)
+        timeout = self.timeout or timeout or CONFIG["GEMINI_TIMEOUT"]
+        for attempt in range(self.max_retries + 1):
+            if cancel is not None and cancel.is_set():
+                raise _CallCancelled(f"对模型{model_name}的请求已不再需要")
+            self._record(queue_wait=self.limiter.acquire(), requests=1)
+            start = time.perf_counter()
+            try:
+                response = model.generate_content(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options={"timeout": timeout},
+                )
+                text = response.text
+                latency = time.perf_counter() - start
+                self.router.record(model_name, latency)
+                self._record_call(model_name, response, latency, generation_config)
+                return text
+            except Exception as e:
+                self._record(model_latency=time.perf_counter() - start)
+                self.router.record(model_name, ok=False)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self._record(errors=1)
+                    raise
+                self._backoff(attempt, e, cancel)
+
+    def _backoff(self, attempt: int, error: Exception, cancel: threading.Event = None):
+        """按指数退避加完全随机抖动等待，避免多个请求同时重试"""
+        backoff = CONFIG["GEMINI_BACKOFF_BASE"] * 2**attempt
+        delay = random.uniform(0, min(CONFIG["GEMINI_BACKOFF_MAX"], backoff))
+        logging.warning(
+            f"Gemini请求失败({str(error)})，{delay:.1f}秒后进行第{attempt + 1}次重试"
+        )
+        self._record(retries=1)
+        incr("llm_retries")
+        if cancel is None:
+            time.sleep(delay)
+        else:
+            # 对冲请求已有结果时立即结束等待
+            cancel.wait(delay)
+
+    @staticmethod
+    def _spawn(func, *args):
+        """在新线程中执行，返回对应的Future，运行指标等上下文随之传递"""
+        # 只有发出对冲请求时才需要，不放在启动路径上
+        from concurrent.futures import Future
+
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                future.set_result(context.run(func, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _call_routed(self, prompt: str, generation_config: dict, models: list = None) -> str:
+        """按模型链调用，慢请求发出对冲请求，失败时回退到下一个模型
+
+        Args:
+            prompt: 提示词
+            generation_config: 生成参数
+            models: 按优先级排列的模型链，为None时使用配置的模型链
+
+        Returns:
+            str: 第一个成功的模型输出的原始文本
+        """
+        remaining = self.router.route(models)
+        last_error = None
+        while remaining:
+            primary = remaining.pop(0)
+            # 只向健康的模型发出对冲请求
+            backups = [backend for backend in remaining if self.router.healthy(backend)]
+            delay = self.router.hedge_delay(primary.name) if backups else None
+            if delay is None:
+                # 没有可用于对冲的模型或样本不足，直接在当前线程调用
+                try:
+                    return self._call_with_retry(
+                        prompt, primary.name, generation_config, primary.timeout
+                    )
+                except Exception as e:
+                    last_error = e
+            else:
+                try:
+                    return self._call_hedged(
+                        prompt, primary, remaining, backups, generation_config, delay
+                    )
+                except Exception as e:
+                    last_error = e
+
+            if remaining:
+                logging.warning(
+                    f"模型{primary.name}调用失败({str(last_error)})，改用{remaining[0].name}"
+                )
+                self._record(fallbacks=1)
+                incr("llm_fallbacks")
+        raise last_error
+
+    def _call_hedged(
+        self,
+        prompt: str,
+        primary: ModelBackend,
+        remaining: list,
+        backups: list,
+        generation_config: dict,
+        delay: float,
+    ) -> str:
+        """调用首选模型，超过delay秒未返回时向backups中最快的一个发出对冲请求
+
+        被用于对冲的模型从remaining中移除。返回时通知未完成的请求停止重试，
+        已经发出的那次请求在后台结束，结果被丢弃。
+
+        Raises:
+            Exception: 已发出的请求都失败时抛出最后一个错误
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        cancel = threading.Event()
+
+        def call(backend):
+            return self._call_with_retry(
+                prompt, backend.name, generation_config, backend.timeout, cancel
+            )
+
+        running = {self._spawn(call, primary): primary}
+        hedged = False
+        last_error = None
+        try:
+            while running:
+                done, _ = wait(
+                    running, timeout=None if hedged else delay, return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    backup = self.router.fastest(backups)
+                    remaining.remove(backup)
+                    logging.info(f"模型{primary.name}超过{delay:.2f}秒未返回，同时请求{backup.name}")
+                    self._record(hedged=1)
+                    incr("llm_hedged")
+                    running[self._spawn(call, backup)] = backup
+                    hedged = True
+                    continue
+                for future in done:
+                    backend = running.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if backend is not primary:
+                        self._record(hedge_wins=1)
+                        incr("llm_hedge_wins")
+                    return text
+            raise last_error
+        finally:
+            # 落败的请求不再重试，避免继续占用限流令牌和API配额
+            cancel.set()
+
+    def _pump_stream(
+        self, model, prompt: str, generation_config: dict, timeout: float, out: queue.Queue, stop
+    ):
+        """在后台线程中读取流式输出，逐个片段放入队列"""
+        try:
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                request_options={"timeout": timeout},
+                stream=True,
+            )
+            for chunk in response:
+                if stop.is_set():
+                    return
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # 没有文本的片段，例如只包含结束原因
+                    continue
+                if text:
+                    out.put(("text", text))
+            out.put(("done", response))
+        except Exception as e:
+            out.put(("error", e))
+
+    def _stream_once(
+        self, model, prompt: str, generation_config: dict, timeout: float, deadline: float, on_text
+    ):
+        """发起一次流式请求并接收到结束或截止时间
+
+        Returns:
+            tuple: (收到的文本片段, 结果对象, 首个片段延迟)
+
+        Raises:
+            _StreamInterrupted: 收到部分内容后超时或出错
+            Exception: 没有收到任何内容时的错误，超时为TimeoutError
+        """
+        out = queue.Queue()
+        stop = threading.Event()
+        start = time.perf_counter()
+        threading.Thread(
+            target=self._pump_stream,
+            args=(model, prompt, generation_config, timeout, out, stop),
+            daemon=True,
+        ).start()
+
+        texts = []
+        first_token_latency = None
+        try:
+            while True:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    raise TimeoutError("流式输出超过截止时间")
+                try:
+                    kind, value = out.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("流式输出超过截止时间") from None
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    return texts, value, first_token_latency
+                if first_token_latency is None:
+                    first_token_latency = time.perf_counter() - start
+                    record_stage("llm_first_token", first_token_latency)
+                texts.append(value)
+                if on_text is not None:
+                    on_text(value)
+        except Exception as e:
+            # 不再需要的后台读取在下一个片段到达时结束
+            stop.set()
+            if texts:
+                raise _StreamInterrupted(texts, first_token_latency, str(e)) from e
+            raise
+
+    def _stream_model(
+        self,
+        prompt: str,
+        backend: ModelBackend,
+        generation_config: dict,
+        deadline_at: float,
+        on_text,
+    ) -> StreamResult:
+        """向一个模型发起流式请求，收到首个片段之前的可重试错误按指数退避重试"""
+        model = self._get_model(backend.name)
+        timeout = self.timeout or backend.timeout
+        for attempt in range(self.max_retries + 1):
+            self._record(queue_wait=self.limiter.acquire(), requests=1)
+            start = time.perf_counter()
+            try:
+                texts, response, first_token_latency = self._stream_once(
+                    model, prompt, generation_config, timeout, deadline_at, on_text
+                )
+            except _StreamInterrupted as e:
+                latency = time.perf_counter() - start
+                self._record(
+                    model_latency=latency, streams=1, first_token_latency=e.first_token_latency
+                )
+                self.router.record(backend.name, ok=False)
+                logging.warning(f"Gemini流式输出被打断({str(e)})，使用已收到的部分")
+                incr("llm_stream_interrupted")
+                return StreamResult("".join(e.texts), False, e.first_token_latency)
+            except Exception as e:
+                self._record(model_latency=time.perf_counter() - start)
+                self.router.record(backend.name, ok=False)
+                out_of_time = deadline_at is not None and time.monotonic() >= deadline_at
+                if attempt >= self.max_retries or not _is_retryable(e) or out_of_time:
+                    self._record(errors=1)
+                    raise
+                self._backoff(attempt, e)
+                continue
+
+            latency = time.perf_counter() - start
+            self._record(streams=1, first_token_latency=first_token_latency or 0.0)
+            self.router.record(backend.name, latency)
+            self._record_call(
+                backend.name, response, latency, generation_config, first_token_latency
+            )
+            return StreamResult("".join(texts), True, first_token_latency)
+
+    def generate_stream(
+        self,
+        prompt: str,
+        model_name: str = None,
+        generation_config: dict = None,
+        deadline: float = None,
+        on_text=None,
+        models: list = None,
+    ) -> StreamResult:
+        """流式生成文本，每收到一个片段就交给on_text处理
+
+        收到首个片段之前出现的可重试错误按指数退避重试，仍然失败时回退到模型链中的下一个模型；
+        收到部分内容后超过截止时间或出错时不再重试，返回已收到的部分。
+        流式请求不与同时进行的相同请求合并，也不发出对冲请求。
+
+        Args:
+            prompt: 提示词
+            model_name: 模型名称，为None时按模型链调用
+            generation_config: 生成参数，为None时使用模型默认值
+            deadline: 从调用开始算起的截止时间(秒)，为None时不限制
+            on_text: 接收每个文本片段的函数
+            models: 按优先级排列的模型链，为None时使用配置的模型链
+
+        Returns:
+            StreamResult: 原始文本、是否完整和首个片段延迟
+
+        Raises:
+            TimeoutError: 截止时间内没有收到任何内容
+        """
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+        if model_name:
+            chain = [ModelBackend(model_name, self.timeout or CONFIG["GEMINI_TIMEOUT"])]
+        else:
+            chain = self.router.route(models)
+
+        for index, backend in enumerate(chain):
+            try:
+                return self._stream_model(prompt, backend, generation_config, deadline_at, on_text)
+            except Exception as e:
+                out_of_time = deadline_at is not None and time.monotonic() >= deadline_at
+                if index + 1 >= len(chain) or out_of_time:
+                    raise
+                logging.warning(
+                    f"模型{backend.name}调用失败({str(e)})，改用{chain[index + 1].name}"
+                )
+                self._record(fallbacks=1)
+                incr("llm_fallbacks")
+
+    def generate(
+        self,
+        prompt: str,
+        model_name: str = None,
+        generation_config: dict = None,
+        models: list = None,
+    ) -> str:
+        """生成文本，同时进行的相同请求只调用一次API
+
+        Args:
+            prompt: 提示词
+            model_name: 模型名称，为None时按模型链调用，指定时只调用该模型
+            generation_config: 生成参数，例如max_output_tokens和temperature，为None时使用模型默认值
+            models: 按优先级排列的模型链，为None时使用配置的模型链
+
+        Returns:
+            str: 模型输出的原始文本
+        """
+        route = model_name or tuple(models or ())
+        key = (route, prompt, tuple(sorted((generation_config or {}).items())))
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = (threading.Event(), {})
+
+        event, outcome = inflight
+        if not leader:
+            self._record(coalesced=1)
+            event.wait()
+        else:
+            try:
+                if model_name:
+                    outcome["text"] = self._call_with_retry(prompt, model_name, generation_config)
+                else:
+                    outcome["text"] = self._call_routed(prompt, generation_config, models)
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["text"]
+
+    def metrics(self) -> dict:
+        """获取请求统计
+
+        Returns:
+            dict: 请求数、合并的重复请求数、重试数、失败数，
+                累计和平均的排队等待时间、模型耗时(秒)，累计和平均的输入、输出token数，
+                流式请求数和平均首个片段延迟(秒)，以及对冲请求数、对冲请求先返回的次数和回退次数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            calls = len(self._calls) or 1
+        requests = stats["requests"] or 1
+        stats["avg_queue_wait"] = stats["queue_wait"] / requests
+        stats["avg_model_latency"] = stats["model_latency"] / requests
+        stats["avg_prompt_tokens"] = stats["prompt_tokens"] / calls
+        stats["avg_output_tokens"] = stats["output_tokens"] / calls
+        stats["avg_first_token_latency"] = stats["first_token_latency"] / (stats["streams"] or 1)
+        return stats
+
+    def calls(self) -> list[dict]:
+        """最近成功调用的记录，用于对比不同生成参数下的延迟和用量
+
+        Returns:
+            list: 每次调用的模型、输入和输出token数、耗时(秒)、max_output_tokens、temperature
+                和流式请求的首个片段延迟(秒)
+        """
+        with self._lock:
+            return list(self._calls)
+
+    def model_stats(self) -> dict:
+        """模型链中各模型的滚动统计
+
+        Returns:
+            dict: 模型名称 -> 样本数、失败次数、p50和p95耗时(秒)，另有当前的默认路由
+        """
+        return {"route": self.router.route()[0].name, "models": self.router.snapshot()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """获取进程内共享的Gemini客户端，首次调用时创建"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
+
+
+def set_gemini_client(client: GeminiClient) -> None:
+    """替换进程内共享的Gemini客户端
+
+    Args:
+        client: 新的客户端，为None时下次使用时按CONFIG重新创建
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _profile_models(profile: dict = None):
+    """用户配置中单独指定的模型链
+
+    Returns:
+        list: 模型链，未单独指定时返回None，使用全局的模型链和路由
+    """
+    value = (profile or {}).get("GEMINI_MODELS")
+    if isinstance(value, (list, tuple)):
+        value = ",".join(value)
+    if not value or value == CONFIG["GEMINI_MODELS"]:
+        return None
+    return parse_models(value)
+
+
+def model_chain_key(profile: dict = None) -> str:
+    """参与缓存键计算的模型链
+
+    总结可能来自链中任意一个模型(回退或对冲)，模型链不同的总结不能互相复用。
+    各模型的超时不影响输出，不参与计算。
+
+    Args:
+        profile: 用户配置，其中的GEMINI_MODELS覆盖CONFIG
+
+    Returns:
+        str: 按优先级排列、逗号分隔的模型名称
+    """
+    models = _profile_models(profile) or parse_models(CONFIG["GEMINI_MODELS"])
+    return ",".join(backend.name for backend in models)
+
+
+def _generate_text(prompt: BuiltPrompt, models: list = None) -> str:
+    """通过共享客户端调用Gemini生成原始文本"""
+    return get_gemini_client().generate(
+        prompt.text, generation_config=prompt.generation_config, models=models
+    )
+
+
+def _generate_summary(prompt: BuiltPrompt, models: list = None) -> str:
+    """调用Gemini生成并格式化学习总结，GEMINI_STREAM开启时使用流式输出"""
+    if CONFIG["GEMINI_STREAM"]:
+        return _stream_summary(prompt, models)
+    return format_summary(_generate_text(prompt, models))
+
+
+def _stream_summary(prompt: BuiltPrompt, models: list = None) -> str:
+    """流式生成学习总结，边接收边整理，超过截止时间时保留已完整的要点
+
+    Returns:
+        str: 格式化的学习总结，被打断时为只包含完整要点的PartialSummary
+
+    Raises:
+        TimeoutError: 截止时间内没有生成任何完整的要点
+    """
+    formatter = StreamingFormatter()
+    result = get_gemini_client().generate_stream(
+        prompt.text,
+        generation_config=prompt.generation_config,
+        deadline=CONFIG["GEMINI_STREAM_DEADLINE"] or None,
+        on_text=formatter.feed,
+        models=models,
+    )
+    if result.complete:
+        formatter.close()
+        return formatter.complete_items
+
+    # 最后一个要点可能只生成了一半，只保留已经完整的要点
+    salvaged = formatter.complete_items
+    if not salvaged:
+        raise TimeoutError("流式输出被打断，且没有生成任何完整的要点")
+    logging.warning(f"学习总结未生成完毕，使用已完成的要点({len(salvaged)}字符)")
+    incr("llm_partial_summaries")
+    return PartialSummary(salvaged)
+
+
+def _strip_body_tags(content: str) -> str:
+    """去掉<正文>标签，只保留其中的学习内容"""
+    if "<正文>" in content and "</正文>" in content:
+        return content.split("<正文>")[1].split("</正文>")[0].strip()
+    return content.strip()
+
+
+def _pack_batches(days: dict[str, str], token_budget: int) -> list[list[str]]:
+    """按token预算将多天内容分组，每组内容合并为一次请求"""
+    overhead = estimate_tokens(BATCH_PROMPT_TEMPLATE)
+    batches = []
+    current, used = [], overhead
+    for date, body in days.items():
+        cost = estimate_tokens(body) + 16  # 日期分隔标签的开销
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], overhead
+        current.append(date)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_response(text: str, dates: list[str]) -> dict[str, str]:
+    """按分隔标签拆分多天合并请求的结果，只返回成功解析的日期"""
+    results = {}
+    for match in BATCH_OUTPUT_PATTERN.finditer(text):
+        date, summary = match.group(1), match.group(2).strip()
+        if date in dates and summary and date not in results:
+            results[date] = summary
+    return results
+
+
+def process_days_with_gemini(
+    contents: dict[str, str],
+    token_budget: int = None,
+    use_cache: bool = None,
+    profile: dict = None,
+) -> dict[str, str]:
+    """将多天的学习内容合并为尽量少的请求进行总结
+
+    按token预算把多天内容打包进同一个提示词，要求模型按日期分隔输出，
+    再拆分为每天的总结。合并结果中无法解析的日期会自动退回单独请求。
+
+    Args:
+        contents: 日期到学习内容的映射，学习内容可以带<正文>标签
+        token_budget: 每次合并请求的输入token上限，为None时使用CONFIG中的GEMINI_BATCH_TOKEN_BUDGET
+        use_cache: 是否使用缓存，为None时根据CONFIG中的GEMINI_CACHE_BYPASS决定
+        profile: 用户配置，其中的输入token上限、输出token上限和temperature覆盖CONFIG
+
+    Returns:
+        dict: 日期到格式化学习总结的映射
+    """
+    token_budget = token_budget or CONFIG["GEMINI_BATCH_TOKEN_BUDGET"]
+    if use_cache is None:
+        use_cache = not CONFIG["GEMINI_CACHE_BYPASS"]
+    builder = PromptBuilder(profile)
+    options = builder.settings.key()
+    chain = model_chain_key(profile)
+
+    # 每天的内容先压缩和裁剪，再按预算打包
+    days = {
+        date: builder.prepare(_strip_body_tags(content))[0]
+        for date, content in contents.items()
+    }
+    results = {}
+
+    cache = get_summary_cache() if use_cache else None
+    cache_keys = {}
+    if cache is not None:
+        for date, body in days.items():
+            cache_keys[date] = SummaryCache.make_key(
+                BATCH_PROMPT_TEMPLATE, chain, body, options
+            )
+            cached = cache.get(cache_keys[date])
+            if cached is not None:
+                results[date] = cached
+
+    pending = {date: body for date, body in days.items() if date not in results}
+    for batch in _pack_batches(pending, token_budget):
+        if len(batch) == 1:
+            date = batch[0]
+            results[date] = process_with_gemini(contents[date], use_cache, profile)
+            continue
+
+        prompt = builder.build_batch({date: pending[date] for date in batch})
+        try:
+            parsed = _parse_batch_response(_generate_text(prompt, _profile_models(profile)), batch)
+        except Exception as e:
+            logging.warning(f"合并请求失败，改为逐天请求: {str(e)}")
+            parsed = {}
+
+        for date in batch:
+            if date in parsed:
+                results[date] = format_summary(parsed[date])
+                if cache is not None:
+                    cache.set(cache_keys[date], results[date])
+            else:
+                logging.warning(f"合并结果中缺少{date}的总结，改为单独请求")
+                results[date] = process_with_gemini(contents[date], use_cache, profile)
+
+    return {date: results[date] for date in contents}
+
+
+# 添加GeminiProcessor类
+class GeminiProcessor:
+    """Gemini处理器类，用于调用Gemini API处理内容"""
+
+    def __init__(self, use_cache: bool = None, profile: dict = None, models=None):
+        """初始化GeminiProcessor
+
+        Args:
+            use_cache: 是否使用总结缓存，为None时根据CONFIG中的GEMINI_CACHE_BYPASS决定
+            profile: 用户配置，其中的生成参数和模型链覆盖CONFIG
+            models: 按优先级排列的模型链，可以是模型名称列表或与GEMINI_MODELS格式相同的字符串，
+                为None时使用profile或CONFIG中的GEMINI_MODELS
+        """
+        # 检查API密钥
+        if not CONFIG["GEMINI_API_KEY"]:
+            raise ValueError("未配置Gemini API密钥")
+        if models is not None:
+            profile = {**(profile or {}), "GEMINI_MODELS": models}
+        self.use_cache = use_cache
+        self.profile = profile
+
+    @property
+    def models(self) -> list[ModelBackend]:
+        """本处理器使用的模型链，按优先级排列"""
+        return _profile_models(self.profile) or get_gemini_client().router.models
+
+    def model_stats(self) -> dict:
+        """模型链中各模型的滚动延迟统计和当前的默认路由"""
+        return get_gemini_client().model_stats()
+
+    def process(self, content: str) -> str:
+        """处理内容并生成格式化的学习总结
+
+        Args:
+            content: 原始学习内容文本
+
+        Returns:
+            str: 格式化的学习总结文本
+        """
+        return process_with_gemini(content, use_cache=self.use_cache, profile=self.profile)
+
+    def process_batch(
+        self, contents: dict[str, str], token_budget: int = None
+    ) -> dict[str, str]:
+        """将多天的学习内容合并请求并拆分为每天的总结
+
+        Args:
+            contents: 日期到原始学习内容的映射
+            token_budget: 每次合并请求的输入token上限
+
+        Returns:
+            dict: 日期到格式化学习总结的映射
+        """
+        return process_days_with_gemini(
+            contents, token_budget=token_budget, use_cache=self.use_cache, profile=self.profile
+        )
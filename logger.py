@@ -1,74 +1,336 @@
-import logging
-from datetime import datetime
-import os
-from config import CONFIG
-
-
-def setup_logger(log_file=None, console_level=logging.INFO):
-    """设置日志记录器
-
-    Args:
-        log_file: 日志文件路径，如果为None则使用CONFIG中的配置
-        console_level: 控制台日志级别
-    """
-    # 使用参数提供的日志文件或默认配置
-    log_path = log_file if log_file else CONFIG["LOG_FILE"]
-
-    # 确保日志目录存在
-    log_dir = os.path.dirname(log_path)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-
-    # 创建文件处理器
-    file_handler = logging.FileHandler(log_path, encoding="utf-8")
-    file_handler.setLevel(getattr(logging, CONFIG["LOG_LEVEL"]))
-
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler()  # 同时输出到控制台
-    console_handler.setLevel(console_level)
-
-    # 设置格式
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-
-    # 配置根日志记录器
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)  # 设置为最低级别，让各处理器自行过滤
-    logger.handlers = []  # 清除现有处理器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    return logger
-
-
-def log_email_sent(message: str):
-    """记录邮件发送日志
-
-    Args:
-        message: 要记录的日志消息
-    """
-    try:
-        # 获取当前时间
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # 确保日志目录存在
-        log_dir = os.path.dirname(CONFIG["LOG_FILE"])
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-
-        # 追加写入日志
-        with open(CONFIG["LOG_FILE"], "a", encoding="utf-8") as f:
-            f.write(f"{message} - {current_time}\n")
-            f.flush()  # 立即写入文件
-            os.fsync(f.fileno())  # 确保写入磁盘
-
-    except Exception as e:
-        logging.error(f"写入日志失败: {str(e)}")
-        raise
-
-
-def get_latest_log():
-    with open(CONFIG["LOG_FILE"], "r", encoding="utf-8") as f:
-        lines = f.readlines()
-        return lines[-1] if lines else "No logs found."
+import atexit
+import glob
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime
+import os
+from config import CONFIG
+
+
+def setup_logger(log_file=None, console_level=logging.INFO):
+    """设置日志记录器
+
+    Args:
+        log_file: 日志文件路径，如果为None则使用CONFIG中的配置
+        console_level: 控制台日志级别
+    """
+    # 使用参数提供的日志文件或默认配置
+    log_path = log_file if log_file else CONFIG["LOG_FILE"]
+
+    # 确保日志目录存在
+    log_dir = os.path.dirname(log_path)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # 创建文件处理器
+    file_handler = logging.FileHandler(log_path, encoding="utf-8")
+    file_handler.setLevel(getattr(logging, CONFIG["LOG_LEVEL"]))
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler()  # 同时输出到控制台
+    console_handler.setLevel(console_level)
+
+    # 设置格式
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+
+    # 配置根日志记录器
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)  # 设置为最低级别，让各处理器自行过滤
+    logger.handlers = []  # 清除现有处理器
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+
+    return logger
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """将日志记录格式化为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="seconds"),
+            "level": record.levelname,
+            "event": getattr(record, "event", "log"),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _BufferedRotationMixin:
+    """逐条写入但不逐条刷新，由监听线程在队列清空时统一刷新"""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            line = self.format(record) + "\n"
+            size = len(line.encode("utf-8"))
+            if self._should_rotate(record, size):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(line)
+            self._written(size)
+        except Exception:
+            self.handleError(record)
+
+
+class _SizeRotatingHandler(_BufferedRotationMixin, logging.handlers.RotatingFileHandler):
+    """按大小轮转，自行累计已写入的字节数，避免每条记录都查询文件位置"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _should_rotate(self, record: logging.LogRecord, size: int) -> bool:
+        return self.maxBytes > 0 and self._size > 0 and self._size + size > self.maxBytes
+
+    def _written(self, size: int):
+        self._size += size
+
+    def doRollover(self):
+        super().doRollover()
+        self._size = 0
+
+
+class _TimedRotatingHandler(_BufferedRotationMixin, logging.handlers.TimedRotatingFileHandler):
+    """按时间轮转"""
+
+    def __init__(self, path: str, when: str, backup_count: int):
+        super().__init__(path, when=when, backupCount=backup_count, encoding="utf-8")
+
+    def _should_rotate(self, record: logging.LogRecord, size: int) -> bool:
+        return self.shouldRollover(record)
+
+    def _written(self, size: int):
+        pass
+
+
+class _EmailTextHandler(logging.FileHandler):
+    """按原有的"消息 - 时间"格式把邮件发送记录追加到LOG_FILE，不逐条刷新"""
+
+    def __init__(self, path: str):
+        super().__init__(path, encoding="utf-8", delay=True)
+        self.setFormatter(logging.Formatter("%(message)s - %(asctime)s", "%Y-%m-%d %H:%M:%S"))
+        self.addFilter(lambda record: getattr(record, "event", None) == "email")
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+class _FlushingQueueListener(logging.handlers.QueueListener):
+    """队列暂时清空时才刷新文件，连续写入的多条记录合并为一次系统调用"""
+
+    def handle(self, record: logging.LogRecord):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+
+class RunLog:
+    """结构化的运行日志
+
+    每条记录为一行JSON，由后台线程通过队列批量写入文件，调用方不等待磁盘I/O；
+    文件按大小或时间轮转，查询时从文件末尾向前读取，无需载入整个文件。
+    邮件发送记录同时按原有格式追加到LOG_FILE，依赖该文件的工具不受影响。
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        max_bytes: int = None,
+        backup_count: int = None,
+        when: str = None,
+        email_log_path: str = None,
+    ):
+        """初始化RunLog
+
+        Args:
+            path: 日志文件路径，为None时使用CONFIG中的RUN_LOG_FILE
+            max_bytes: 按大小轮转的阈值(字节)，为None时使用CONFIG中的RUN_LOG_MAX_BYTES
+            backup_count: 保留的历史文件数，为None时使用CONFIG中的RUN_LOG_BACKUP_COUNT
+            when: 按时间轮转的周期(例如midnight、H)，为None时使用CONFIG中的RUN_LOG_ROTATE_WHEN，
+                为空时按大小轮转
+            email_log_path: 按原有文本格式记录邮件发送结果的文件，为None时使用CONFIG中的LOG_FILE，
+                为空字符串时不写入
+        """
+        self.path = path or CONFIG["RUN_LOG_FILE"]
+        max_bytes = max_bytes if max_bytes is not None else CONFIG["RUN_LOG_MAX_BYTES"]
+        backup_count = (
+            backup_count if backup_count is not None else CONFIG["RUN_LOG_BACKUP_COUNT"]
+        )
+        when = when if when is not None else CONFIG["RUN_LOG_ROTATE_WHEN"]
+
+        # 确保日志目录存在
+        log_dir = os.path.dirname(self.path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+
+        if when:
+            handler = _TimedRotatingHandler(self.path, when, backup_count)
+        else:
+            handler = _SizeRotatingHandler(self.path, max_bytes, backup_count)
+        handler.setFormatter(JsonLinesFormatter())
+        self._handlers = [handler]
+
+        email_log_path = CONFIG["LOG_FILE"] if email_log_path is None else email_log_path
+        if email_log_path:
+            email_log_dir = os.path.dirname(email_log_path)
+            if email_log_dir and not os.path.exists(email_log_dir):
+                os.makedirs(email_log_dir, exist_ok=True)
+            self._handlers.append(_EmailTextHandler(email_log_path))
+
+        # 调用方只把记录放入队列，由监听线程写入文件
+        self._queue = queue.Queue()
+        self._listener = _FlushingQueueListener(self._queue, *self._handlers)
+        self._listener.start()
+
+    def write(self, event: str, message: str, level: int = logging.INFO, **fields):
+        """写入一条记录
+
+        Args:
+            event: 事件类型，例如email
+            message: 记录内容
+            level: 日志级别
+            **fields: 附加字段，例如user、status
+        """
+        # 直接构造记录放入队列，省去Logger查找调用位置等开销
+        record = logging.LogRecord(self.path, level, "", 0, message, None, None)
+        record.event = event
+        record.fields = fields
+        self._queue.put_nowait(record)
+
+    def flush(self):
+        """等待队列中的记录全部写入文件"""
+        self._queue.join()
+        for handler in self._handlers:
+            handler.flush()
+
+    def close(self):
+        """停止后台线程并关闭文件"""
+        self._listener.stop()
+        for handler in self._handlers:
+            handler.close()
+
+    def _files(self) -> list[str]:
+        """当前日志文件和轮转出的历史文件，按从新到旧排序"""
+        backups = [p for p in glob.glob(f"{glob.escape(self.path)}.*") if os.path.isfile(p)]
+        backups.sort(key=os.path.getmtime, reverse=True)
+        return [self.path] + backups
+
+    @staticmethod
+    def _iter_lines_reversed(path: str, block_size: int = 64 * 1024):
+        """从文件末尾开始逐行向前读取"""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            while position > 0:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                lines = (f.read(read_size) + remainder).split(b"\n")
+                # 第一段可能是被块边界截断的半行，留到下一块拼接
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line
+            if remainder.strip():
+                yield remainder
+
+    def query(self, event: str = None, since: str = None, limit: int = None, **fields):
+        """从新到旧查询记录
+
+        Args:
+            event: 只返回该类型的记录
+            since: 只返回该时间(ISO格式)之后的记录，遇到更早的记录即停止读取
+            limit: 最多返回的记录数
+            **fields: 附加字段需要全部相等，例如user="张三"
+
+        Returns:
+            list: 记录字典列表，最新的在前
+        """
+        self.flush()
+        results = []
+        for path in self._files():
+            for line in self._iter_lines_reversed(path):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is not None and entry.get("time", "") < since:
+                    return results
+                if event is not None and entry.get("event") != event:
+                    continue
+                if any(entry.get(key) != value for key, value in fields.items()):
+                    continue
+                results.append(entry)
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
+
+    def tail(self, n: int = 1) -> list[dict]:
+        """获取最后n条记录
+
+        Args:
+            n: 记录数
+
+        Returns:
+            list: 记录字典列表，按时间顺序排列
+        """
+        return list(reversed(self.query(limit=n)))
+
+
+_run_log = None
+_run_log_lock = threading.Lock()
+
+
+def get_run_log() -> RunLog:
+    """获取进程内共享的运行日志，首次调用时创建"""
+    global _run_log
+    with _run_log_lock:
+        if _run_log is None:
+            _run_log = RunLog()
+            atexit.register(_run_log.close)
+        return _run_log
+
+
+def log_email_sent(message: str, **fields):
+    """记录邮件发送日志
+
+    Args:
+        message: 要记录的日志消息
+        **fields: 附加字段，例如user、report_date
+    """
+    try:
+        get_run_log().write("email", message, **fields)
+    except Exception as e:
+        logging.error(f"写入日志失败: {str(e)}")
+        raise
+
+
+def get_latest_log():
+    """获取最近一条邮件发送日志
+
+    Returns:
+        str: "消息 - 时间"格式的日志，没有日志时返回"No logs found."
+    """
+    entries = get_run_log().query(event="email", limit=1)
+    if not entries:
+        return "No logs found."
+    entry = entries[0]
+    return f"{entry['message']} - {entry['time'].replace('T', ' ')}"
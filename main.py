@@ -1,31 +1,59 @@
-from datetime import datetime
-from scraper import get_notion_content
-from email_generator import generate_email
-from email_sender import send_email
-from logger import log_email_sent
-
-
-def main_job():
-    """主任务函数"""
-    try:
-        # 获取内容
-        content = get_notion_content()
-
-        # 生成邮件内容
-        email_content = generate_email(content)
-
-        # 发送邮件
-        send_email(email_content)
-
-        # 记录成功日志
-        log_message = "邮件发送成功"
-        log_email_sent(log_message)
-
-    except Exception as e:
-        # 记录错误日志
-        error_message = f"发送失败: {str(e)}"
-        log_email_sent(error_message)
-
-
-if __name__ == "__main__":
-    main_job()
+from datetime import datetime
+from config import load_config, validate_config
+from pipeline import STATUS_SKIPPED, Delivery, ReportPipeline
+from logger import log_email_sent
+from metrics import record_run
+
+
+def run_report(profile: dict = None) -> Delivery:
+    """为单个用户生成并发送当天的日报
+
+    生成的邮件先写入发件箱再发送，同一用户同一天的日报只生成和发送一次。
+
+    Args:
+        profile: 用户配置，覆盖CONFIG中的同名配置项
+
+    Returns:
+        Delivery: 发送结果
+
+    Raises:
+        Exception: 获取、生成或发送失败，已生成的邮件保留在发件箱中等待重试
+    """
+    delivery = ReportPipeline(profile).run()
+    if delivery.status == STATUS_SKIPPED:
+        log_email_sent("今日日报已发送，跳过", user=delivery.user, report_date=delivery.report_date)
+        return delivery
+    if delivery.in_progress:
+        log_email_sent(
+            "今日日报正由其他进程发送，跳过", user=delivery.user, report_date=delivery.report_date
+        )
+        return delivery
+    if not delivery.ok:
+        raise Exception(f"{delivery.error}，邮件已保存在发件箱中等待重试")
+
+    # 记录成功日志
+    log_message = "邮件发送成功"
+    log_email_sent(log_message, user=delivery.user, report_date=delivery.report_date)
+    return delivery
+
+
+def main_job():
+    """主任务函数"""
+    # 记录各阶段耗时，运行结束后写入指标文件
+    with record_run("main") as run:
+        try:
+            # 加载并验证配置
+            load_config()
+            validate_config()
+
+            run_report()
+
+        except Exception as e:
+            # 记录错误日志
+            error_message = f"发送失败: {str(e)}"
+            run.mark_failed(error_message)
+            log_email_sent(error_message)
+
+
+if __name__ == "__main__":
+    main_job()
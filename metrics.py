@@ -0,0 +1,240 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from config import CONFIG
+
+# 当前正在记录的运行，各阶段通过它上报耗时和计数
+_current_run = contextvars.ContextVar("current_run", default=None)
+
+
+class RunMetrics:
+    """单次运行的指标记录
+
+    记录各阶段耗时(同名阶段累加)以及抓取字节数、token数、重试次数等计数，
+    运行结束后写入JSON Lines文件，并可选导出Prometheus文本格式。
+    """
+
+    def __init__(self, name: str, **labels):
+        """初始化RunMetrics
+
+        Args:
+            name: 运行名称，例如main、github_action
+            **labels: 附加到记录中的标签，例如用户名
+        """
+        self.name = name
+        self.labels = labels
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.status = "running"
+        self.error = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage_time(self, stage: str, seconds: float):
+        """累加阶段耗时"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def incr(self, counter: str, value: float = 1):
+        """累加计数"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def mark_failed(self, error):
+        """标记运行失败，用于捕获了异常但仍需记录失败的场景
+
+        Args:
+            error: 异常或错误信息
+        """
+        self.error = str(error)
+
+    def finish(self, error: Exception = None):
+        """结束记录
+
+        Args:
+            error: 运行失败时的异常
+        """
+        self.duration = time.perf_counter() - self._start
+        if error is not None and self.error is None:
+            self.error = str(error)
+        self.status = "error" if self.error is not None else "ok"
+
+    def to_record(self) -> dict:
+        """转换为可序列化的记录"""
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "labels": self.labels,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration": getattr(self, "duration", time.perf_counter() - self._start),
+            "status": self.status,
+            "error": self.error,
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        record = self.to_record()
+        base = {"run": self.name, **{k: str(v) for k, v in self.labels.items()}}
+
+        def labels(**extra):
+            items = {**base, **extra}
+            escaped = (
+                str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                for value in items.values()
+            )
+            return ",".join(f'{key}="{value}"' for key, value in zip(items, escaped))
+
+        lines = [
+            "# HELP daily_report_run_duration_seconds Duration of the last report run.",
+            "# TYPE daily_report_run_duration_seconds gauge",
+            f"daily_report_run_duration_seconds{{{labels()}}} {record['duration']:.6f}",
+            "# HELP daily_report_run_success Whether the last report run succeeded.",
+            "# TYPE daily_report_run_success gauge",
+            f"daily_report_run_success{{{labels()}}} {int(self.status == 'ok')}",
+            "# HELP daily_report_run_timestamp_seconds Start time of the last report run.",
+            "# TYPE daily_report_run_timestamp_seconds gauge",
+            f"daily_report_run_timestamp_seconds{{{labels()}}} {self.started_at:.3f}",
+            "# HELP daily_report_stage_duration_seconds Duration of each pipeline stage.",
+            "# TYPE daily_report_stage_duration_seconds gauge",
+        ]
+        for stage, seconds in self.stages.items():
+            lines.append(
+                f"daily_report_stage_duration_seconds{{{labels(stage=stage)}}} {seconds:.6f}"
+            )
+        lines += [
+            "# HELP daily_report_counter Counters collected during the last report run.",
+            "# TYPE daily_report_counter gauge",
+        ]
+        for counter, value in self.counters.items():
+            lines.append(f"daily_report_counter{{{labels(counter=counter)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str = None, prometheus_path: str = None):
+        """追加写入JSON Lines记录，并按需导出Prometheus文本
+
+        Args:
+            path: JSON Lines文件路径，为None时使用CONFIG中的METRICS_FILE
+            prometheus_path: Prometheus文本文件路径，为None时使用CONFIG中的METRICS_PROM_FILE，
+                未配置时不导出
+        """
+        path = path or CONFIG["METRICS_FILE"]
+        prometheus_path = prometheus_path or CONFIG["METRICS_PROM_FILE"]
+
+        for target in (path, prometheus_path):
+            target_dir = os.path.dirname(target) if target else ""
+            if target_dir and not os.path.exists(target_dir):
+                os.makedirs(target_dir, exist_ok=True)
+
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_record(), ensure_ascii=False) + "\n")
+
+        if prometheus_path:
+            # 先写临时文件再替换，避免采集端读到写了一半的文件
+            tmp_path = f"{prometheus_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, prometheus_path)
+
+
+@contextmanager
+def record_run(name: str, **labels):
+    """记录一次运行，结束时写入指标文件
+
+    Args:
+        name: 运行名称
+        **labels: 附加标签
+
+    Yields:
+        RunMetrics: 当前运行的指标记录
+    """
+    run = RunMetrics(name, **labels)
+    token = _current_run.set(run)
+    error = None
+    try:
+        yield run
+    except BaseException as e:
+        # sys.exit(0)不视为失败
+        if not (isinstance(e, SystemExit) and not e.code):
+            error = e
+        raise
+    finally:
+        _current_run.reset(token)
+        run.finish(error)
+        try:
+            run.write()
+        except Exception as e:
+            logging.error(f"写入运行指标失败: {str(e)}")
+
+
+@contextmanager
+def stage(name: str):
+    """记录一个阶段的耗时，不在运行记录中时只计时不上报
+
+    Args:
+        name: 阶段名称，例如fetch、extract、llm、render、smtp
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run = _current_run.get()
+        if run is not None:
+            run.add_stage_time(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """记录函数耗时的装饰器
+
+    Args:
+        name: 阶段名称
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_stage(name: str, seconds: float):
+    """上报在别处测得的阶段耗时，例如流式输出的首个token延迟，不在运行记录中时忽略
+
+    Args:
+        name: 阶段名称
+        seconds: 耗时(秒)
+    """
+    run = _current_run.get()
+    if run is not None:
+        run.add_stage_time(name, seconds)
+
+
+def incr(counter: str, value: float = 1):
+    """累加当前运行的计数，不在运行记录中时忽略
+
+    Args:
+        counter: 计数名称，例如bytes_fetched、prompt_tokens、llm_retries
+        value: 增加的值
+    """
+    run = _current_run.get()
+    if run is not None:
+        run.incr(counter, value)
+
+
+def current_run():
+    """获取当前正在记录的运行，没有时返回None"""
+    return _current_run.get()
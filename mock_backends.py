@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import random
+import re
+import smtplib
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from gemini_processor import GeminiClient, set_gemini_client
+from email_sender import SMTPConnectionPool, set_smtp_pool
+
+# 假模型从提示词中识别多天合并请求的日期块
+_DAY_BLOCK_PATTERN = re.compile(r"<(\d{4}-\d{2}-\d{2})>\n(.*?)\n</\1>", re.DOTALL)
+
+
+class _Server:
+    """在后台线程中运行的socketserver，支持with语句"""
+
+    def __init__(self, server: socketserver.BaseServer):
+        self._server = server
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        """启动服务器"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _PlanRequestHandler(BaseHTTPRequestHandler):
+    """按路径返回内存中的计划文件，ETag一致时返回304"""
+
+    def do_GET(self):
+        owner = self.server.owner
+        entry = owner.files.get(self.path)
+        with owner.lock:
+            owner.requests += 1
+        if entry is None:
+            self.send_error(404)
+            return
+        body, etag = entry
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PlanFileServer(_Server):
+    """进程内的计划文件HTTP服务器"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """初始化PlanFileServer
+
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时自动选择
+        """
+        server = ThreadingHTTPServer((host, port), _PlanRequestHandler)
+        server.daemon_threads = True
+        server.owner = self
+        super().__init__(server)
+        self.files = {}  # 路径 -> (内容, ETag)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def add(self, name: str, content: str) -> str:
+        """添加或替换一个计划文件
+
+        Args:
+            name: 文件名
+            content: 文件内容
+
+        Returns:
+            str: 文件的访问地址
+        """
+        body = content.encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.files[f"/{name}"] = (body, etag)
+        return f"http://{self.host}:{self.port}/{name}"
+
+
+class _FakeUsage:
+    """与Gemini SDK相同字段的token用量"""
+
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _FakeResponse:
+    """与Gemini SDK相同接口的生成结果"""
+
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.usage_metadata = _FakeUsage(len(prompt) // 4, len(text) // 4)
+
+
+class _FakeChunk:
+    """流式输出中的一个片段"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    """与Gemini SDK流式结果相同接口的生成结果
+
+    前一半延迟用于等待首个片段，后一半延迟平均分配到其余片段之间。
+    """
+
+    def __init__(self, text: str, prompt: str, delay: float, chunk_size: int):
+        self._text = text
+        self._delay = delay
+        self._chunk_size = chunk_size
+        self.usage_metadata = _FakeUsage(len(prompt) // 4, len(text) // 4)
+
+    def __iter__(self):
+        pieces = [
+            self._text[i: i + self._chunk_size]
+            for i in range(0, len(self._text), self._chunk_size)
+        ]
+        time.sleep(self._delay / 2)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self._delay / 2 / len(pieces))
+            yield _FakeChunk(piece)
+
+
+class FakeModel:
+    """延迟可配置的假模型
+
+    按提示词中的原始内容逐行生成编号要点，多天合并请求按日期分隔输出，
+    输出格式与真实模型一致，可以经过完整的整理和渲染流程。
+    支持stream=True的流式输出，用于测量首个token延迟和截止时间。
+    """
+
+    # 流式输出每个片段的字符数
+    chunk_size = 16
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+    ):
+        """初始化FakeModel
+
+        Args:
+            latency: 每次请求的固定延迟(秒)
+            jitter: 在固定延迟之上增加的随机延迟上限(秒)
+            error_rate: 返回503错误的概率，用于触发重试
+            slow_rate: 出现长尾延迟的概率
+            slow_latency: 长尾请求额外增加的延迟(秒)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _summarize(body: str) -> str:
+        """将每一行内容转换为一个编号要点"""
+        lines = [line.strip() for line in body.splitlines() if line.strip()]
+        return "".join(f"{i}. 学习了{line}<br><br>" for i, line in enumerate(lines, 1))
+
+    def generate_content(
+        self,
+        prompt: str,
+        generation_config: dict = None,
+        request_options: dict = None,
+        stream: bool = False,
+    ):
+        """模拟一次生成请求
+
+        Args:
+            prompt: 提示词
+            generation_config: 生成参数，忽略
+            request_options: 请求选项，忽略
+            stream: 是否流式返回
+
+        Returns:
+            带text和usage_metadata属性的结果，流式时为可迭代的片段序列
+        """
+        with self._lock:
+            self.calls += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if self.slow_rate and random.random() < self.slow_rate:
+            delay += self.slow_latency
+        # 流式请求的延迟在迭代片段时产生，错误在连接阶段返回
+        time.sleep(0 if stream else delay)
+        if self.error_rate and random.random() < self.error_rate:
+            error = RuntimeError("503 Service Unavailable")
+            error.code = 503
+            raise error
+
+        source = prompt.split("原始内容：", 1)[-1]
+        days = _DAY_BLOCK_PATTERN.findall(source)
+        if days:
+            text = "\n".join(
+                f"<<<DAY {day}>>>\n{self._summarize(body)}\n<<<END {day}>>>"
+                for day, body in days
+            )
+        else:
+            text = self._summarize(source.replace("<正文>", "").replace("</正文>", ""))
+        if stream:
+            return _FakeStream(text, prompt, delay, self.chunk_size)
+        return _FakeResponse(text, prompt)
+
+
+def fake_model_factory(
+    latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, models: dict = None
+):
+    """创建供GeminiClient使用的假模型工厂
+
+    Args:
+        latency: 默认假模型的固定延迟(秒)
+        jitter: 默认假模型的随机延迟上限(秒)
+        error_rate: 默认假模型返回503错误的概率
+        models: 模型名称到FakeModel的映射，用于模拟模型链中表现不同的模型，
+            未列出的模型名称共用默认的FakeModel
+
+    Returns:
+        function: 模型名称 -> FakeModel
+    """
+    model = FakeModel(latency, jitter, error_rate)
+    models = models or {}
+    return lambda model_name: models.get(model_name, model)
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """最小的SMTP会话处理，接受任意账号登录，收到的邮件只计数"""
+
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        sink = self.server.owner
+        self._reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250-localhost")
+                self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 8BITMIME")
+            elif verb == "AUTH":
+                self._reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    size += len(chunk)
+                    if sink.keep:
+                        data.append(chunk)
+                sink._received(size, b"".join(data))
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink(_Server):
+    """只接收不投递的本地SMTP服务器"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, keep: bool = False):
+        """初始化SMTPSink
+
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时自动选择
+            keep: 是否保留收到的邮件原文，大批量测试时应关闭以节省内存
+        """
+        server = _ThreadingTCPServer((host, port), _SMTPSinkHandler)
+        server.owner = self
+        super().__init__(server)
+        self.keep = keep
+        self.count = 0
+        self.bytes = 0
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def _received(self, size: int, data: bytes):
+        with self._lock:
+            self.count += 1
+            self.bytes += size
+            if self.keep:
+                self.messages.append(data)
+
+
+def plain_smtp_transport(host: str, port: int, context=None, timeout: float = None):
+    """不使用TLS的SMTP连接，用于连接本地SMTPSink"""
+    return smtplib.SMTP(host, port, timeout=timeout)
+
+
+def install(
+    latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, models: dict = None
+) -> FakeModel:
+    """将共享的Gemini客户端和SMTP连接池替换为本地替身
+
+    Gemini客户端不限流，SMTP连接池使用不加密的连接；计划文件使用真实的获取器，
+    只需把PLAN_URL指向PlanFileServer，SMTP_SERVER和SMTP_PORT指向SMTPSink。
+
+    Args:
+        latency: 假模型每次请求的固定延迟(秒)
+        jitter: 假模型的随机延迟上限(秒)
+        error_rate: 假模型返回503错误的概率
+        models: 模型名称到FakeModel的映射，未列出的模型使用默认的假模型
+
+    Returns:
+        FakeModel: 安装的默认假模型，可读取calls统计调用次数
+    """
+    factory = fake_model_factory(latency, jitter, error_rate, models)
+    set_gemini_client(
+        GeminiClient(requests_per_minute=1e9, burst=1_000_000, model_factory=factory)
+    )
+    set_smtp_pool(SMTPConnectionPool(transport=plain_smtp_transport))
+    return factory(None)
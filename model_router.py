@@ -0,0 +1,196 @@
+import logging
+import threading
+from collections import deque
+from typing import NamedTuple
+from config import CONFIG
+
+
+class ModelBackend(NamedTuple):
+    """模型链中的一个模型"""
+
+    name: str  # 模型名称
+    timeout: float  # 单次请求超时(秒)
+
+
+def parse_models(value: str, default_timeout: float = None) -> list[ModelBackend]:
+    """解析模型链配置
+
+    Args:
+        value: 逗号分隔的模型列表，按优先级排列，每一项可以用"名称:超时秒数"指定超时
+        default_timeout: 未指定超时的模型使用的超时，为None时使用CONFIG中的GEMINI_TIMEOUT
+
+    Returns:
+        list: 模型链
+
+    Raises:
+        ValueError: 模型链为空或超时格式错误
+    """
+    default_timeout = default_timeout or CONFIG["GEMINI_TIMEOUT"]
+    models = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, timeout = item.partition(":")
+        try:
+            models.append(ModelBackend(name.strip(), float(timeout) if timeout else default_timeout))
+        except ValueError:
+            raise ValueError(f"模型超时格式错误: {item}") from None
+    if not models:
+        raise ValueError("GEMINI_MODELS中没有配置任何模型")
+    return models
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """按最近秩法计算百分位数
+
+    Args:
+        samples: 样本，不需要排序
+        q: 百分位，0到100
+
+    Returns:
+        float: 百分位数，没有样本时返回None
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * q // 100))  # 向上取整
+    return ordered[int(rank) - 1]
+
+
+class ModelRouter:
+    """按滚动延迟为模型链选择路由
+
+    每个模型保留最近GEMINI_LATENCY_WINDOW次成功请求的耗时和最近的成败记录。
+    默认路由是按优先级第一个健康的模型：样本不足GEMINI_ROUTE_MIN_SAMPLES次的模型视为健康，
+    否则要求失败率低于一半且p95不超过GEMINI_ROUTE_P95_TARGET(未设置时为该模型的超时)。
+    没有健康的模型时选择p50最低的模型，其余模型按优先级作为回退。
+    """
+
+    def __init__(self, models: list[ModelBackend] = None, window: int = None):
+        """初始化ModelRouter
+
+        Args:
+            models: 按优先级排列的模型链，为None时解析CONFIG中的GEMINI_MODELS
+            window: 每个模型保留的样本数，为None时使用CONFIG中的GEMINI_LATENCY_WINDOW
+        """
+        self.window = window or CONFIG["GEMINI_LATENCY_WINDOW"]
+        self._lock = threading.Lock()
+        self._latencies = {}  # 模型名称 -> 最近成功请求的耗时
+        self._outcomes = {}  # 模型名称 -> 最近请求是否成功
+        self._default = None
+        self.configure(models or parse_models(CONFIG["GEMINI_MODELS"]))
+
+    def configure(self, models: list[ModelBackend]):
+        """替换模型链，仍在链中的模型保留已有的延迟记录
+
+        Args:
+            models: 按优先级排列的模型链
+        """
+        with self._lock:
+            self.models = list(models)
+            for backend in self.models:
+                self._latencies.setdefault(backend.name, deque(maxlen=self.window))
+                self._outcomes.setdefault(backend.name, deque(maxlen=self.window))
+
+    def record(self, model_name: str, latency: float = None, ok: bool = True):
+        """记录一次请求的结果
+
+        Args:
+            model_name: 模型名称
+            latency: 成功请求的耗时(秒)
+            ok: 请求是否成功，超时也视为失败
+        """
+        with self._lock:
+            # 用户名单中可以为个别用户配置不在全局模型链中的模型
+            self._outcomes.setdefault(model_name, deque(maxlen=self.window)).append(ok)
+            latencies = self._latencies.setdefault(model_name, deque(maxlen=self.window))
+            if ok and latency is not None:
+                latencies.append(latency)
+
+    def latency(self, model_name: str, q: float) -> float:
+        """模型最近成功请求耗时的百分位数，样本不足时返回None
+
+        Args:
+            model_name: 模型名称
+            q: 百分位，0到100
+        """
+        with self._lock:
+            samples = list(self._latencies.get(model_name, ()))
+        if len(samples) < CONFIG["GEMINI_ROUTE_MIN_SAMPLES"]:
+            return None
+        return percentile(samples, q)
+
+    def healthy(self, backend: ModelBackend) -> bool:
+        """模型近期是否健康：样本不足，或失败率低于一半且p95不超过目标"""
+        with self._lock:
+            outcomes = list(self._outcomes.get(backend.name, ()))
+        if len(outcomes) < CONFIG["GEMINI_ROUTE_MIN_SAMPLES"]:
+            return True
+        if outcomes.count(False) * 2 >= len(outcomes):
+            return False
+        p95 = self.latency(backend.name, 95)
+        return p95 is None or p95 <= (CONFIG["GEMINI_ROUTE_P95_TARGET"] or backend.timeout)
+
+    def fastest(self, candidates: list[ModelBackend]) -> ModelBackend:
+        """候选模型中p50最低的模型，都没有足够样本时返回优先级最高的模型"""
+
+        def sort_key(item):
+            index, backend = item
+            p50 = self.latency(backend.name, 50)
+            return (p50 is None, p50 or 0.0, index)
+
+        return min(enumerate(candidates), key=sort_key)[1]
+
+    def route(self, models: list[ModelBackend] = None) -> list[ModelBackend]:
+        """当前的模型调用顺序
+
+        Args:
+            models: 按优先级排列的模型链，为None时使用配置的模型链
+
+        Returns:
+            list: 第一个是默认路由，其余按优先级排列作为回退
+        """
+        configured = models is None
+        models = self.models if configured else models
+        default = next((backend for backend in models if self.healthy(backend)), None)
+        if default is None:
+            default = self.fastest(models)
+        if configured and default.name != self._default:
+            if self._default is not None:
+                logging.warning(f"默认模型由{self._default}切换为{default.name}")
+            self._default = default.name
+        return [default] + [backend for backend in models if backend is not default]
+
+    def hedge_delay(self, model_name: str) -> float:
+        """模型请求超过多久未返回时发出对冲请求
+
+        Returns:
+            float: 该模型最近耗时的GEMINI_HEDGE_PERCENTILE分位数(秒)，
+                未开启对冲或样本不足时返回None
+        """
+        q = CONFIG["GEMINI_HEDGE_PERCENTILE"]
+        if q <= 0:
+            return None
+        return self.latency(model_name, q)
+
+    def snapshot(self) -> dict:
+        """各模型的滚动统计
+
+        Returns:
+            dict: 模型名称 -> 样本数、失败次数、p50和p95耗时(秒)
+        """
+        stats = {}
+        with self._lock:
+            names = list(self._outcomes)
+        for name in names:
+            with self._lock:
+                samples = list(self._latencies[name])
+                failures = list(self._outcomes[name]).count(False)
+            stats[name] = {
+                "samples": len(samples),
+                "failures": failures,
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+            }
+        return stats
@@ -0,0 +1,360 @@
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email import message_from_string
+from config import CONFIG, load_config
+from metrics import incr, stage
+
+# 邮件状态
+STATUS_PENDING = "pending"  # 等待发送或等待重试
+STATUS_SENDING = "sending"  # 已被某个进程领取，正在发送
+STATUS_SENT = "sent"  # 已发送
+STATUS_FAILED = "failed"  # 超过最大尝试次数，不再自动重试
+
+
+class Outbox:
+    """持久化的发件箱
+
+    生成好的邮件先写入本地SQLite数据库再发送，以(用户, 日期)作为幂等键：
+    同一用户同一天只会入队一次，已发送的邮件不会再次发送。
+    发送失败的邮件按指数退避安排重试，重新运行时无需再次生成内容。
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        max_attempts: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None,
+        lease: float = None,
+    ):
+        """初始化Outbox
+
+        Args:
+            path: 数据库路径，为None时使用CONFIG中的OUTBOX_FILE
+            max_attempts: 最大发送尝试次数，为None时使用CONFIG中的OUTBOX_MAX_ATTEMPTS
+            backoff_base: 重试退避基数(秒)，为None时使用CONFIG中的OUTBOX_BACKOFF_BASE
+            backoff_max: 最长退避时间(秒)，为None时使用CONFIG中的OUTBOX_BACKOFF_MAX
+            lease: 领取后超过该秒数仍未完成的邮件视为发送进程已中断，可重新领取，
+                为None时使用CONFIG中的OUTBOX_LEASE
+        """
+        self.path = path or CONFIG["OUTBOX_FILE"]
+        self.max_attempts = max_attempts or CONFIG["OUTBOX_MAX_ATTEMPTS"]
+        self.backoff_base = (
+            backoff_base if backoff_base is not None else CONFIG["OUTBOX_BACKOFF_BASE"]
+        )
+        self.backoff_max = (
+            backoff_max if backoff_max is not None else CONFIG["OUTBOX_BACKOFF_MAX"]
+        )
+        self.lease = lease if lease is not None else CONFIG["OUTBOX_LEASE"]
+        self._lock = threading.Lock()
+
+        # 确保数据库目录存在
+        outbox_dir = os.path.dirname(self.path)
+        if outbox_dir and not os.path.exists(outbox_dir):
+            os.makedirs(outbox_dir, exist_ok=True)
+
+        # 多个进程可能同时访问发件箱，等待对方释放写锁
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                user TEXT NOT NULL,
+                report_date TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                recipients TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                sent_at REAL,
+                PRIMARY KEY (user, report_date)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)"
+        )
+        self._conn.commit()
+
+    def get(self, user: str, report_date: str):
+        """查询邮件状态
+
+        Args:
+            user: 用户名
+            report_date: 日报日期，格式为YYYY-MM-DD
+
+        Returns:
+            dict: 邮件记录(不含邮件正文)，不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user, report_date, sender, recipients, subject, status, attempts, "
+                "next_attempt_at, last_error, created_at, sent_at "
+                "FROM outbox WHERE user = ? AND report_date = ?",
+                (user, report_date),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def enqueue(self, user: str, report_date: str, msg) -> bool:
+        """将渲染好的邮件加入发件箱
+
+        Args:
+            user: 用户名
+            report_date: 日报日期，格式为YYYY-MM-DD
+            msg: 邮件对象
+
+        Returns:
+            bool: 是否新加入，同一用户同一天已有邮件时返回False且不覆盖
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (user, report_date, sender, recipients, subject, "
+                "message, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user,
+                    report_date,
+                    msg["From"],
+                    msg["To"],
+                    msg["Subject"],
+                    msg.as_string(),
+                    STATUS_PENDING,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            incr("outbox_enqueued")
+            logging.info(f"已加入发件箱: {user} {report_date}")
+        return bool(cursor.rowcount)
+
+    def retry(self, user: str, report_date: str) -> bool:
+        """立即重新发送尚未发送成功的邮件，已放弃的邮件重新计算尝试次数
+
+        Args:
+            user: 用户名
+            report_date: 日报日期
+
+        Returns:
+            bool: 是否有邮件被重新设为待发送
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, updated_at = ?, "
+                "attempts = CASE WHEN status = ? THEN 0 ELSE attempts END "
+                "WHERE user = ? AND report_date = ? AND status IN (?, ?)",
+                (
+                    STATUS_PENDING,
+                    now,
+                    now,
+                    STATUS_FAILED,
+                    user,
+                    report_date,
+                    STATUS_PENDING,
+                    STATUS_FAILED,
+                ),
+            )
+            self._conn.commit()
+        return bool(cursor.rowcount)
+
+    def _claim(
+        self, sender: str = None, user: str = None, report_date: str = None
+    ) -> list[sqlite3.Row]:
+        """领取所有到期的邮件，领取后其他进程不会重复发送"""
+        now = time.time()
+        query = (
+            "SELECT user, report_date, message, attempts FROM outbox "
+            "WHERE ((status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at <= ?))"
+        )
+        params = [STATUS_PENDING, now, STATUS_SENDING, now - self.lease]
+        if sender is not None:
+            query += " AND sender = ?"
+            params.append(sender)
+        if user is not None:
+            query += " AND user = ? AND report_date = ?"
+            params.extend([user, report_date])
+        query += " ORDER BY next_attempt_at"
+
+        with self._lock:
+            # BEGIN IMMEDIATE保证查询和领取之间没有其他进程插入
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(query, params).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, updated_at = ? "
+                    "WHERE user = ? AND report_date = ?",
+                    [(STATUS_SENDING, now, row["user"], row["report_date"]) for row in rows],
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return rows
+
+    def _mark_sent(self, user: str, report_date: str):
+        """标记为已发送"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, "
+                "sent_at = ?, updated_at = ? WHERE user = ? AND report_date = ?",
+                (STATUS_SENT, now, now, user, report_date),
+            )
+            self._conn.commit()
+
+    def _mark_failed(self, user: str, report_date: str, attempts: int, error: str) -> str:
+        """记录发送失败，安排下次重试或放弃，返回新的状态"""
+        now = time.time()
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = STATUS_FAILED, now
+        else:
+            delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+            status, next_attempt_at = STATUS_PENDING, now + delay
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ?, updated_at = ? WHERE user = ? AND report_date = ?",
+                (status, attempts, next_attempt_at, error, now, user, report_date),
+            )
+            self._conn.commit()
+        return status
+
+    def drain(self, config: dict = None, user: str = None, report_date: str = None) -> list[dict]:
+        """发送所有到期的待发送邮件
+
+        Args:
+            config: 发件配置，为None时使用CONFIG，只发送该账号入队的邮件
+            user: 只发送该用户的邮件，需同时指定report_date，为None时发送所有到期的邮件
+            report_date: 只发送该日期的邮件
+
+        Returns:
+            list: 每封邮件的发送结果，每项包含用户、日期、状态和错误信息
+        """
+        # 延迟导入，避免只查询发件箱时也加载发送模块
+        from email_sender import get_smtp_pool
+
+        config = config or CONFIG
+        pool = get_smtp_pool()
+        results = []
+        for row in self._claim(config["EMAIL_FROM"], user, report_date):
+            user, report_date = row["user"], row["report_date"]
+            attempts = row["attempts"] + 1
+            result = {"user": user, "report_date": report_date, "status": STATUS_SENT, "error": None}
+            try:
+                with stage("smtp"):
+                    pool.send(message_from_string(row["message"]), config)
+                self._mark_sent(user, report_date)
+                incr("outbox_sent")
+                logging.info(f"发件箱邮件发送成功: {user} {report_date}")
+            except Exception as e:
+                result["error"] = str(e)
+                result["status"] = self._mark_failed(user, report_date, attempts, str(e))
+                incr("outbox_failures")
+                logging.error(
+                    f"发件箱邮件发送失败({user} {report_date}，第{attempts}次): {str(e)}"
+                )
+            results.append(result)
+        return results
+
+    def stats(self) -> dict:
+        """统计各状态的邮件数量
+
+        Returns:
+            dict: 状态到数量的映射
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def entries(self, status: str = None) -> list[dict]:
+        """列出发件箱中的邮件
+
+        Args:
+            status: 只列出该状态的邮件，为None时列出全部
+
+        Returns:
+            list: 邮件记录(不含邮件正文)，按日期倒序
+        """
+        query = (
+            "SELECT user, report_date, recipients, subject, status, attempts, "
+            "next_attempt_at, last_error, sent_at FROM outbox"
+        )
+        params = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY report_date DESC, user"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """获取进程内共享的发件箱，首次调用时创建"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+
+def main():
+    """发件箱命令行入口：发送到期邮件或查看状态"""
+    parser = argparse.ArgumentParser(description="日报发件箱")
+    parser.add_argument(
+        "command",
+        choices=["drain", "list", "retry"],
+        help="drain: 发送到期邮件; list: 查看邮件状态; retry: 立即重新发送指定日期的邮件",
+    )
+    parser.add_argument("--status", help="list时只显示该状态的邮件")
+    parser.add_argument("--user", help="retry的用户名，默认为USER_NAME")
+    parser.add_argument("--date", help="retry的日报日期(YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    load_config()
+    outbox = get_outbox()
+
+    if args.command == "list":
+        for item in outbox.entries(args.status):
+            error = f" ({item['last_error']})" if item["last_error"] else ""
+            print(
+                f"{item['report_date']} {item['user']} [{item['status']}] "
+                f"尝试{item['attempts']}次 -> {item['recipients']}{error}"
+            )
+        print(f"统计: {outbox.stats()}")
+        return
+
+    if args.command == "retry":
+        if not args.date:
+            parser.error("retry需要指定--date")
+        user = args.user or CONFIG["USER_NAME"]
+        if not outbox.retry(user, args.date):
+            print(f"没有需要重新发送的邮件: {user} {args.date}")
+            return
+
+    results = outbox.drain()
+    sent = sum(1 for result in results if result["status"] == STATUS_SENT)
+    print(f"发送完成: 成功{sent}封, 失败{len(results) - sent}封")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import logging
+from typing import NamedTuple
+from config import CONFIG
+from scraper import get_beijing_date, get_notion_content
+from pregenerate import summarize_for_date
+from email_generator import render_email
+from email_sender import build_email
+from outbox import STATUS_SENDING, STATUS_SENT, get_outbox
+
+# 同一天的日报已经发送过，本次没有发送
+STATUS_SKIPPED = "skipped"
+
+
+class PlanContent(NamedTuple):
+    """获取阶段的结果"""
+
+    source: str  # 计划来源地址
+    report_date: str  # 日报日期，格式为YYYY-MM-DD
+    content: str  # 用正文标签包装的当天学习内容
+
+
+class Summary(NamedTuple):
+    """总结阶段的结果"""
+
+    report_date: str
+    text: str  # 格式化后的学习总结
+
+
+class RenderedReport(NamedTuple):
+    """渲染阶段的结果"""
+
+    user: str
+    report_date: str
+    draft: str  # 填入模板、带正文标签的邮件文本
+
+
+class Delivery(NamedTuple):
+    """发送阶段的结果"""
+
+    user: str
+    report_date: str
+    status: str  # sent、skipped，或发件箱中的pending、sending、failed
+    error: str = None
+
+    @property
+    def ok(self) -> bool:
+        """日报是否已经送达"""
+        return self.status in (STATUS_SENT, STATUS_SKIPPED)
+
+    @property
+    def in_progress(self) -> bool:
+        """日报正由其他进程发送(发件箱中的租约尚未过期)，不算失败"""
+        return self.status == STATUS_SENDING
+
+
+class ReportPipeline:
+    """单个用户单日日报的流水线
+
+    依次经过获取、总结、渲染、发送四个阶段，每个阶段的结果保存在实例上，
+    后面的阶段按需触发前面的阶段，同一个实例中每个阶段最多执行一次。
+    可以单独调用某个阶段检查中间结果，也可以调用run完成全部阶段；
+    批量运行时由调用方逐个调用各阶段，以便统计耗时和控制各阶段的并发。
+    """
+
+    def __init__(self, profile: dict = None, report_date: str = None, drain_all: bool = True):
+        """初始化ReportPipeline
+
+        Args:
+            profile: 用户配置，覆盖CONFIG中的同名配置项
+            report_date: 日报日期，格式为YYYY-MM-DD，为None时使用当前北京时间的日期
+            drain_all: 发送时是否顺带发送发件箱中其他到期的邮件，
+                多个用户并发运行时应为False，每个流水线只发送自己的日报
+        """
+        self.profile = profile
+        self.config = {**CONFIG, **(profile or {})}
+        self.user = self.config["USER_NAME"]
+        self.source = self.config["PLAN_URL"]
+        self.report_date = report_date or get_beijing_date()
+        self.drain_all = drain_all
+        self.plan = None
+        self.summary = None
+        self.report = None
+        self.delivery = None
+
+    def fetch(self, content: str = None) -> PlanContent:
+        """获取当天的学习内容
+
+        Args:
+            content: 调用方已经获取到的当天学习内容，例如批量运行时多个用户共用的计划，
+                为None时从计划来源获取
+        """
+        if self.plan is None:
+            if content is None:
+                logging.info("正在获取学习内容...")
+                content = get_notion_content(self.source, self.report_date)
+            self.plan = PlanContent(self.source, self.report_date, content)
+            logging.info(f"成功获取学习内容: {len(content)} 字符")
+        return self.plan
+
+    def summarize(self) -> Summary:
+        """总结学习内容，提前生成过且计划内容未变化时不再调用Gemini"""
+        if self.summary is None:
+            plan = self.fetch()
+            logging.info("正在使用Gemini处理内容...")
+            text = summarize_for_date(
+                plan.content, plan.report_date, plan.source, self.profile
+            )
+            self.summary = Summary(plan.report_date, text)
+        return self.summary
+
+    def render(self) -> RenderedReport:
+        """将总结填入当前用户的邮件模板"""
+        if self.report is None:
+            draft = render_email(self.summarize().text, self.profile)
+            self.report = RenderedReport(self.user, self.report_date, draft)
+        return self.report
+
+    def queued(self) -> bool:
+        """日报是否已经在发件箱中(已发送或等待重试)，此时发送不需要前面的阶段"""
+        return get_outbox().get(self.user, self.report_date) is not None
+
+    def deliver(self) -> Delivery:
+        """通过发件箱发送日报
+
+        同一用户同一天的日报只生成和发送一次：已发送时直接跳过，
+        已在发件箱中时只重试发送，都不会触发前面的阶段。
+        其他进程正在发送时不重复发送，返回sending状态。
+        """
+        if self.delivery is not None:
+            return self.delivery
+
+        outbox = get_outbox()
+        entry = outbox.get(self.user, self.report_date)
+        if entry is not None and entry["status"] == STATUS_SENT:
+            self.delivery = Delivery(self.user, self.report_date, STATUS_SKIPPED)
+            return self.delivery
+
+        if entry is not None and entry["status"] == STATUS_SENDING:
+            # 租约过期的邮件会在下面的drain中被重新领取
+            logging.info(f"{self.user} {self.report_date}的日报正在由其他进程发送")
+
+        if entry is None:
+            # 先写入发件箱，发送失败时生成的内容不会丢失
+            msg = build_email(self.render().draft, self.profile, report_date=self.report_date)
+            outbox.enqueue(self.user, self.report_date, msg)
+        else:
+            # 手动重跑时立即重试，不等待退避时间
+            outbox.retry(self.user, self.report_date)
+
+        # 发送发件箱中到期的邮件
+        logging.info("正在发送邮件...")
+        if self.drain_all:
+            outbox.drain(self.config)
+        else:
+            outbox.drain(self.config, self.user, self.report_date)
+        entry = outbox.get(self.user, self.report_date)
+        status = entry["status"]
+        error = None
+        if status not in (STATUS_SENT, STATUS_SENDING):
+            error = entry["last_error"] or f"邮件状态为{status}"
+        self.delivery = Delivery(self.user, self.report_date, status, error)
+        return self.delivery
+
+    def run(self) -> Delivery:
+        """执行全部阶段
+
+        Returns:
+            Delivery: 发送结果
+        """
+        return self.deliver()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import NamedTuple
+from config import CONFIG
+
+
+class PlanChanges(NamedTuple):
+    """两次获取之间计划表按日期的变化"""
+
+    added: list  # 新增的日期
+    changed: list  # 内容被修改的日期
+    removed: list  # 被删除的日期
+
+    @property
+    def modified(self) -> list[str]:
+        """内容需要重新生成的日期，即新增和修改的日期"""
+        return sorted(self.added + self.changed)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def describe(self) -> str:
+        """变化的简要说明"""
+        return f"新增{len(self.added)}天，修改{len(self.changed)}天，删除{len(self.removed)}天"
+
+
+def diff_fingerprints(old: dict, new: dict) -> PlanChanges:
+    """比较两个版本的每日指纹
+
+    Args:
+        old: 上一版本日期到指纹的映射
+        new: 当前版本日期到指纹的映射
+
+    Returns:
+        PlanChanges: 按日期排序的新增、修改和删除的日期
+    """
+    return PlanChanges(
+        added=sorted(d for d in new if d not in old),
+        changed=sorted(d for d in new if d in old and old[d] != new[d]),
+        removed=sorted(d for d in old if d not in new),
+    )
+
+
+class FingerprintStore:
+    """持久化的计划表每日指纹
+
+    每个(使用方, 计划来源)保存一份基准指纹，与计划文件镜像放在同一目录。
+    使用方把本次获取的指纹与自己的基准比较得出变化的日期，处理完这些日期后再推进基准，
+    因此其他流程获取同一计划表不会吞掉尚未处理的变化。
+    """
+
+    def __init__(self, directory: str = None):
+        """初始化FingerprintStore
+
+        Args:
+            directory: 保存目录，为None时使用CONFIG中的PLAN_MIRROR_DIR
+        """
+        self.directory = directory or CONFIG["PLAN_MIRROR_DIR"]
+        self._lock = threading.Lock()
+        self._known = {}  # (使用方, 计划来源) -> 已保存的基准指纹
+
+    def _path(self, url: str, consumer: str) -> str:
+        """指纹文件路径，命名方式与计划文件镜像一致"""
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.{consumer}.days.json")
+
+    def load(self, url: str, consumer: str) -> dict:
+        """读取使用方的基准指纹
+
+        Args:
+            url: 计划来源地址
+            consumer: 使用方名称，例如pregenerate
+
+        Returns:
+            dict: 日期到指纹的映射，从未保存过时返回空字典
+        """
+        with self._lock:
+            return dict(self._load(url, consumer))
+
+    def _load(self, url: str, consumer: str) -> dict:
+        known = self._known.get((consumer, url))
+        if known is not None:
+            return known
+        known = {}
+        path = self._path(url, consumer)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    known = json.load(f)["fingerprints"]
+            except (ValueError, KeyError):
+                logging.warning(f"计划指纹文件损坏，将重新记录: {path}")
+        self._known[(consumer, url)] = known
+        return known
+
+    def diff(self, url: str, fingerprints: dict, consumer: str) -> PlanChanges:
+        """比较本次获取的指纹与使用方的基准，不修改基准
+
+        Args:
+            url: 计划来源地址
+            fingerprints: 日期到指纹的映射
+            consumer: 使用方名称
+
+        Returns:
+            PlanChanges: 与基准相比的变化
+        """
+        with self._lock:
+            return diff_fingerprints(self._load(url, consumer), fingerprints)
+
+    def advance(self, url: str, fingerprints: dict, consumer: str):
+        """使用方处理完变化后，把基准推进到本次获取的指纹
+
+        Args:
+            url: 计划来源地址
+            fingerprints: 已处理的日期到指纹的映射
+            consumer: 使用方名称
+        """
+        with self._lock:
+            if self._load(url, consumer) != fingerprints:
+                self._save(url, fingerprints, consumer)
+
+    def _save(self, url: str, fingerprints: dict, consumer: str):
+        """原子地写入指纹文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(url, consumer)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "consumer": consumer, "fingerprints": fingerprints}, f)
+        os.replace(tmp_path, path)
+        self._known[(consumer, url)] = dict(fingerprints)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    """获取进程内共享的指纹记录，首次调用时创建"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FingerprintStore()
+        return _store
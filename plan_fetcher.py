@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from config import CONFIG
+from metrics import incr
+
+
+class PlanFetcher:
+    """学习计划文件获取器
+
+    复用同一个requests.Session，并在本地保存计划文件的镜像及其ETag/Last-Modified。
+    再次获取时发送条件请求，服务器返回304时直接使用本地镜像；
+    网络不可用时回退到本地镜像。
+
+    其他获取方式只需提供相同的fetch(url)方法，通过set_plan_fetcher替换共享实例。
+    """
+
+    def __init__(self, mirror_dir: str = None, session=None):
+        """初始化PlanFetcher
+
+        Args:
+            mirror_dir: 本地镜像目录，为None时使用CONFIG中的PLAN_MIRROR_DIR
+            session: 与requests.Session接口相同的会话对象，为None时创建带重试的requests.Session
+        """
+        self.mirror_dir = mirror_dir or CONFIG["PLAN_MIRROR_DIR"]
+        self.timeout = (CONFIG["PLAN_CONNECT_TIMEOUT"], CONFIG["PLAN_READ_TIMEOUT"])
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+        if session is not None:
+            self.session = session
+            return
+
+        # requests导入较慢，只在第一次获取计划文件时导入
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=CONFIG["PLAN_FETCH_RETRIES"],
+            backoff_factor=CONFIG["PLAN_FETCH_BACKOFF"],
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        # 多个计划来源并发获取时，同一主机的连接池需要容纳所有获取线程
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=CONFIG["PLAN_FETCH_WORKERS"])
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "text/plain",
+            }
+        )
+
+    def _mirror_paths(self, url: str) -> tuple[str, str]:
+        """本地镜像文件和元数据文件的路径"""
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.mirror_dir, name)
+        return f"{base}.txt", f"{base}.json"
+
+    def _lock_for(self, url: str) -> threading.Lock:
+        """同一地址的获取操作串行执行，避免并发写镜像"""
+        with self._locks_lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def _load_mirror(self, url: str):
+        """读取本地镜像
+
+        Returns:
+            tuple: (内容, 元数据)，镜像不存在时返回(None, {})
+        """
+        content_path, meta_path = self._mirror_paths(url)
+        if not os.path.exists(content_path):
+            return None, {}
+
+        with open(content_path, "r", encoding="utf-8", newline="") as f:
+            content = f.read()
+
+        meta = {}
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except ValueError:
+                logging.warning(f"计划镜像元数据损坏，将重新下载: {meta_path}")
+        return content, meta
+
+    def _save_mirror(self, url: str, content: str, response):
+        """原子地写入本地镜像和元数据"""
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        content_path, meta_path = self._mirror_paths(url)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+        for path, data in ((content_path, content), (meta_path, json.dumps(meta))):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def cached(self, url: str):
+        """读取本地镜像，不发送请求
+
+        Args:
+            url: 计划文件地址
+
+        Returns:
+            str: 镜像内容，从未成功获取过时返回None
+        """
+        # 镜像文件总是原子替换，读取时不需要等待正在进行的获取
+        return self._load_mirror(url)[0]
+
+    def fetch(self, url: str) -> str:
+        """获取计划文件的完整内容
+
+        Args:
+            url: 计划文件地址
+
+        Returns:
+            str: 计划文件内容
+        """
+        import requests
+
+        with self._lock_for(url):
+            cached, meta = self._load_mirror(url)
+
+            headers = {}
+            if cached is not None:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code == 304 and cached is not None:
+                    logging.info("计划文件未变化，使用本地镜像")
+                    incr("plan_not_modified")
+                    return cached
+                response.raise_for_status()
+            except requests.RequestException as e:
+                if cached is None:
+                    raise
+                logging.warning(f"获取计划文件失败，使用本地镜像: {str(e)}")
+                incr("plan_mirror_fallback")
+                return cached
+
+            # 未声明编码时按UTF-8解码，避免中文内容乱码
+            if "charset" not in response.headers.get("Content-Type", ""):
+                response.encoding = "utf-8"
+            content = response.text
+            incr("bytes_fetched", len(response.content))
+            self._save_mirror(url, content, response)
+            return content
+
+
+def fetch_budget() -> float:
+    """按超时、重试次数和退避系数估算一次获取最长可能耗时(秒)
+
+    每次尝试最多耗费连接超时加读取超时，第n次重试前等待退避系数乘以2的n-1次方秒。
+    """
+    retries = CONFIG["PLAN_FETCH_RETRIES"]
+    attempt = CONFIG["PLAN_CONNECT_TIMEOUT"] + CONFIG["PLAN_READ_TIMEOUT"]
+    backoff = sum(CONFIG["PLAN_FETCH_BACKOFF"] * 2**n for n in range(retries))
+    return attempt * (retries + 1) + backoff
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_plan_fetcher() -> PlanFetcher:
+    """获取进程内共享的计划文件获取器，首次调用时创建"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = PlanFetcher()
+        return _fetcher
+
+
+def set_plan_fetcher(fetcher) -> None:
+    """替换进程内共享的计划文件获取器
+
+    Args:
+        fetcher: 提供fetch(url) -> str方法的对象，为None时下次使用时重新创建默认的PlanFetcher
+    """
+    global _fetcher
+    with _fetcher_lock:
+        _fetcher = fetcher
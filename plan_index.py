@@ -0,0 +1,141 @@
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+
+# 同时匹配开始标签<YYYY-MM-DD>和结束标签</YYYY-MM-DD>
+TAG_PATTERN = re.compile(r"<(/?)(\d{4}-\d{2}-\d{2})>")
+
+
+class PlanIndex:
+    """月度计划表的日期索引
+
+    对计划表做一次扫描，记录每个日期正文的起止偏移，并按日期排序，
+    之后的单日查询、区间查询和最近日期查询都不再扫描全文。
+    """
+
+    def __init__(self, full_content: str):
+        """初始化PlanIndex
+
+        Args:
+            full_content: 完整的计划表内容
+        """
+        self.full_content = full_content
+        self._offsets = {}  # 日期字符串 -> (正文起始偏移, 正文结束偏移)
+
+        pending = {}
+        for match in TAG_PATTERN.finditer(full_content):
+            closing, date_str = match.groups()
+            if not closing:
+                # 同一日期出现多次时以第一次为准
+                if date_str not in self._offsets and date_str not in pending:
+                    pending[date_str] = match.end()
+            elif date_str in pending:
+                self._offsets[date_str] = (pending.pop(date_str), match.start())
+
+        # 没有结束标签的日期，正文一直延续到文件末尾
+        for date_str, start in pending.items():
+            self._offsets[date_str] = (start, len(full_content))
+
+        entries = []
+        for date_str in self._offsets:
+            try:
+                entries.append((date.fromisoformat(date_str).toordinal(), date_str))
+            except ValueError:
+                continue
+        entries.sort()
+        self._ordinals = [ordinal for ordinal, _ in entries]
+        self._dates = [date_str for _, date_str in entries]
+        self._fingerprints = None
+
+    @property
+    def dates(self) -> list[str]:
+        """按时间排序的所有日期"""
+        return list(self._dates)
+
+    def __len__(self):
+        return len(self._dates)
+
+    def __contains__(self, date_str: str):
+        return date_str in self._offsets
+
+    def get(self, date_str: str):
+        """查询指定日期的内容
+
+        Args:
+            date_str: 日期字符串，格式为YYYY-MM-DD
+
+        Returns:
+            str: 去除首尾空白的正文，日期不存在时返回None
+        """
+        offsets = self._offsets.get(date_str)
+        if offsets is None:
+            return None
+        start, end = offsets
+        return self.full_content[start:end].strip()
+
+    def fingerprints(self) -> dict[str, str]:
+        """每个日期正文的指纹，首次调用时计算
+
+        Returns:
+            dict: 日期到正文SHA-256十六进制摘要的映射
+        """
+        if self._fingerprints is None:
+            self._fingerprints = {
+                d: hashlib.sha256(self.get(d).encode("utf-8")).hexdigest() for d in self._dates
+            }
+        return dict(self._fingerprints)
+
+    def range(self, start_date: str, end_date: str) -> list[tuple[str, str]]:
+        """查询日期区间内的所有内容(包含两端)
+
+        Args:
+            start_date: 起始日期，格式为YYYY-MM-DD
+            end_date: 结束日期，格式为YYYY-MM-DD
+
+        Returns:
+            list: 按日期排序的(日期, 正文)列表
+        """
+        low = bisect_left(self._ordinals, date.fromisoformat(start_date).toordinal())
+        high = bisect_right(self._ordinals, date.fromisoformat(end_date).toordinal())
+        return [(d, self.get(d)) for d in self._dates[low:high]]
+
+    def nearest(self, date_str: str):
+        """查询距离指定日期最近的日期
+
+        距离相同时优先选择较早的日期。
+
+        Args:
+            date_str: 日期字符串，格式为YYYY-MM-DD
+
+        Returns:
+            tuple: (最近的日期, 相差天数)，没有任何日期时返回(None, None)
+        """
+        if not self._ordinals:
+            return None, None
+
+        target = date.fromisoformat(date_str).toordinal()
+        position = bisect_left(self._ordinals, target)
+
+        candidates = []
+        if position > 0:
+            candidates.append(position - 1)
+        if position < len(self._ordinals):
+            candidates.append(position)
+
+        best = min(candidates, key=lambda i: abs(self._ordinals[i] - target))
+        return self._dates[best], abs(self._ordinals[best] - target)
+
+
+@lru_cache(maxsize=8)
+def get_plan_index(full_content: str) -> PlanIndex:
+    """获取计划表的索引，同一版本的计划表只建立一次索引
+
+    Args:
+        full_content: 完整的计划表内容
+
+    Returns:
+        PlanIndex: 计划表索引
+    """
+    return PlanIndex(full_content)
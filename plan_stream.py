@@ -0,0 +1,129 @@
+import codecs
+import mmap
+import os
+import re
+from config import CONFIG
+from plan_fetcher import get_plan_fetcher
+
+# 日期块的开始标签
+OPEN_TAG_PATTERN = re.compile(r"<(\d{4}-\d{2}-\d{2})>")
+
+# 结束标签</YYYY-MM-DD>的长度，用于保留可能被分块截断的标签
+MAX_TAG_LENGTH = len("</0000-00-00>")
+
+# 默认分块大小(字节)
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_plan_blocks(chunks):
+    """从文本分块中逐个解析日期块
+
+    只缓存当前正在解析的日期块，内存占用与整个计划表的大小无关。
+    未闭合的日期块延续到输入末尾。
+
+    Args:
+        chunks: 可迭代的文本分块
+
+    Yields:
+        tuple: (日期字符串, 去除首尾空白的正文)，按文档顺序产生
+    """
+    buffer = ""
+    position = 0  # buffer中尚未处理部分的起始位置
+    current = None  # 当前日期块的日期
+    end_tag = None
+    search_from = 0
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        # 丢弃已处理的部分，每个分块只拼接一次
+        buffer = buffer[position:] + chunk
+        search_from = max(0, search_from - position)
+        position = 0
+
+        while True:
+            if current is None:
+                match = OPEN_TAG_PATTERN.search(buffer, position)
+                if match is None:
+                    # 只保留末尾可能是半个标签的部分
+                    position = max(position, len(buffer) - MAX_TAG_LENGTH + 1)
+                    break
+                current = match.group(1)
+                end_tag = f"</{current}>"
+                position = search_from = match.end()
+
+            end = buffer.find(end_tag, search_from)
+            if end == -1:
+                # 下次从可能被截断的结束标签处继续查找
+                search_from = max(position, len(buffer) - len(end_tag) + 1)
+                break
+
+            yield current, buffer[position:end].strip()
+            position = end + len(end_tag)
+            current = None
+
+    if current is not None:
+        yield current, buffer[position:].strip()
+
+
+def iter_plan_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """通过内存映射逐块解析本地计划文件
+
+    Args:
+        path: 计划文件路径
+        chunk_size: 每次解码的字节数
+
+    Yields:
+        tuple: (日期字符串, 正文)
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # 增量解码器处理跨分块的多字节字符，utf-8-sig会去掉BOM
+            decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+            def chunks():
+                for offset in range(0, len(mapped), chunk_size):
+                    yield decoder.decode(mapped[offset : offset + chunk_size])
+                yield decoder.decode(b"", final=True)
+
+            yield from iter_plan_blocks(chunks())
+
+
+def iter_plan_response(response, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """逐块解析HTTP响应中的计划表
+
+    响应需要以stream=True方式请求，正文不会被一次性读入内存。
+
+    Args:
+        response: requests的响应对象
+        chunk_size: 每次读取的字节数
+
+    Yields:
+        tuple: (日期字符串, 正文)
+    """
+    # 未声明编码时iter_content会返回字节，按UTF-8解码
+    if "charset" not in response.headers.get("Content-Type", ""):
+        response.encoding = "utf-8"
+    yield from iter_plan_blocks(
+        response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+    )
+
+
+def stream_plan(url: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """以流式方式下载并解析计划表
+
+    Args:
+        url: 学习计划文件地址，为None时使用CONFIG中的PLAN_URL
+        chunk_size: 每次读取的字节数
+
+    Yields:
+        tuple: (日期字符串, 正文)
+    """
+    fetcher = get_plan_fetcher()
+    url = url or CONFIG["PLAN_URL"]
+    with fetcher.session.get(url, stream=True, timeout=fetcher.timeout) as response:
+        response.raise_for_status()
+        yield from iter_plan_response(response, chunk_size)
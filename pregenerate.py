@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from config import CONFIG, load_config
+from logger import setup_logger
+from scraper import (
+    get_beijing_date,
+    get_plan_changes,
+    load_plan_index,
+    mark_plan_processed,
+    wrap_content_for_date,
+)
+from summary_cache import SummaryCache
+from prompt_builder import PromptBuilder
+from gemini_processor import (
+    PROMPT_TEMPLATE,
+    get_gemini_client,
+    model_chain_key,
+    PartialSummary,
+    process_days_with_gemini,
+    process_with_gemini,
+)
+from metrics import incr, record_run
+
+
+class ArtifactStore:
+    """预生成的日报总结
+
+    按(计划来源, 日报日期)保存提前生成的总结，并记录生成时当天内容的指纹。
+    发送时内容指纹一致则直接使用，计划表中当天的内容被修改过则视为失效。
+    总结与收件人无关，同一计划来源的多个用户共用一份，发送时再按各自的签名渲染；
+    生成参数或模型链不同的用户无法共用，指纹不一致时会重新生成。
+    """
+
+    def __init__(self, path: str = None):
+        """初始化ArtifactStore
+
+        Args:
+            path: 数据库路径，为None时使用CONFIG中的PREGEN_FILE
+        """
+        self.path = path or CONFIG["PREGEN_FILE"]
+        self._lock = threading.Lock()
+
+        # 确保目录存在
+        store_dir = os.path.dirname(self.path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                source TEXT NOT NULL,
+                report_date TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (source, report_date)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def fingerprint(content: str, profile: dict = None) -> str:
+        """计算当天内容的指纹，提示词模板、模型链或生成参数变化时指纹同样变化
+
+        Args:
+            content: 用正文标签包装的当天学习内容
+            profile: 用户配置，其中的生成参数和模型链覆盖CONFIG
+
+        Returns:
+            str: SHA-256十六进制摘要
+        """
+        options = PromptBuilder(profile).settings.key()
+        return SummaryCache.make_key(PROMPT_TEMPLATE, model_chain_key(profile), content, options)
+
+    def get(self, source: str, report_date: str):
+        """读取预生成的总结
+
+        Args:
+            source: 计划来源地址
+            report_date: 日报日期
+
+        Returns:
+            dict: 包含指纹、总结和生成时间，不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, summary, created_at FROM artifacts "
+                "WHERE source = ? AND report_date = ?",
+                (source, report_date),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"fingerprint": row[0], "summary": row[1], "created_at": row[2]}
+
+    def put(self, source: str, report_date: str, fingerprint: str, summary: str):
+        """保存预生成的总结，覆盖同一日期的旧版本
+
+        Args:
+            source: 计划来源地址
+            report_date: 日报日期
+            fingerprint: 生成时当天内容的指纹
+            summary: 格式化后的学习总结
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts "
+                "(source, report_date, fingerprint, summary, created_at) VALUES (?, ?, ?, ?, ?)",
+                (source, report_date, fingerprint, summary, time.time()),
+            )
+            self._conn.commit()
+
+    def lookup(self, source: str, report_date: str, content: str, profile: dict = None):
+        """获取与当天内容和生成参数一致的预生成总结
+
+        Args:
+            source: 计划来源地址
+            report_date: 日报日期
+            content: 发送时获取到的当天学习内容
+            profile: 用户配置，其中的生成参数覆盖CONFIG
+
+        Returns:
+            str: 预生成的总结，不存在或内容已变化时返回None
+        """
+        artifact = self.get(source, report_date)
+        if artifact is None:
+            return None
+        if artifact["fingerprint"] != self.fingerprint(content, profile):
+            logging.info(f"{report_date}的计划内容在预生成后有变化，需要重新生成")
+            incr("pregen_invalidated")
+            return None
+        return artifact["summary"]
+
+    def invalidate(self, source: str, dates: list[str]) -> int:
+        """删除指定日期的总结
+
+        Args:
+            source: 计划来源地址
+            dates: 日期列表
+
+        Returns:
+            int: 删除的条数
+        """
+        with self._lock:
+            cursor = self._conn.executemany(
+                "DELETE FROM artifacts WHERE source = ? AND report_date = ?",
+                [(source, report_date) for report_date in dates],
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def prune(self, before: str) -> int:
+        """删除早于指定日期的总结
+
+        Args:
+            before: 日期，格式为YYYY-MM-DD
+
+        Returns:
+            int: 删除的条数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM artifacts WHERE report_date < ?", (before,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """获取进程内共享的预生成总结，首次调用时创建"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+def summarize_for_date(
+    content: str, report_date: str, url: str = None, profile: dict = None
+) -> str:
+    """获取某一天的学习总结，优先使用预生成的结果
+
+    没有预生成或内容已变化时调用Gemini重新生成，并更新预生成的结果。
+
+    Args:
+        content: 用正文标签包装的当天学习内容
+        report_date: 日报日期
+        url: 计划来源地址，为None时使用CONFIG中的PLAN_URL
+        profile: 用户配置，其中的生成参数覆盖CONFIG
+
+    Returns:
+        str: 格式化的学习总结
+    """
+    url = url or CONFIG["PLAN_URL"]
+    store = get_artifact_store()
+    summary = store.lookup(url, report_date, content, profile)
+    if summary is not None:
+        logging.info(f"使用预生成的{report_date}日报总结")
+        incr("pregen_hits")
+        return summary
+
+    summary = process_with_gemini(content, profile=profile)
+    if not isinstance(summary, PartialSummary):
+        store.put(url, report_date, store.fingerprint(content, profile), summary)
+    return summary
+
+
+def pregenerate(dates: list[str], url: str = None, force: bool = False) -> list[dict]:
+    """提前获取计划表并生成指定日期的总结
+
+    计划表中被修改或删除的日期先清除已有结果；已有预生成结果且内容未变化的日期跳过，
+    其余日期合并为尽量少的Gemini请求。
+
+    Args:
+        dates: 日报日期列表
+        url: 计划来源地址，为None时使用CONFIG中的PLAN_URL
+        force: 是否忽略已有结果重新生成
+
+    Returns:
+        list: 每个日期的结果，包含日期和状态(fresh/generated/partial/error)及错误信息
+    """
+    url = url or CONFIG["PLAN_URL"]
+    store = get_artifact_store()
+
+    # 计划表只获取一次，各日期的内容与发送时使用相同的方式提取，保证指纹一致
+    index = load_plan_index(url)
+    full_content = index.full_content
+    if not full_content or full_content.isspace():
+        raise ValueError("获取的内容为空")
+
+    # 只有内容变化的日期需要重新生成，被删除的日期不再保留旧的总结。
+    # 变化相对于上次预生成时的计划表，清除完成后才推进基准
+    changes = get_plan_changes("pregenerate", index, url)
+    stale = store.invalidate(url, changes.changed + changes.removed)
+    if stale:
+        logging.info(f"计划表{changes.describe()}，已清除{stale}条失效的预生成结果")
+    mark_plan_processed("pregenerate", index, url)
+
+    results = {}
+    pending = {}
+    for report_date in dates:
+        content = wrap_content_for_date(full_content, report_date)
+        if not force and store.lookup(url, report_date, content) is not None:
+            results[report_date] = {"date": report_date, "status": "fresh", "error": None}
+        else:
+            pending[report_date] = content
+
+    if pending:
+        try:
+            summaries = process_days_with_gemini(pending)
+        except Exception as e:
+            logging.error(f"预生成失败: {str(e)}")
+            summaries = {}
+            for report_date in pending:
+                results[report_date] = {"date": report_date, "status": "error", "error": str(e)}
+        for report_date, summary in summaries.items():
+            # 流式生成超过截止时间得到的部分总结不能作为预生成结果
+            if isinstance(summary, PartialSummary):
+                results[report_date] = {
+                    "date": report_date,
+                    "status": "partial",
+                    "error": "流式生成超过截止时间，只得到部分总结",
+                }
+                continue
+            store.put(url, report_date, store.fingerprint(pending[report_date]), summary)
+            results[report_date] = {"date": report_date, "status": "generated", "error": None}
+
+    return [results[report_date] for report_date in dates]
+
+
+def _plan_urls(roster_path: str = None) -> list[str]:
+    """需要预生成的计划来源，名单文件存在时包含名单中所有用户的计划来源"""
+    roster_path = roster_path or CONFIG["ROSTER_FILE"]
+    if os.path.exists(roster_path):
+        # 只在有名单文件时导入批量运行模块
+        from batch_runner import load_roster
+
+        return sorted({profile["PLAN_URL"] for profile in load_roster(roster_path)})
+    return [CONFIG["PLAN_URL"]]
+
+
+def main():
+    """预生成入口"""
+    # 本模块也被发送流程导入，命令行解析只在作为入口运行时才需要
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="提前生成日报总结，发送时只需渲染和发送邮件"
+    )
+    parser.add_argument(
+        "--date", default=None, help="起始日期(YYYY-MM-DD)，默认为当前北京时间的日期"
+    )
+    parser.add_argument(
+        "--days", type=int, default=None, help="从起始日期开始预生成的天数，默认使用PREGEN_DAYS"
+    )
+    parser.add_argument("--roster", default=None, help="用户名单JSON文件")
+    parser.add_argument("--force", action="store_true", help="忽略已有结果重新生成")
+    args = parser.parse_args()
+
+    load_config()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    setup_logger(os.path.join(script_dir, "pregenerate.log"), console_level=logging.INFO)
+
+    start = date.fromisoformat(args.date or get_beijing_date())
+    days = args.days or CONFIG["PREGEN_DAYS"]
+    dates = [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+
+    failed = 0
+    with record_run("pregenerate", start=dates[0], days=days) as run:
+        for url in _plan_urls(args.roster):
+            for result in pregenerate(dates, url, force=args.force):
+                error = f" {result['error']}" if result["error"] else ""
+                logging.info(f"{url} {result['date']} [{result['status']}]{error}")
+                failed += result["status"] in ("error", "partial")
+        # 清理已经过去的日期
+        pruned = get_artifact_store().prune((start - timedelta(days=7)).isoformat())
+        if pruned:
+            logging.info(f"已清理{pruned}条过期的预生成结果")
+        logging.info(f"Gemini请求统计: {get_gemini_client().metrics()}")
+        if failed:
+            run.mark_failed(f"{failed}天预生成失败")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
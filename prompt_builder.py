@@ -0,0 +1,238 @@
+import logging
+import re
+from typing import NamedTuple
+from config import CONFIG
+from metrics import incr
+
+# 学习总结提示词模板
+PROMPT_TEMPLATE = """
+    请根据以下内容，总结今天的学习要点，要求：
+    1. 内容要详细具体,对各个要点的可能内容进行猜测
+    2. 用1、2、3...的形式列出
+    3. 每个要点后面加上<br><br>标签换行
+    4. 每个点的要简洁一些,以正式邮件的格式列出
+    5. 不要出现"待补充"、"后续内容"等不确定的表述
+    6. 绝对不要出现诸如"好的，根据您提供的内容，今天的学习要点总结如下"这样的表述
+    7. 不要出现"可能"、"推测"之类的词语
+    8. 总结全文控制在{max_chars}字以内
+
+    原始内容：
+    {content}
+    """
+
+# 多天合并总结提示词模板
+BATCH_PROMPT_TEMPLATE = """
+    下面是多天的学习内容，每天的内容放在<YYYY-MM-DD>和</YYYY-MM-DD>标签之间。
+    请分别总结每一天的学习要点，每一天的要求如下：
+    1. 内容要详细具体,对各个要点的可能内容进行猜测
+    2. 用1、2、3...的形式列出
+    3. 每个要点后面加上<br><br>标签换行
+    4. 每个点的要简洁一些,以正式邮件的格式列出
+    5. 不要出现"待补充"、"后续内容"等不确定的表述
+    6. 绝对不要出现诸如"好的，根据您提供的内容，今天的学习要点总结如下"这样的表述
+    7. 不要出现"可能"、"推测"之类的词语
+    8. 每一天的总结控制在{max_chars}字以内
+
+    输出格式要求：每一天的总结必须以<<<DAY YYYY-MM-DD>>>开头、以<<<END YYYY-MM-DD>>>结尾，
+    按输入顺序依次输出，分隔标签之外不要输出任何其他内容。
+
+    原始内容：
+    {entries}
+    """
+
+# 多天合并请求中每一天额外占用的输出token(日期分隔标签)
+BATCH_DAY_OUTPUT_OVERHEAD = 32
+
+# 行内连续的空白字符
+_SPACES_PATTERN = re.compile(r"[ \t\u3000]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数
+
+    中日韩字符大约每个字符一个token，其他字符大约每4个字符一个token。
+    """
+    cjk = sum(
+        1 for char in text if "\u2e80" <= char <= "\u9fff" or "\uff00" <= char <= "\uffef"
+    )
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def compact_content(body: str) -> str:
+    """压缩学习内容中不影响含义的部分
+
+    合并行内连续空白，去掉空行和重复出现的行。
+
+    Args:
+        body: 不带<正文>标签的学习内容
+
+    Returns:
+        str: 压缩后的内容
+    """
+    seen = set()
+    lines = []
+    for line in body.splitlines():
+        line = _SPACES_PATTERN.sub(" ", line).strip()
+        if line and line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def trim_content(body: str, max_tokens: int) -> str:
+    """将学习内容裁剪到token预算以内
+
+    先压缩内容，仍然超出预算时按行保留开头的内容，单独一行超出预算时截断该行。
+
+    Args:
+        body: 不带<正文>标签的学习内容
+        max_tokens: 内容的token上限
+
+    Returns:
+        str: 裁剪后的内容
+    """
+    body = compact_content(body)
+    if estimate_tokens(body) <= max_tokens:
+        return body
+
+    kept = []
+    used = 0
+    for line in body.splitlines():
+        cost = estimate_tokens(line) + 1  # 换行符
+        if used + cost > max_tokens:
+            if not kept:
+                # 单独一行就超出预算时按估算比例截断该行
+                while estimate_tokens(line) > max_tokens:
+                    line = line[: len(line) * max_tokens // estimate_tokens(line)]
+                kept.append(line)
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+class PromptSettings(NamedTuple):
+    """一个用户的提示词和生成参数"""
+
+    max_input_tokens: int  # 学习内容的token上限，超出时裁剪
+    max_output_tokens: int  # 模型输出的token上限
+    temperature: float
+
+    @property
+    def max_chars(self) -> int:
+        """提示词中要求的总结字数上限，为输出token上限留出格式标签的余量"""
+        return max(50, self.max_output_tokens * 3 // 4)
+
+    def generation_config(self, days: int = 1) -> dict:
+        """Gemini SDK的生成参数
+
+        Args:
+            days: 一次请求总结的天数，多天合并请求按天数放大输出上限
+
+        Returns:
+            dict: 可直接传给generate_content的generation_config
+        """
+        max_output_tokens = self.max_output_tokens
+        if days > 1:
+            max_output_tokens = (self.max_output_tokens + BATCH_DAY_OUTPUT_OVERHEAD) * days
+        return {"max_output_tokens": max_output_tokens, "temperature": self.temperature}
+
+    def key(self) -> str:
+        """参与缓存键计算的参数，参数不同的总结不能互相复用"""
+        return f"in={self.max_input_tokens};out={self.max_output_tokens};t={self.temperature}"
+
+
+class BuiltPrompt(NamedTuple):
+    """构建好的提示词"""
+
+    text: str  # 完整提示词
+    input_tokens: int  # 估算的提示词token数
+    trimmed: bool  # 学习内容是否因超出预算被裁剪
+    generation_config: dict  # 传给模型的生成参数
+
+
+class PromptBuilder:
+    """按用户配置构建有长度上限的提示词
+
+    学习内容超出GEMINI_INPUT_TOKEN_BUDGET时先压缩空白和重复行，仍然超出时按行裁剪；
+    提示词中写明字数要求，并通过GEMINI_MAX_OUTPUT_TOKENS和GEMINI_TEMPERATURE
+    限制模型输出，让延迟和费用不再随计划内容无限增长。
+    """
+
+    def __init__(self, profile: dict = None):
+        """初始化PromptBuilder
+
+        Args:
+            profile: 用户配置，覆盖CONFIG中的同名配置项
+        """
+        config = {**CONFIG, **(profile or {})}
+        # 名单文件中的值可能是字符串
+        self.settings = PromptSettings(
+            max_input_tokens=int(config["GEMINI_INPUT_TOKEN_BUDGET"]),
+            max_output_tokens=int(config["GEMINI_MAX_OUTPUT_TOKENS"]),
+            temperature=float(config["GEMINI_TEMPERATURE"]),
+        )
+
+    def prepare(self, body: str) -> tuple[str, bool]:
+        """将超出预算的一天学习内容压缩，仍然超出时再裁剪
+
+        Args:
+            body: 不带<正文>标签的学习内容
+
+        Returns:
+            tuple: (处理后的内容, 是否被裁剪)
+        """
+        # 预算以内的内容原样使用，重复的行也可能是有意义的内容
+        if estimate_tokens(body) <= self.settings.max_input_tokens:
+            return body, False
+
+        # 超出预算时先压缩空白和重复行，压缩后已在预算以内时不算裁剪
+        compacted = compact_content(body)
+        compacted_tokens = estimate_tokens(compacted)
+        if compacted_tokens <= self.settings.max_input_tokens:
+            return compacted, False
+
+        prepared = trim_content(compacted, self.settings.max_input_tokens)
+        logging.warning(
+            f"学习内容压缩后约{compacted_tokens} tokens，超过上限{self.settings.max_input_tokens}，"
+            f"已裁剪为约{estimate_tokens(prepared)} tokens"
+        )
+        incr("prompt_trimmed")
+        return prepared, True
+
+    def build(self, content: str) -> BuiltPrompt:
+        """构建单天总结的提示词
+
+        Args:
+            content: 学习内容，可以带<正文>标签
+
+        Returns:
+            BuiltPrompt: 提示词、估算的token数和生成参数
+        """
+        body = content
+        if "<正文>" in content and "</正文>" in content:
+            body = content.split("<正文>")[1].split("</正文>")[0]
+        prepared, trimmed = self.prepare(body)
+        # 预算以内的内容原样放入提示词
+        if prepared is not body:
+            content = f"<正文>\n{prepared}\n</正文>"
+        text = PROMPT_TEMPLATE.format(content=content, max_chars=self.settings.max_chars)
+        return self._built(text, trimmed, days=1)
+
+    def build_batch(self, days: dict[str, str]) -> BuiltPrompt:
+        """构建多天合并总结的提示词
+
+        Args:
+            days: 日期到学习内容的映射，学习内容应已经过prepare处理
+
+        Returns:
+            BuiltPrompt: 提示词、估算的token数和按天数放大的生成参数
+        """
+        entries = "\n\n".join(f"<{date}>\n{body}\n</{date}>" for date, body in days.items())
+        text = BATCH_PROMPT_TEMPLATE.format(entries=entries, max_chars=self.settings.max_chars)
+        return self._built(text, False, days=len(days))
+
+    def _built(self, text: str, trimmed: bool, days: int) -> BuiltPrompt:
+        input_tokens = estimate_tokens(text)
+        incr("prompt_tokens_estimated", input_tokens)
+        return BuiltPrompt(text, input_tokens, trimmed, self.settings.generation_config(days))
@@ -1,143 +1,392 @@
-import requests
-import logging
-import os
-import re
-from datetime import datetime, timedelta, timezone
-
-os.environ["GRPC_ENABLE_FORK_SUPPORT"] = "0"  # 禁用gRPC的fork支持
-
-# 配置基本的日志
-logging.basicConfig(level=logging.INFO)
-
-
-def get_notion_content() -> str:
-    try:
-        # 使用GitHub raw文件链接
-        url = "https://raw.githubusercontent.com/zhaojinyang117/auto_daily_report/refs/heads/main/study_today.txt"
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/plain",
-        }
-
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # 获取内容
-        full_content = response.text.strip()
-
-        if not full_content:
-            raise ValueError("获取的内容为空")
-
-        # 获取当前北京时间（UTC+8）
-        utc_now = datetime.now(timezone.utc)
-        beijing_now = utc_now + timedelta(hours=8)
-        today = beijing_now.strftime("%Y-%m-%d")
-
-        logging.info(f"当前北京时间: {beijing_now}, 日期: {today}")
-
-        # 提取当天的内容
-        content = extract_content_for_date(full_content, today)
-
-        # 始终添加正文标签包装内容
-        content = f"<正文>\n{content}\n</正文>"
-
-        logging.info("\n获取到的内容: %s", content[:200])
-        return content
-
-    except requests.RequestException as e:
-        raise Exception(f"获取GitHub内容失败: {str(e)}")
-    except Exception as e:
-        raise Exception(f"处理内容失败: {str(e)}")
-
-
-def extract_content_for_date(full_content: str, date: str) -> str:
-    """
-    从月度计划表中提取特定日期的内容，如果找不到当前日期，则使用最近的日期内容
-
-    Args:
-        full_content: 完整的月度计划表内容
-        date: 日期字符串，格式为YYYY-MM-DD
-
-    Returns:
-        str: 对应日期的内容或最近日期的内容
-    """
-    try:
-        # 寻找日期标记
-        start_tag = f"<{date}>"
-        end_tag = f"</{date}>"
-
-        # 提取对应日期的内容
-        start_index = full_content.find(start_tag)
-
-        # 如果找到当前日期的内容，直接返回
-        if start_index != -1:
-            start_index += len(start_tag)
-            end_index = full_content.find(end_tag, start_index)
-
-            if end_index == -1:
-                end_index = len(full_content)
-
-            return full_content[start_index:end_index].strip()
-
-        # 如果找不到当前日期的内容，寻找最近的日期
-        logging.warning(f"找不到日期 {date} 的内容，将查找最近的日期内容")
-
-        # 使用正则表达式找出所有日期标签
-        date_pattern = r"<(\d{4}-\d{2}-\d{2})>"
-        all_dates = re.findall(date_pattern, full_content)
-
-        if not all_dates:
-            logging.warning("未找到任何日期标签，将使用默认内容")
-            return "未找到任何日期内容，请检查月度计划表格式"
-
-        # 将日期字符串转换为datetime对象进行比较
-        target_date = datetime.strptime(date, "%Y-%m-%d")
-        closest_date = None
-        min_diff = float("inf")
-
-        for d in all_dates:
-            current_date = datetime.strptime(d, "%Y-%m-%d")
-            diff = abs((target_date - current_date).days)
-
-            if diff < min_diff:
-                min_diff = diff
-                closest_date = d
-
-        logging.info(f"找到最近的日期: {closest_date}，相差{min_diff}天")
-
-        # 使用最近的日期内容
-        closest_start_tag = f"<{closest_date}>"
-        closest_end_tag = f"</{closest_date}>"
-
-        closest_start_index = full_content.find(closest_start_tag)
-        closest_start_index += len(closest_start_tag)
-        closest_end_index = full_content.find(closest_end_tag, closest_start_index)
-
-        if closest_end_index == -1:
-            closest_end_index = len(full_content)
-
-        content = full_content[closest_start_index:closest_end_index].strip()
-        return f"[使用{closest_date}的内容] {content}"
-
-    except Exception as e:
-        logging.error(f"提取日期内容时出错: {str(e)}")
-        return "提取日期内容时出错"
-
-
-# 添加Scraper类
-class Scraper:
-    """内容获取器类，用于从各种来源获取内容"""
-
-    def __init__(self):
-        """初始化Scraper"""
-        logging.info("初始化内容获取器")
-
-    def get_content(self) -> str:
-        """获取内容
-
-        Returns:
-            str: 获取到的内容
-        """
-        logging.info("开始获取内容...")
-        return get_notion_content()
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+from config import CONFIG
+from metrics import incr, stage
+from plan_fetcher import fetch_budget, get_plan_fetcher
+from plan_index import get_plan_index
+from plan_changes import get_fingerprint_store
+
+os.environ["GRPC_ENABLE_FORK_SUPPORT"] = "0"  # 禁用gRPC的fork支持
+
+# 配置基本的日志
+logging.basicConfig(level=logging.INFO)
+
+
+def get_beijing_date() -> str:
+    """获取当前北京时间（UTC+8）的日期
+
+    Returns:
+        str: 日期字符串，格式为YYYY-MM-DD
+    """
+    utc_now = datetime.now(timezone.utc)
+    beijing_now = utc_now + timedelta(hours=8)
+    today = beijing_now.strftime("%Y-%m-%d")
+
+    logging.info(f"当前北京时间: {beijing_now}, 日期: {today}")
+    return today
+
+
+def get_notion_content(url: str = None, report_date: str = None) -> str:
+    """获取当天的学习内容
+
+    Args:
+        url: 学习计划来源，为None时使用CONFIG中的PLAN_URL，多个来源用逗号分隔
+        report_date: 日报日期，格式为YYYY-MM-DD，为None时使用当前北京时间的日期
+
+    Returns:
+        str: 用正文标签包装的当天学习内容
+    """
+    try:
+        url = url or CONFIG["PLAN_URL"]
+
+        # 并发获取各个来源并按日期合并（条件请求，未变化或网络异常时使用本地镜像）
+        with stage("fetch"):
+            full_content = get_scraper().fetch(url)
+
+        # 日期块按偏移切片并各自去除空白，无需复制整个文档
+        if not full_content or full_content.isspace():
+            raise ValueError("获取的内容为空")
+
+        # 获取当前北京时间（UTC+8）的日期
+        today = report_date or get_beijing_date()
+
+        # 提取当天的内容
+        with stage("extract"):
+            content = wrap_content_for_date(full_content, today)
+
+        logging.info("\n获取到的内容: %s", content[:200])
+        return content
+
+    except Exception as e:
+        # requests按需导入，这里导入不会产生额外开销
+        import requests
+
+        if isinstance(e, requests.RequestException):
+            raise Exception(f"获取GitHub内容失败: {str(e)}")
+        raise Exception(f"处理内容失败: {str(e)}")
+
+
+def load_plan_index(url: str = None):
+    """获取计划表并返回其日期索引
+
+    Args:
+        url: 学习计划来源，为None时使用CONFIG中的PLAN_URL，多个来源用逗号分隔
+
+    Returns:
+        PlanIndex: 计划表索引，可按单日、区间或最近日期查询
+    """
+    return get_plan_index(get_scraper().fetch(url or CONFIG["PLAN_URL"]))
+
+
+def get_plan_changes(consumer: str, index=None, url: str = None):
+    """获取计划表与使用方上次处理时相比按日期的变化
+
+    只比较不记录，使用方处理完变化后需调用mark_plan_processed推进基准；
+    其他流程获取同一计划表不影响这里的结果。
+
+    Args:
+        consumer: 使用方名称，例如pregenerate
+        index: 本次获取的计划表索引，为None时重新获取
+        url: 学习计划来源，为None时使用CONFIG中的PLAN_URL
+
+    Returns:
+        PlanChanges: 新增、修改和删除的日期
+    """
+    url = url or CONFIG["PLAN_URL"]
+    index = index or load_plan_index(url)
+    changes = get_fingerprint_store().diff(url, index.fingerprints(), consumer)
+    if changes:
+        logging.info(f"计划表有变化: {changes.describe()}")
+        logging.debug(f"新增或修改的日期: {changes.modified}，删除的日期: {changes.removed}")
+        incr("plan_days_changed", len(changes.modified))
+    return changes
+
+
+def mark_plan_processed(consumer: str, index, url: str = None):
+    """使用方已经处理完本次的变化，之后的变化以这次获取的计划表为基准
+
+    Args:
+        consumer: 使用方名称
+        index: 已处理的计划表索引
+        url: 学习计划来源，为None时使用CONFIG中的PLAN_URL
+    """
+    get_fingerprint_store().advance(url or CONFIG["PLAN_URL"], index.fingerprints(), consumer)
+
+
+def wrap_content_for_date(full_content: str, date: str) -> str:
+    """提取特定日期的内容并添加正文标签
+
+    Args:
+        full_content: 完整的月度计划表内容
+        date: 日期字符串，格式为YYYY-MM-DD
+
+    Returns:
+        str: 用正文标签包装的学习内容
+    """
+    # 始终添加正文标签包装内容
+    return f"<正文>\n{extract_content_for_date(full_content, date)}\n</正文>"
+
+
+def extract_content_for_date(full_content: str, date: str) -> str:
+    """
+    从月度计划表中提取特定日期的内容，如果找不到当前日期，则使用最近的日期内容
+
+    Args:
+        full_content: 完整的月度计划表内容
+        date: 日期字符串，格式为YYYY-MM-DD
+
+    Returns:
+        str: 对应日期的内容或最近日期的内容
+    """
+    try:
+        # 使用计划表索引查找，同一版本的计划表只解析一次
+        index = get_plan_index(full_content)
+
+        # 如果找到当前日期的内容，直接返回
+        content = index.get(date)
+        if content is not None:
+            return content
+
+        # 如果找不到当前日期的内容，寻找最近的日期
+        logging.warning(f"找不到日期 {date} 的内容，将查找最近的日期内容")
+
+        closest_date, min_diff = index.nearest(date)
+
+        if closest_date is None:
+            logging.warning("未找到任何日期标签，将使用默认内容")
+            return "未找到任何日期内容，请检查月度计划表格式"
+
+        logging.info(f"找到最近的日期: {closest_date}，相差{min_diff}天")
+
+        # 使用最近的日期内容
+        content = index.get(closest_date)
+        return f"[使用{closest_date}的内容] {content}"
+
+    except Exception as e:
+        logging.error(f"提取日期内容时出错: {str(e)}")
+        return "提取日期内容时出错"
+
+
+def split_sources(url: str) -> list[str]:
+    """拆分逗号分隔的多个计划来源"""
+    return [source.strip() for source in url.split(",") if source.strip()]
+
+
+def merge_plans(contents: list[str]) -> str:
+    """将多个计划表按日期合并为一个计划表
+
+    同一日期在多个来源中都有内容时，按来源顺序拼接。
+
+    Args:
+        contents: 各来源的完整计划表内容
+
+    Returns:
+        str: 合并后的计划表，只有一个来源时原样返回
+    """
+    if len(contents) == 1:
+        return contents[0]
+
+    indexes = [get_plan_index(content) for content in contents]
+    dates = sorted(set().union(*(index.dates for index in indexes)))
+    days = []
+    for date in dates:
+        blocks = [block for block in (index.get(date) for index in indexes) if block]
+        body = "\n\n".join(blocks)
+        days.append(f"<{date}>\n{body}\n</{date}>")
+    return "\n".join(days)
+
+
+class FileProvider:
+    """从本地文件读取计划表，支持普通路径和file://地址"""
+
+    def fetch(self, source: str) -> str:
+        path = source[len("file://"):] if source.startswith("file://") else source
+        with open(os.path.expanduser(path), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def fallback(self, source: str):
+        return None
+
+
+class HttpProvider:
+    """通过共享的计划文件获取器获取HTTP(S)计划表，超时时使用本地镜像"""
+
+    def fetch(self, source: str) -> str:
+        return get_plan_fetcher().fetch(source)
+
+    def fallback(self, source: str):
+        # 通过set_plan_fetcher替换的获取器可能没有本地镜像
+        cached = getattr(get_plan_fetcher(), "cached", None)
+        return cached(source) if cached else None
+
+
+class Scraper:
+    """内容获取器类，用于从各种来源获取内容
+
+    按来源地址的协议选择获取方式(provider)，可以通过register注册新的协议。
+    一个用户的多个来源在共享线程池中并发获取，每个来源有独立的截止时间，
+    超时的来源改用本地镜像或直接跳过，不会拖慢其他来源。只有一个来源时直接获取，
+    不设截止时间，由获取器自身的超时和重试决定耗时。
+    """
+
+    # 协议 -> 获取方式，获取方式需提供fetch(source)和fallback(source)方法
+    providers = {}
+
+    @classmethod
+    def register(cls, scheme: str, provider):
+        """注册一种来源协议的获取方式
+
+        Args:
+            scheme: 协议名称，例如https、file
+            provider: 获取方式，fetch(source)返回完整计划表，
+                fallback(source)返回超时时使用的内容，没有时返回None
+        """
+        cls.providers[scheme.lower()] = provider
+
+    def __init__(self, deadline: float = None, workers: int = None):
+        """初始化Scraper
+
+        Args:
+            deadline: 多个来源时每个来源的截止时间(秒)，为None时使用CONFIG中的PLAN_SOURCE_DEADLINE，
+                两者都未设置时按计划文件获取器的超时和重试次数计算
+            workers: 并发获取的线程数，为None时使用CONFIG中的PLAN_FETCH_WORKERS
+        """
+        logging.info("初始化内容获取器")
+        budget = fetch_budget()
+        self.deadline = deadline or CONFIG["PLAN_SOURCE_DEADLINE"] or budget
+        if self.deadline < budget:
+            logging.warning(
+                f"计划来源截止时间{self.deadline}秒短于获取器的超时和重试预算{budget}秒，"
+                "较慢的来源可能在获取器放弃前就被判为超时"
+            )
+        self.workers = workers or CONFIG["PLAN_FETCH_WORKERS"]
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def provider_for(self, source: str):
+        """根据来源地址选择获取方式，没有协议或是Windows盘符时视为本地文件"""
+        scheme = urlsplit(source).scheme.lower()
+        if len(scheme) <= 1:
+            scheme = "file"
+        provider = self.providers.get(scheme)
+        if provider is None:
+            raise ValueError(f"不支持的计划来源: {source}")
+        return provider
+
+    def _get_executor(self):
+        """共享线程池，首次并发获取时创建"""
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="plan-fetch"
+                )
+            return self._executor
+
+    def fetch_all(self, sources: list[str]) -> list[str]:
+        """并发获取多个来源
+
+        Args:
+            sources: 来源地址列表
+
+        Returns:
+            list: 按来源顺序排列的计划表内容，失败且没有本地镜像的来源不包含在内
+
+        Raises:
+            Exception: 所有来源都获取失败
+        """
+        if len(sources) == 1:
+            return [self._fetch_one(sources[0])]
+
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+
+        executor = self._get_executor()
+        started = time.monotonic()
+        futures = []
+        for source in sources:
+            provider = self.provider_for(source)
+            futures.append((source, provider, executor.submit(provider.fetch, source)))
+
+        contents = []
+        first_error = None
+        for source, provider, future in futures:
+            # 各来源同时开始获取，截止时间都从提交时算起
+            remaining = max(0.0, started + self.deadline - time.monotonic())
+            try:
+                contents.append(future.result(timeout=remaining))
+                continue
+            except FutureTimeoutError:
+                error = TimeoutError(f"超过{self.deadline}秒未完成")
+                incr("plan_source_timeouts")
+            except Exception as e:
+                error = e
+            first_error = first_error or error
+
+            content = provider.fallback(source)
+            if content is not None:
+                logging.warning(f"获取计划来源失败，使用本地镜像({source}): {str(error)}")
+                contents.append(content)
+            else:
+                logging.warning(f"获取计划来源失败，跳过({source}): {str(error)}")
+
+        if not contents:
+            raise first_error
+        return contents
+
+    def _fetch_one(self, source: str) -> str:
+        """在当前线程获取单个来源，失败时使用本地镜像"""
+        provider = self.provider_for(source)
+        try:
+            return provider.fetch(source)
+        except Exception as e:
+            content = provider.fallback(source)
+            if content is None:
+                raise
+            logging.warning(f"获取计划来源失败，使用本地镜像({source}): {str(e)}")
+            return content
+
+    def fetch(self, url: str = None) -> str:
+        """获取计划表，多个来源按日期合并
+
+        Args:
+            url: 学习计划来源，为None时使用CONFIG中的PLAN_URL，多个来源用逗号分隔
+
+        Returns:
+            str: 合并后的完整计划表
+        """
+        return merge_plans(self.fetch_all(split_sources(url or CONFIG["PLAN_URL"])))
+
+    def get_content(self, url: str = None, report_date: str = None) -> str:
+        """获取内容
+
+        Args:
+            url: 学习计划来源，为None时使用CONFIG中的PLAN_URL
+            report_date: 日报日期，为None时使用当前北京时间的日期
+
+        Returns:
+            str: 获取到的内容
+        """
+        logging.info("开始获取内容...")
+        return get_notion_content(url, report_date)
+
+
+Scraper.register("file", FileProvider())
+Scraper.register("http", HttpProvider())
+Scraper.register("https", HttpProvider())
+
+_scraper = None
+_scraper_lock = threading.Lock()
+
+
+def get_scraper() -> Scraper:
+    """获取进程内共享的内容获取器，首次调用时创建"""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None:
+            _scraper = Scraper()
+        return _scraper
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import CONFIG
+
+
+class SummaryCache:
+    """Gemini总结结果的磁盘缓存
+
+    以(提示词模板, 模型名称, 输入内容)的哈希为键保存总结结果，
+    条目超过TTL后失效，条目数超过上限时按最近最少使用(LRU)淘汰。
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = None):
+        """初始化SummaryCache
+
+        Args:
+            path: 缓存数据库路径，为None时使用CONFIG中的GEMINI_CACHE_FILE
+            ttl: 条目有效期(秒)，为None时使用CONFIG中的GEMINI_CACHE_TTL
+            max_entries: 最多保存的条目数，为None时使用CONFIG中的GEMINI_CACHE_MAX_ENTRIES
+        """
+        self.path = path or CONFIG["GEMINI_CACHE_FILE"]
+        self.ttl = ttl if ttl is not None else CONFIG["GEMINI_CACHE_TTL"]
+        self.max_entries = max_entries or CONFIG["GEMINI_CACHE_MAX_ENTRIES"]
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # 确保缓存目录存在
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt_template: str, model_name: str, content: str, options: str = "") -> str:
+        """计算缓存键
+
+        Args:
+            prompt_template: 提示词模板
+            model_name: 模型名称
+            content: 输入内容
+            options: 影响输出的其他参数，例如输出token上限和temperature
+
+        Returns:
+            str: SHA-256十六进制摘要
+        """
+        digest = hashlib.sha256()
+        for part in (prompt_template, model_name, content, options):
+            encoded = part.encode("utf-8")
+            # 写入长度前缀，避免不同分段拼接后产生相同的键
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            str: 缓存的总结，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        """写入缓存，超过条目上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 总结内容
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                "SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """获取缓存命中统计
+
+        Returns:
+            dict: 命中数、未命中数、命中率和当前条目数
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """获取进程内共享的总结缓存，首次调用时创建"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+            logging.info(f"已启用Gemini总结缓存: {_cache.path}")
+        return _cache
@@ -0,0 +1,167 @@
+import re
+
+# 一个换行：<br>、<br/>或换行符，连同其后的空格
+_BREAK = r"(?:<(?i:br)\s*/?>|\r?\n)[ \t]*"
+
+# 列表编号，位数不限，例如"1. "、"12、"、"3) "，编号后紧跟的换行一并匹配
+_MARKER = r"(?P<number>\d+)[.．、)](?![\d.])[ \t]*(?:" + _BREAK + r")*"
+
+# 文本开头的列表编号
+LEADING_MARKER_PATTERN = re.compile(_MARKER)
+
+# 需要处理的记号：换行(及其后的列表编号)、允许的行内标签、需要转义的字符。
+# 开头的先行断言让正则引擎快速跳过普通文本，整段输出只扫描一遍
+TOKEN_PATTERN = re.compile(
+    r"(?=[<>&\r\n])(?:"
+    r"(?P<breaks>(?:" + _BREAK + r")+)(?:" + _MARKER + r")?"
+    r"|<(?P<tag>/?(?i:b|strong|i|em|u))>"  # 允许保留的行内标签
+    r"|&(?!(?:#\d+|#[xX][0-9a-fA-F]+|[a-zA-Z]+);)"  # 未转义的&
+    r"|[<>])"
+)
+
+# 连续换行最多保留的数量
+MAX_BREAKS = 2
+
+# 需要转义的字符
+_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;"}
+
+# 记号匹配结束后，这些字符可能与之后收到的内容组成更长的记号("\r\n"、"<br>")
+_OPEN_CHARS = "\r<"
+# 文本开头尚不足以判断是否为列表编号的部分
+_DIGITS_PATTERN = re.compile(r"\d*")
+
+
+def _settled(text: str, end: int) -> bool:
+    """在end结束的匹配是否已经确定，不会因为之后收到的内容而变长或改变"""
+    return end < len(text) and text[end] not in _OPEN_CHARS
+
+
+def _replace_token(match: re.Match) -> str:
+    """替换单个记号"""
+    breaks = match.group("breaks")
+    if breaks is not None:
+        count = min(breaks.count("<") + breaks.count("\n"), MAX_BREAKS)
+        number = match.group("number")
+        if number is None:
+            return "<br>" * count
+        # 确保每个数字编号后面有双换行
+        return "<br>" * count + number + ". <br><br>"
+    tag = match.group("tag")
+    if tag is not None:
+        return f"<{tag.lower()}>"
+    return _ESCAPES[match.group()]
+
+
+def format_summary(text: str) -> str:
+    """将模型输出整理为邮件正文格式
+
+    用一个预编译的正则表达式扫描一遍文本：
+    - 行首的列表编号(1. / 1、/ 1) 等，位数不限)统一为"N. "，并在编号后换两行
+    - 连续的<br>和换行符合并，最多保留两个<br>
+    - 除<br>和少数行内标签外，HTML特殊字符一律转义，已转义的字符保持不变
+
+    Args:
+        text: 模型输出的原始文本
+
+    Returns:
+        str: 可直接放入邮件HTML正文的内容
+    """
+    return _format_leading(text.strip())
+
+
+def _format_leading(text: str) -> str:
+    """整理从输出开头开始的一段文本，开头的列表编号单独处理"""
+    prefix = ""
+    match = LEADING_MARKER_PATTERN.match(text)
+    if match is not None:
+        prefix = match.group("number") + ". <br><br>"
+        text = text[match.end():]
+    return prefix + TOKEN_PATTERN.sub(_replace_token, text)
+
+
+class StreamingFormatter:
+    """边接收模型输出边整理格式
+
+    与format_summary使用相同的记号扫描：收到的文本中出现下一个列表项的编号记号，
+    并且该记号已经确定不会随后续内容改变时，在记号开始处切分，之前的列表项立即整理并输出；
+    最后一个列表项在close时整理。由于切分点本身就是整段扫描时的记号边界，
+    全部输出拼接后与format_summary的结果相同。
+    """
+
+    def __init__(self):
+        self._pending = ""  # 尚未整理的原始文本
+        self._prefix = None  # 开头列表编号整理后的内容，尚未确定时为None
+        self.parts = []  # 已整理的各段
+
+    def feed(self, chunk: str) -> str:
+        """接收一段模型输出
+
+        Args:
+            chunk: 新收到的原始文本
+
+        Returns:
+            str: 本次新整理完成的内容，没有完整的列表项时为空字符串
+        """
+        self._pending += chunk
+        if self._prefix is None:
+            self._pending = self._pending.lstrip()
+            if not self._take_leading(final=False):
+                return ""
+
+        cut = 0
+        for match in TOKEN_PATTERN.finditer(self._pending):
+            if match.group("number") is not None and _settled(self._pending, match.end()):
+                cut = match.start()
+        if cut == 0:
+            return ""
+
+        segment, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._emit(segment)
+
+    def _take_leading(self, final: bool) -> bool:
+        """处理输出开头的列表编号
+
+        Args:
+            final: 是否已经收到全部输出
+
+        Returns:
+            bool: 开头是否已经处理，内容不足以判断时返回False
+        """
+        match = LEADING_MARKER_PATTERN.match(self._pending)
+        if not final:
+            if match is None and _DIGITS_PATTERN.fullmatch(self._pending):
+                return False
+            if match is not None and not _settled(self._pending, match.end()):
+                return False
+        self._prefix = ""
+        if match is not None:
+            self._prefix = match.group("number") + ". <br><br>"
+            self._pending = self._pending[match.end():]
+        return True
+
+    def _emit(self, segment: str) -> str:
+        formatted = TOKEN_PATTERN.sub(_replace_token, segment)
+        if not self.parts:
+            formatted = self._prefix + formatted
+        self.parts.append(formatted)
+        return formatted
+
+    def close(self) -> str:
+        """输出结束，整理最后一个列表项
+
+        Returns:
+            str: 最后整理的内容
+        """
+        self._pending = self._pending.rstrip()
+        if self._prefix is None:
+            self._pending = self._pending.lstrip()
+            self._take_leading(final=True)
+        segment, self._pending = self._pending, ""
+        if not segment and self.parts:
+            return ""
+        return self._emit(segment)
+
+    @property
+    def complete_items(self) -> str:
+        """已经完整的列表项，输出被中断时可以作为部分结果使用"""
+        return "".join(self.parts)